@@ -3,10 +3,12 @@ AIseed Agent Module
 Claude Agent SDKを使用したAIエージェント
 """
 from .core import AIseedAgent
+from .prompt_builder import PromptBuilder
 from .prompts import SPARK_PROMPT, GROW_PROMPT, CREATE_PROMPT, LEARN_PROMPT
 
 __all__ = [
     "AIseedAgent",
+    "PromptBuilder",
     "SPARK_PROMPT",
     "GROW_PROMPT",
     "CREATE_PROMPT",
@@ -0,0 +1,183 @@
+"""
+AIseed Conversation Context
+会話履歴のうちプロンプトに入れる範囲（推定トークン数の予算内）
+
+- 直近の発言（最大 keep_turns 件、合計 max_history_tokens 以内）はそのまま入れる
+- それより前の発言は1行ずつの要点（先頭 summary_turn_chars 文字）にまとめ、
+  summary_max_tokens を超えたら古い行から捨てる（ローリング要約）
+
+要約はセッションごとに保持し、窓から外れた発言だけを追加でまとめる。
+予算はサービスごとに config.CONTEXT で設定する。
+"""
+import sys
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from memory.cache import LRUCache
+
+SUMMARY_HEADER = "（これより前の会話の要点）\n"
+SUMMARY_OMITTED = "（さらに前の会話{count}件は省略）\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """推定トークン数（ASCIIは4文字で1、それ以外は1文字で1として数える）"""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+
+def render_turn(msg: dict) -> str:
+    """会話履歴の1発言"""
+    role = "ユーザー" if msg.get("role") == "user" else "AI"
+    return f"{role}: {msg.get('content', '')}\n"
+
+
+def summarize_turn(msg: dict, max_chars: int) -> str:
+    """要約に入れる1発言（改行を詰めて先頭だけ）"""
+    role = "ユーザー" if msg.get("role") == "user" else "AI"
+    content = " ".join(str(msg.get("content", "")).split())
+    if len(content) > max_chars:
+        content = content[:max_chars] + "…"
+    return f"- {role}: {content}\n"
+
+
+def _turn_key(msg: dict) -> tuple:
+    return (msg.get("role"), msg.get("content", ""))
+
+
+@dataclass
+class HistoryWindow:
+    """プロンプトに入れる会話履歴"""
+    text: str
+    tokens: int  # 推定トークン数
+    verbatim_turns: int  # そのまま入れた発言数
+    summarized_turns: int  # 要約にまとめた発言数（捨てた分を含む）
+    reused: int  # 前回の処理から使い回した発言数
+    rendered: int  # 今回処理した発言数
+
+
+class SessionHistory:
+    """1セッションの会話履歴の処理済み状態"""
+
+    def __init__(self):
+        self.count = 0  # 処理済みの発言数
+        self.last: Optional[tuple] = None  # 処理済みの最後の発言
+        self.folded = 0  # 要約にまとめた発言数
+        self.omitted = 0  # 要約からも捨てた発言数
+        self.summary: deque[tuple[str, int]] = deque()  # (要約の行, トークン数)
+        self.summary_tokens = 0
+        self.turns: deque[tuple[str, int, dict]] = deque()  # まだまとめていない発言 (描画, トークン数, 元の発言)
+
+    def matches(self, history: list[dict]) -> bool:
+        """今回の履歴が処理済みの分の続きか（発言数と最後の発言で判定）"""
+        return 0 < self.count <= len(history) and _turn_key(history[self.count - 1]) == self.last
+
+    def extend(self, history: list[dict]) -> int:
+        """未処理の発言を描画して追加（追加した件数）"""
+        new = history[self.count:]
+        for msg in new:
+            text = render_turn(msg)
+            self.turns.append((text, estimate_tokens(text), msg))
+        if history:
+            self.count = len(history)
+            self.last = _turn_key(history[-1])
+        return len(new)
+
+    def fit(self, keep_turns: Optional[int], max_history_tokens: Optional[int],
+            summary_max_tokens: int, summary_turn_chars: int):
+        """窓に収まらない古い発言を要約にまとめる（最新の1発言は必ず残す）"""
+        keep, tokens = 0, 0
+        for _, turn_tokens, _ in reversed(self.turns):
+            if keep and keep_turns is not None and keep >= keep_turns:
+                break
+            if keep and max_history_tokens is not None and tokens + turn_tokens > max_history_tokens:
+                break
+            keep += 1
+            tokens += turn_tokens
+
+        while len(self.turns) > keep:
+            _, _, msg = self.turns.popleft()
+            line = summarize_turn(msg, summary_turn_chars)
+            line_tokens = estimate_tokens(line)
+            self.summary.append((line, line_tokens))
+            self.summary_tokens += line_tokens
+            self.folded += 1
+            while self.summary_tokens > summary_max_tokens and self.summary:
+                _, dropped = self.summary.popleft()
+                self.summary_tokens -= dropped
+                self.omitted += 1
+
+    def render(self) -> tuple[str, int]:
+        """(描画結果, 推定トークン数)"""
+        parts = []
+        tokens = 0
+        if self.folded:
+            parts.append(SUMMARY_HEADER)
+            if self.omitted:
+                parts.append(SUMMARY_OMITTED.format(count=self.omitted))
+            tokens += sum(estimate_tokens(part) for part in parts) + self.summary_tokens
+            parts.extend(line for line, _ in self.summary)
+        parts.extend(text for text, _, _ in self.turns)
+        tokens += sum(turn_tokens for _, turn_tokens, _ in self.turns)
+        return "".join(parts), tokens
+
+    def size(self) -> int:
+        """キャッシュ上限判定用の推定サイズ"""
+        return (
+            sum(sys.getsizeof(line) for line, _ in self.summary)
+            + sum(sys.getsizeof(text) * 2 for text, _, _ in self.turns)
+            + 256
+        )
+
+
+class ContextWindow:
+    """会話履歴の窓と要約（セッションごとに状態をキャッシュ）"""
+
+    def __init__(self, budgets: dict, cache_max_entries: int = 2048, cache_max_bytes: int = 32 * 1024 * 1024):
+        """
+        Args:
+            budgets: サービス名 → 予算（config.CONTEXT と同じ形式、"default" は必須）
+        """
+        self.budgets = budgets
+        # (user_id, session_id) → SessionHistory
+        self._sessions = LRUCache(max_entries=cache_max_entries, max_bytes=cache_max_bytes)
+
+    def budget(self, service: str) -> dict:
+        """サービスの予算（未指定の項目は default）"""
+        return {**self.budgets["default"], **self.budgets.get(service, {})}
+
+    def window(
+        self,
+        service: str,
+        user_id: str,
+        session_id: Optional[str],
+        conversation_history: list[dict]
+    ) -> HistoryWindow:
+        """プロンプトに入れる会話履歴"""
+        key = (user_id, session_id)
+        session = self._sessions.get(key, None) if session_id else None
+        reused = session.count if session is not None and session.matches(conversation_history) else 0
+        if not reused:
+            session = SessionHistory()
+
+        rendered = session.extend(conversation_history)
+        budget = self.budget(service)
+        session.fit(
+            budget["keep_turns"], budget["max_history_tokens"],
+            budget["summary_max_tokens"], budget["summary_turn_chars"]
+        )
+        if session_id and conversation_history:
+            self._sessions.put(key, None, session, session.size())
+
+        text, tokens = session.render()
+        return HistoryWindow(
+            text=text,
+            tokens=tokens,
+            verbatim_turns=len(session.turns),
+            summarized_turns=session.folded,
+            reused=reused,
+            rendered=rendered,
+        )
+
+    def stats(self) -> dict:
+        return self._sessions.stats()
@@ -9,51 +9,66 @@ import logging
 from typing import Optional, AsyncIterator
 from claude_agent_sdk import query, ClaudeAgentOptions
 
-from .prompts import get_prompt
-from .tools import InsightTools, SkillTools, HistoryTools
+from .prompt_builder import PromptBuilder
+from .scheduler import ModelScheduler, ModelQueueFull
+from .tools import InsightTools, SkillTools, HistoryTools, ToolRegistry
 from memory.store import UserMemory
-from config import get_model_id, get_model_info
+from storage import run_io, file_locks
+from config import get_model_id, get_model_info, MEMORY, PROMPT, CONTEXT, MODEL_CONCURRENCY, BACKGROUND_TASKS
 
 logger = logging.getLogger("aiseed.agent")
 
 
+def _text_delta(message) -> Optional[str]:
+    """StreamEvent のテキスト差分（テキスト差分以外のイベントは ""、StreamEvent でなければ None）"""
+    event = getattr(message, 'event', None)
+    if not isinstance(event, dict):
+        return None
+    if event.get("type") == "content_block_delta":
+        delta = event.get("delta") or {}
+        if delta.get("type") == "text_delta":
+            return delta.get("text", "")
+    return ""
+
+
 class AIseedAgent:
     """AIseedのAIエージェント"""
 
-    def __init__(self, memory_base_path: str = "user_memory"):
-        self.memory = UserMemory(base_path=memory_base_path)
+    def __init__(self, memory_base_path: str = "user_memory", memory_backend: str = "json"):
+        self.memory = UserMemory(
+            base_path=memory_base_path,
+            backend=memory_backend,
+            cache_max_entries=MEMORY["cache_max_entries"],
+            cache_max_bytes=MEMORY["cache_max_bytes"]
+        )
 
-        # ツールの初期化
+        # ツールの初期化（定義とハンドラーはここで一度だけ集めて検証する）
         self.insight_tools = InsightTools(self.memory)
         self.skill_tools = SkillTools(self.memory)
         self.history_tools = HistoryTools(self.memory)
+        self.tools = ToolRegistry([self.insight_tools, self.skill_tools, self.history_tools])
+        logger.info(f"Tools registered: {', '.join(self.tools.names)}")
+
+        # 会話プロンプトの組み立て（固定部分・ユーザー情報をキャッシュ、会話履歴は予算内に要約）
+        self.prompts = PromptBuilder(
+            self.memory,
+            budgets=CONTEXT,
+            cache_max_entries=PROMPT["cache_max_entries"],
+            cache_max_bytes=PROMPT["cache_max_bytes"]
+        )
+
+        # モデル呼び出しの実行枠（処理タイプごとの同時実行数・優先順位）
+        self.scheduler = ModelScheduler(MODEL_CONCURRENCY, BACKGROUND_TASKS)
 
     def _get_all_tool_definitions(self) -> list[dict]:
         """全ツール定義を取得"""
-        tools = []
-        tools.extend(self.insight_tools.get_tool_definitions())
-        tools.extend(self.skill_tools.get_tool_definitions())
-        tools.extend(self.history_tools.get_tool_definitions())
-        return tools
-
-    def _get_tool_handler(self, tool_name: str):
-        """ツール名からハンドラーを取得"""
-        handlers = {}
-        handlers.update(self.insight_tools.get_handlers())
-        handlers.update(self.skill_tools.get_handlers())
-        handlers.update(self.history_tools.get_handlers())
-        return handlers.get(tool_name)
-
-    def _execute_tool(self, tool_name: str, arguments: dict) -> dict:
-        """ツールを実行"""
-        handler = self._get_tool_handler(tool_name)
-        if handler:
-            try:
-                return handler(**arguments)
-            except Exception as e:
-                logger.error(f"Tool execution error: {tool_name} - {e}")
-                return {"error": str(e)}
-        return {"error": f"Unknown tool: {tool_name}"}
+        return self.tools.definitions
+
+    async def execute_tool(self, tool_name: str, arguments: dict) -> dict:
+        """ツールを実行（同期ハンドラーはユーザーのメモリへの書き込みと直列化するため、ユーザー単位でロック）"""
+        user_id = arguments.get("user_id")
+        keys = [(f"memory.{kind}", user_id) for kind in ("profile", "history", "skills")] if user_id else []
+        return await self.tools.execute(tool_name, arguments, lock_keys=keys)
 
     async def chat(
         self,
@@ -77,6 +92,28 @@ class AIseedAgent:
 
         注意: Claude Agent SDKの実際のAPIに合わせて調整が必要です。
         """
+        response_text = ""
+        async for delta in self.chat_stream(
+            service, user_message, user_id, session_id, conversation_history, task_name
+        ):
+            response_text += delta
+        return response_text.strip()
+
+    async def chat_stream(
+        self,
+        service: str,
+        user_message: str,
+        user_id: str,
+        session_id: Optional[str] = None,
+        conversation_history: list[dict] = None,
+        task_name: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        会話を処理してレスポンスを差分（テキストの断片）ごとに返す
+
+        引数は chat と同じ。断片をつなげると chat の戻り値（strip前）になる。
+        SDKが部分メッセージ（StreamEvent）を返さない場合は、メッセージ単位で返す。
+        """
         conversation_history = conversation_history or []
 
         # 処理名からモデルを決定
@@ -85,44 +122,15 @@ class AIseedAgent:
         model_id = model_info["model_id"]
         logger.info(f"[{task_name}] Using model: {model_info['model_key']} ({model_id})")
 
-        # 会話履歴を文字列に変換
-        history_text = ""
-        for msg in conversation_history:
-            role = "ユーザー" if msg.get("role") == "user" else "AI"
-            history_text += f"{role}: {msg.get('content', '')}\n"
-
-        # プロンプトを構築
-        system_prompt = get_prompt(service)
-
-        # ユーザープロファイルを取得（contextに含める）
-        user_summary = self.memory.get_user_summary(user_id)
-        context_info = f"""
-## ユーザー情報
-- ユーザーID: {user_id}
-- セッションID: {session_id or 'なし'}
-- 年齢層: {user_summary.get('age_group') or '未確認'}
-- 会話回数: {user_summary.get('conversation_count', 0)}
-
-## 発見済みの特性
-- 能力: {', '.join([a['content'] for a in user_summary.get('abilities', [])]) or 'なし'}
-- らしさ: {', '.join([p['content'] for p in user_summary.get('personalities', [])]) or 'なし'}
-- 興味: {', '.join([i['content'] for i in user_summary.get('interests', [])]) or 'なし'}
-"""
-
-        full_prompt = f"""
-{system_prompt}
-
-{context_info}
-
-【これまでの会話】
-{history_text}
-
-【ユーザーの最新メッセージ】
-{user_message}
-
-自然に会話を続けてください。
-必要に応じてツールを使用して特性を記録してください。
-"""
+        # プロンプトを構築（システムプロンプト・ユーザー情報・これまでの会話・最新メッセージ）
+        prompt = await self.prompts.build(service, user_id, session_id, conversation_history, user_message)
+        full_prompt = prompt.text
+        logger.info(
+            f"[{task_name}] Prompt: {prompt.chars} chars (~{prompt.tokens} tokens), {prompt.build_ms:.2f}ms "
+            f"(context={'cached' if prompt.context_cached else 'built'}, "
+            f"history=+{prompt.history_rendered}/{prompt.history_reused + prompt.history_rendered} "
+            f"verbatim={prompt.verbatim_turns} summarized={prompt.summarized_turns} ~{prompt.history_tokens} tokens)"
+        )
 
         try:
             # Claude Agent SDKを使用
@@ -130,25 +138,33 @@ class AIseedAgent:
             options = ClaudeAgentOptions(
                 model=model_id,  # 設定から取得したモデル
                 system_prompt="あなたはaiseedのAIパートナーです。",
+                include_partial_messages=True,  # テキストの差分を受け取る
                 # tools=self._get_all_tool_definitions()  # ツール定義（SDK対応時に有効化）
             )
 
-            response_text = ""
-            async for message in query(prompt=full_prompt, options=options):
-                if hasattr(message, 'content'):
-                    for block in message.content:
-                        if hasattr(block, 'text'):
-                            response_text += block.text
+            # 差分を受け取った後は、同じ内容の完成メッセージを読み飛ばす
+            streamed = False
+            async with self.scheduler.slot(task_name):
+                async for message in query(prompt=full_prompt, options=options):
+                    delta = _text_delta(message)
+                    if delta is not None:
+                        streamed = True
+                        if delta:
+                            yield delta
+                    elif hasattr(message, 'content') and not streamed:
+                        for block in message.content:
+                            if hasattr(block, 'text'):
+                                yield block.text
                         # ツール呼び出しの処理（SDK対応時に有効化）
                         # elif hasattr(block, 'tool_use'):
-                        #     tool_result = self._execute_tool(
+                        #     tool_result = await self.execute_tool(
                         #         block.tool_use.name,
                         #         block.tool_use.input
                         #     )
                         #     # ツール結果を処理...
 
-            return response_text.strip()
-
+        except ModelQueueFull:
+            raise
         except Exception as e:
             logger.error(f"Agent chat error: {e}")
             raise
@@ -202,11 +218,12 @@ JSON形式で出力してください：
             options = ClaudeAgentOptions(model=model_id)
 
             response_text = ""
-            async for message in query(prompt=prompt, options=options):
-                if hasattr(message, 'content'):
-                    for block in message.content:
-                        if hasattr(block, 'text'):
-                            response_text += block.text
+            async with self.scheduler.slot("analyze_conversation"):
+                async for message in query(prompt=prompt, options=options):
+                    if hasattr(message, 'content'):
+                        for block in message.content:
+                            if hasattr(block, 'text'):
+                                response_text += block.text
 
             # JSONをパース
             import json
@@ -215,52 +232,39 @@ JSON形式で出力してください：
             json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
             if json_match:
                 result = json.loads(json_match.group())
-
-                # 年齢層を更新
-                if result.get("age_group"):
-                    self.memory.update_age_group(user_id, result["age_group"])
-
-                # 特性を記録
-                for ability in result.get("abilities", []):
-                    self.memory.add_insight(
-                        user_id=user_id,
-                        type="ability",
-                        content=ability["content"],
-                        context=ability.get("context", "会話分析"),
-                        confidence=ability.get("confidence", 0.5)
-                    )
-
-                for personality in result.get("personalities", []):
-                    self.memory.add_insight(
-                        user_id=user_id,
-                        type="personality",
-                        content=personality["content"],
-                        context=personality.get("context", "会話分析"),
-                        confidence=personality.get("confidence", 0.5)
-                    )
-
-                for interest in result.get("interests", []):
-                    self.memory.add_insight(
-                        user_id=user_id,
-                        type="interest",
-                        content=interest["content"],
-                        context=interest.get("context", "会話分析"),
-                        confidence=interest.get("confidence", 0.5)
-                    )
-
-                # 履歴を保存
-                self.memory.add_history(
-                    user_id=user_id,
-                    session_id=session_id,
-                    service=service,
-                    summary=result.get("summary", ""),
-                    key_discoveries=result.get("key_discoveries", [])
-                )
-
+                async with file_locks.hold(("memory.profile", user_id), ("memory.history", user_id)):
+                    await run_io(self._save_analysis, user_id, session_id, service, result)
                 return result
 
             return {"error": "Failed to parse analysis result"}
 
+        except ModelQueueFull:
+            raise
         except Exception as e:
             logger.error(f"Analyze conversation error: {e}")
             return {"error": str(e)}
+
+    def _save_analysis(self, user_id: str, session_id: str, service: str, result: dict):
+        """分析結果をメモリに保存（1回の書き込みにまとめる）"""
+        with self.memory.batch(user_id) as tx:
+            # 年齢層を更新
+            if result.get("age_group"):
+                tx.update_age_group(result["age_group"])
+
+            # 特性を記録
+            for insight_type, key in (("ability", "abilities"), ("personality", "personalities"), ("interest", "interests")):
+                for item in result.get(key, []):
+                    tx.add_insight(
+                        type=insight_type,
+                        content=item["content"],
+                        context=item.get("context", "会話分析"),
+                        confidence=item.get("confidence", 0.5)
+                    )
+
+            # 履歴を保存
+            tx.add_history(
+                session_id=session_id,
+                service=service,
+                summary=result.get("summary", ""),
+                key_discoveries=result.get("key_discoveries", [])
+            )
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+体験タスクのアーカイブのメンテナンス
+
+使用方法（backend/aiseed で実行）:
+    python -m agent.maintenance seal-archive                  # 一昨日までのJSONLを列形式（.npz）に変換
+    python -m agent.maintenance reanalyze                     # 全期間を TaskAnalyzer で再分析し傾向を集計
+    python -m agent.maintenance reanalyze --start 2026-06-01 --end 2026-06-30
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+# パスを追加（agent, memoryモジュールのため）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.tools.archive import ExperienceArchive, reanalyze as reanalyze_archive
+
+
+def seal_archive(archive: ExperienceArchive, args):
+    """
+    昨日より前の日のJSONLをすべて .npz に変換
+
+    昨日の分は、日付が変わる前に始まったセッションの追記がまだ届くことがあるため残す。
+    """
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    for day in archive.seal_before(yesterday):
+        print(f"  day={day} results={len(archive.read_day(day)['task_id'])}")
+
+
+def reanalyze(archive: ExperienceArchive, args):
+    """アーカイブを1日ずつ読み、傾向ごとの件数を表示"""
+    total = Counter()
+    for day, columns, analyses in reanalyze_archive(archive, args.start, args.end):
+        tendencies = Counter(a["tendency"] for a in analyses if a and a.get("tendency"))
+        taps = int(columns["tap_offsets"][-1])
+        print(f"  day={day} results={len(analyses)} taps={taps} tendencies={sum(tendencies.values())}")
+        total.update(tendencies)
+    for tendency, count in total.most_common():
+        print(f"  {tendency}: {count}")
+
+
+COMMANDS = {
+    "seal-archive": seal_archive,
+    "reanalyze": reanalyze,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="体験タスクのアーカイブのメンテナンス")
+    parser.add_argument("command", choices=COMMANDS.keys())
+    parser.add_argument("--start", help="reanalyze: 開始日（YYYY-MM-DD）")
+    parser.add_argument("--end", help="reanalyze: 終了日（YYYY-MM-DD）")
+    parser.add_argument(
+        "--base-path", default="user_memory/experience_archive",
+        help="アーカイブのディレクトリ（既定: user_memory/experience_archive）"
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.base_path):
+        print(f"エラー: アーカイブのディレクトリが見つかりません: {args.base_path}")
+        sys.exit(1)
+
+    archive = ExperienceArchive(base_path=args.base_path)
+    print(f"{args.command}: {len(archive.days())}日")
+    COMMANDS[args.command](archive, args)
+    print("完了")
+
+
+if __name__ == "__main__":
+    main()
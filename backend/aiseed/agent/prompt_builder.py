@@ -0,0 +1,168 @@
+"""
+AIseed Prompt Builder
+会話プロンプトの組み立て
+
+chat のプロンプトは次の順に並ぶ:
+- サービスのシステムプロンプト（固定）
+- ユーザー情報（プロファイルが変わるまで同じ）
+- これまでの会話（直近はそのまま、それより前は要約。agent.context を参照）
+- 最新のメッセージと指示
+
+固定部分はサービスごとに、ユーザー情報はプロファイルのバージョン（MemoryBackend.version）を
+キーにキャッシュする。会話履歴はセッションごとに処理済みの状態を持ち、追加された発言だけを処理する。
+"""
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from .prompts import get_prompt
+from .context import ContextWindow, estimate_tokens
+from memory.cache import LRUCache
+from memory.store import UserMemory
+from storage import run_io
+
+HISTORY_HEADER = "\n\n【これまでの会話】\n"
+MESSAGE_HEADER = "\n\n【ユーザーの最新メッセージ】\n"
+INSTRUCTION = """
+
+自然に会話を続けてください。
+必要に応じてツールを使用して特性を記録してください。
+"""
+
+
+@dataclass
+class BuiltPrompt:
+    """組み立てたプロンプトと計測値"""
+    text: str
+    tokens: int  # 推定トークン数
+    build_ms: float
+    context_cached: bool  # ユーザー情報をキャッシュから使った
+    history_reused: int  # 前回の処理から使い回した発言数
+    history_rendered: int  # 今回処理した発言数
+    history_tokens: int  # 会話履歴の推定トークン数
+    verbatim_turns: int  # そのまま入れた発言数
+    summarized_turns: int  # 要約にまとめた発言数
+
+    @property
+    def chars(self) -> int:
+        return len(self.text)
+
+
+def render_context(user_id: str, session_id: Optional[str], summary: dict) -> str:
+    """ユーザー情報のブロック"""
+    return f"""
+## ユーザー情報
+- ユーザーID: {user_id}
+- セッションID: {session_id or 'なし'}
+- 年齢層: {summary.get('age_group') or '未確認'}
+- 会話回数: {summary.get('conversation_count', 0)}
+
+## 発見済みの特性
+- 能力: {', '.join([a['content'] for a in summary.get('abilities', [])]) or 'なし'}
+- らしさ: {', '.join([p['content'] for p in summary.get('personalities', [])]) or 'なし'}
+- 興味: {', '.join([i['content'] for i in summary.get('interests', [])]) or 'なし'}
+"""
+
+
+class PromptBuilder:
+    """会話プロンプトの組み立て（変わらない部分はキャッシュ）"""
+
+    def __init__(
+        self,
+        memory: UserMemory,
+        budgets: dict,
+        cache_max_entries: int = 2048,
+        cache_max_bytes: int = 32 * 1024 * 1024
+    ):
+        """
+        Args:
+            memory: ユーザーメモリ（ユーザー情報とプロファイルのバージョンの取得元）
+            budgets: 会話履歴の予算（config.CONTEXT と同じ形式）
+            cache_max_entries: ユーザー情報・会話履歴それぞれのキャッシュの最大エントリ数（0で無効）
+            cache_max_bytes: それぞれの推定メモリ使用量の上限
+        """
+        self.memory = memory
+        # サービス → システムプロンプトのブロック（固定なので上限なし）
+        self._prefixes: dict[str, str] = {}
+        # (user_id, session_id) → ユーザー情報のブロック（バージョン: プロファイルのバージョン）
+        self._contexts = LRUCache(max_entries=cache_max_entries, max_bytes=cache_max_bytes)
+        # 会話履歴の窓と要約（セッションごと）
+        self.history = ContextWindow(budgets, cache_max_entries=cache_max_entries, cache_max_bytes=cache_max_bytes)
+
+        self.builds = 0
+        self.total_ms = 0.0
+        self.total_chars = 0
+        self.total_tokens = 0
+        self.summarized_builds = 0
+
+    # ==================== 各部分 ====================
+
+    def prefix(self, service: str) -> str:
+        """システムプロンプトのブロック"""
+        block = self._prefixes.get(service)
+        if block is None:
+            block = self._prefixes[service] = f"\n{get_prompt(service)}\n\n"
+        return block
+
+    async def context(self, user_id: str, session_id: Optional[str]) -> tuple[str, bool]:
+        """ユーザー情報のブロック（プロファイルが変わっていなければキャッシュから）"""
+        key = (user_id, session_id)
+        version = await run_io(self.memory.backend.version, user_id, "profile")
+        block = self._contexts.get(key, version)
+        if block is not None:
+            return block, True
+
+        summary = await self.memory.get_user_summary_async(user_id)
+        block = render_context(user_id, session_id, summary)
+        self._contexts.put(key, version, block, sys.getsizeof(block))
+        return block, False
+
+    # ==================== 組み立て ====================
+
+    async def build(
+        self,
+        service: str,
+        user_id: str,
+        session_id: Optional[str],
+        conversation_history: list[dict],
+        user_message: str
+    ) -> BuiltPrompt:
+        """会話プロンプトを組み立てる"""
+        start = time.perf_counter()
+        context, context_cached = await self.context(user_id, session_id)
+        history = self.history.window(service, user_id, session_id, conversation_history)
+        text = "".join((
+            self.prefix(service), context, HISTORY_HEADER, history.text, MESSAGE_HEADER, user_message, INSTRUCTION
+        ))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        prompt = BuiltPrompt(
+            text=text,
+            tokens=estimate_tokens(text),
+            build_ms=elapsed_ms,
+            context_cached=context_cached,
+            history_reused=history.reused,
+            history_rendered=history.rendered,
+            history_tokens=history.tokens,
+            verbatim_turns=history.verbatim_turns,
+            summarized_turns=history.summarized_turns,
+        )
+        self.builds += 1
+        self.total_ms += elapsed_ms
+        self.total_chars += len(text)
+        self.total_tokens += prompt.tokens
+        self.summarized_builds += bool(history.summarized_turns)
+        return prompt
+
+    def stats(self) -> dict:
+        """組み立ての統計（/health 用）"""
+        return {
+            "builds": self.builds,
+            "avg_ms": round(self.total_ms / self.builds, 3) if self.builds else 0.0,
+            "avg_chars": round(self.total_chars / self.builds) if self.builds else 0,
+            "avg_tokens": round(self.total_tokens / self.builds) if self.builds else 0,
+            "summarized_builds": self.summarized_builds,
+            "context_cache": self._contexts.stats(),
+            "history_cache": self.history.stats(),
+        }
@@ -0,0 +1,247 @@
+"""
+AIseed AI Response Cache
+AI問い合わせ（ai_query）の応答キャッシュ
+
+同じ内容のプロンプト（同じ植物・同じ症状の診断、同じ出荷メッセージの解析など）に対して
+モデルを呼び直さないよう、応答を保存して使い回す。
+
+- キー: 処理名 + モデルID + 正規化したプロンプト（NFKC、空白の連続を1つに）のハッシュ
+- メモリ: 件数・推定バイト数の上限付きLRU（プロセス内）
+- ディスク: SQLite（WALモード、全ワーカーで共有、再起動後も残る）。件数の上限を超えたら
+  最後に使われたのが古いものから破棄（件数はトリガーで数えておき、保存のたびに全件を数えない）
+- 有効期限（ttl_sec）は処理名ごとに設定し、設定した処理だけをキャッシュする（オプトイン）
+
+    ai_query = cache.wrap("grow_analysis", ai_query)
+"""
+import hashlib
+import logging
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from config import TASK_CLASSIFICATION, get_model_id
+from memory.cache import LRUCache
+from storage import run_io
+
+logger = logging.getLogger("aiseed.agent")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """キー用にプロンプトを正規化（全角・半角の揺れと空白の違いを無視）"""
+    return " ".join(unicodedata.normalize("NFKC", prompt).split())
+
+
+def cache_key(task_name: str, model_id: str, prompt: str) -> str:
+    digest = hashlib.sha256()
+    for part in (task_name, model_id, normalize_prompt(prompt)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """AI応答のキャッシュ（メモリ + SQLite）"""
+
+    SCHEMA = """
+    BEGIN IMMEDIATE;
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        task TEXT NOT NULL,
+        response TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses (expires_at);
+    CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+    -- 件数（全ワーカーで共有、追加・削除と同じトランザクションで更新）
+    CREATE TABLE IF NOT EXISTS response_count (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        entries INTEGER NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS responses_count_insert AFTER INSERT ON responses
+    BEGIN UPDATE response_count SET entries = entries + 1 WHERE id = 0; END;
+    CREATE TRIGGER IF NOT EXISTS responses_count_delete AFTER DELETE ON responses
+    BEGIN UPDATE response_count SET entries = entries - 1 WHERE id = 0; END;
+    -- 件数テーブルがない既存のファイルは、ここで一度だけ数える
+    INSERT OR IGNORE INTO response_count (id, entries) SELECT 0, COUNT(*) FROM responses;
+    COMMIT;
+    """
+
+    def __init__(
+        self,
+        tasks: dict[str, float],
+        path: Optional[str] = "user_memory/ai_cache.db",
+        max_entries: int = 2048,
+        max_bytes: int = 16 * 1024 * 1024,
+        disk_max_entries: int = 50000,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            tasks: キャッシュする処理名 → 有効期限（秒）。処理名は TASK_CLASSIFICATION のもの
+            path: ディスク側のSQLiteファイル（Noneでメモリのみ）
+            max_entries: メモリ側の最大件数（0でメモリ側を無効）
+            max_bytes: メモリ側の推定メモリ使用量の上限
+            disk_max_entries: ディスク側の最大件数
+
+        Raises:
+            ValueError: TASK_CLASSIFICATION にない処理名
+        """
+        unknown = set(tasks) - set(TASK_CLASSIFICATION)
+        if unknown:
+            raise ValueError(f"Unknown task for response cache: {', '.join(sorted(unknown))}")
+        self.tasks = dict(tasks)
+        self.disk_max_entries = disk_max_entries
+        self.clock = clock
+        # key → (有効期限, 応答)
+        self._memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+
+        self.db_path = Path(path) if path else None
+        self._local = threading.local()
+        if self.db_path:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn().executescript(self.SCHEMA)
+
+        # 処理名ごとの統計
+        self._stats = {task: {"hits": 0, "disk_hits": 0, "misses": 0} for task in self.tasks}
+        self._stats_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        """スレッドローカルな接続を取得"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, task_name: str, field: str):
+        with self._stats_lock:
+            self._stats[task_name][field] += 1
+
+    # ==================== 取得・保存 ====================
+
+    def enabled_for(self, task_name: str) -> bool:
+        return task_name in self.tasks
+
+    def get(self, task_name: str, key: str) -> Optional[str]:
+        """キャッシュ済みの応答（期限切れ・未登録ならNone）"""
+        now = self.clock()
+        entry = self._memory.get(key, None)
+        if entry is not None:
+            expires_at, response = entry
+            if expires_at > now:
+                self._count(task_name, "hits")
+                return response
+            self._memory.invalidate(key)
+
+        if self.db_path:
+            conn = self._conn()
+            with conn:
+                row = conn.execute(
+                    "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._memory.put(key, None, (row[1], row[0]), sys.getsizeof(row[0]) + 64)
+                    self._count(task_name, "disk_hits")
+                    return row[0]
+
+        self._count(task_name, "misses")
+        return None
+
+    def put(self, task_name: str, key: str, response: str):
+        """応答を保存"""
+        now = self.clock()
+        expires_at = now + self.tasks[task_name]
+        self._memory.put(key, None, (expires_at, response), sys.getsizeof(response) + 64)
+
+        if self.db_path:
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    """INSERT INTO responses (key, task, response, expires_at, accessed_at)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT (key) DO UPDATE SET
+                           response = excluded.response,
+                           expires_at = excluded.expires_at,
+                           accessed_at = excluded.accessed_at""",
+                    (key, task_name, response, expires_at, now)
+                )
+                conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                excess = self._disk_entries(conn) - self.disk_max_entries
+                if excess > 0:
+                    conn.execute(
+                        """DELETE FROM responses WHERE key IN (
+                               SELECT key FROM responses ORDER BY accessed_at LIMIT ?)""",
+                        (excess,)
+                    )
+
+    # ==================== ai_query のラップ ====================
+
+    def wrap(
+        self,
+        task_name: str,
+        ai_query: Callable[[str], Awaitable[str]]
+    ) -> Callable[[str], Awaitable[str]]:
+        """
+        ai_query にキャッシュを挟む（キャッシュ対象でない処理名ならそのまま返す）
+
+        空の応答と例外はキャッシュしない。
+        """
+        if not self.enabled_for(task_name):
+            return ai_query
+
+        async def cached_query(prompt: str) -> str:
+            key = cache_key(task_name, get_model_id(task_name), prompt)
+            response = await run_io(self.get, task_name, key)
+            if response is not None:
+                logger.info(f"[AICache] hit task={task_name} key={key[:12]}")
+                return response
+
+            response = await ai_query(prompt)
+            if response:
+                await run_io(self.put, task_name, key, response)
+            return response
+
+        return cached_query
+
+    # ==================== 統計 ====================
+
+    @staticmethod
+    def _disk_entries(conn: sqlite3.Connection) -> int:
+        """ディスク側の件数（トリガーで数えた値、COUNT(*) で全件を走査しない）"""
+        return conn.execute("SELECT entries FROM response_count WHERE id = 0").fetchone()[0]
+
+    def disk_count(self) -> int:
+        if not self.db_path:
+            return 0
+        return self._disk_entries(self._conn())
+
+    def stats(self) -> dict:
+        """処理名ごとのヒット率など（/health 用）"""
+        with self._stats_lock:
+            tasks = {}
+            for task, counts in self._stats.items():
+                total = counts["hits"] + counts["disk_hits"] + counts["misses"]
+                hits = counts["hits"] + counts["disk_hits"]
+                tasks[task] = {**counts, "hit_rate": round(hits / total, 4) if total else 0.0}
+        memory = self._memory.stats()
+        return {
+            "tasks": tasks,
+            "memory_entries": memory["entries"],
+            "memory_bytes": memory["bytes"],
+            "disk_entries": self.disk_count(),
+        }
+
+    def close(self):
+        """このスレッドの接続を閉じる"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,214 @@
+"""
+AIseed Model Call Scheduler
+モデル呼び出しの同時実行数と優先順位（処理タイプごと）
+
+TASK_CLASSIFICATION の処理タイプ（heavy / medium / light）ごとに:
+- 同時に実行するモデル呼び出しの数を制限する（max_concurrent）
+- バックグラウンド処理（会話分析など）が使える枠は max_background までに抑え、
+  対話の分を常に残す
+- 空きを待つ呼び出しは対話 → バックグラウンドの順、同じ優先度なら到着順に実行する
+- 待ち行列（対話・バックグラウンドそれぞれ）が max_queue を超えたら ModelQueueFull を
+  送出する（APIは429を返す）。バックグラウンドが溜まっても対話は受け付ける
+
+    async with scheduler.slot("spark_conversation"):
+        async for message in query(...):
+            ...
+
+イベントループ上でのみ使う（スレッドからは呼ばない）。
+"""
+import asyncio
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from config import TASK_CLASSIFICATION
+
+logger = logging.getLogger("aiseed.agent")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class ModelQueueFull(Exception):
+    """待ち行列が満杯（しばらくしてから再試行）"""
+
+    def __init__(self, task_name: str, task_type: str, retry_after: int):
+        super().__init__(f"Model queue full: {task_name} ({task_type})")
+        self.task_name = task_name
+        self.task_type = task_type
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Waiter:
+    priority: int
+    seq: int
+    background: bool
+    future: asyncio.Future
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class _ClassQueue:
+    """1つの処理タイプの実行枠と待ち行列"""
+
+    def __init__(self, task_type: str, max_concurrent: int, max_background: int, max_queue: int):
+        self.task_type = task_type
+        self.max_concurrent = max_concurrent
+        self.max_background = min(max_background, max_concurrent)
+        self.max_queue = max_queue
+
+        self.running = 0
+        self.running_background = 0
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_run_ms = 0.0
+        self.completed = 0
+
+    def _can_run(self, background: bool) -> bool:
+        if self.running >= self.max_concurrent:
+            return False
+        return not background or self.running_background < self.max_background
+
+    def _start(self, waiter: _Waiter):
+        self.running += 1
+        self.running_background += waiter.background
+        self.admitted += 1
+        wait_ms = (time.perf_counter() - waiter.queued_at) * 1000
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def _dispatch(self):
+        """空いている枠を、実行できる待ちの中で優先度が高い順に割り当てる"""
+        while True:
+            eligible = [w for w in self._waiters if self._can_run(w.background)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: (w.priority, w.seq))
+            self._waiters.remove(waiter)
+            if waiter.future.done():
+                # 同じティックでキャンセルされた待ち（切断など）: 枠を渡さず次の待ちへ
+                continue
+            self._start(waiter)
+            waiter.future.set_result(None)
+
+    def queued(self, background: bool) -> int:
+        """待っている呼び出しの数（対話・バックグラウンド別）"""
+        return sum(1 for w in self._waiters if w.background == background)
+
+    def is_full(self, background: bool) -> bool:
+        """今来た呼び出しがすぐには実行できず、待ち行列も満杯か"""
+        return not self._can_run(background) and self.queued(background) >= self.max_queue
+
+    def retry_after(self) -> int:
+        """再試行までの目安（秒）: 平均実行時間 × 待ち行列の長さ / 同時実行数"""
+        avg_run = self.total_run_ms / self.completed / 1000 if self.completed else 1.0
+        return max(1, math.ceil(avg_run * (len(self._waiters) + 1) / self.max_concurrent))
+
+    async def acquire(self, task_name: str, background: bool):
+        waiter = _Waiter(
+            priority=PRIORITY_BACKGROUND if background else PRIORITY_INTERACTIVE,
+            seq=next(self._seq),
+            background=background,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._waiters.append(waiter)
+        self._dispatch()
+        if not waiter.future.done() and self.queued(background) > self.max_queue:
+            self._waiters.remove(waiter)
+            self.rejected += 1
+            logger.warning(f"[Scheduler] queue full type={self.task_type} task={task_name}")
+            raise ModelQueueFull(task_name, self.task_type, self.retry_after())
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 枠を割り当てられた直後にキャンセルされた
+                self.release(background, 0.0)
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, background: bool, run_ms: float):
+        self.running -= 1
+        self.running_background -= background
+        self.total_run_ms += run_ms
+        self.completed += 1
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "running_background": self.running_background,
+            "queued_interactive": self.queued(False),
+            "queued_background": self.queued(True),
+            "max_concurrent": self.max_concurrent,
+            "max_background": self.max_background,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / self.admitted, 3) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
+class ModelScheduler:
+    """処理タイプごとのモデル呼び出しの実行枠"""
+
+    def __init__(self, limits: dict[str, dict], background_tasks: Iterable[str] = ()):
+        """
+        Args:
+            limits: 処理タイプ → {"max_concurrent", "max_background", "max_queue"}
+                    （config.MODEL_CONCURRENCY と同じ形式）
+            background_tasks: バックグラウンド扱い（対話より後回し）の処理名
+        """
+        self.queues = {
+            task_type: _ClassQueue(
+                task_type,
+                max_concurrent=limit["max_concurrent"],
+                max_background=limit.get("max_background", limit["max_concurrent"]),
+                max_queue=limit["max_queue"],
+            )
+            for task_type, limit in limits.items()
+        }
+        self.background_tasks = set(background_tasks)
+
+    def classify(self, task_name: str) -> tuple[_ClassQueue, bool]:
+        """処理名 → (処理タイプの実行枠, バックグラウンドか)。未分類は get_model_info と同じく medium"""
+        task_type = TASK_CLASSIFICATION.get(task_name, "medium")
+        return self.queues[task_type], task_name in self.background_tasks
+
+    def check(self, task_name: str):
+        """
+        今来た呼び出しが受け付けられるか（満杯なら ModelQueueFull）
+
+        ストリーミング応答など、ヘッダーを送る前に429を返したい場合に使う。
+        """
+        queue, background = self.classify(task_name)
+        if queue.is_full(background):
+            queue.rejected += 1
+            raise ModelQueueFull(task_name, queue.task_type, queue.retry_after())
+
+    @asynccontextmanager
+    async def slot(self, task_name: str):
+        """実行枠を確保してからモデルを呼ぶ（満杯なら ModelQueueFull）"""
+        queue, background = self.classify(task_name)
+        await queue.acquire(task_name, background)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            queue.release(background, (time.perf_counter() - start) * 1000)
+
+    def stats(self) -> dict:
+        """処理タイプごとの実行数・待ち行列の長さ・待ち時間（/health 用）"""
+        return {task_type: queue.stats() for task_type, queue in self.queues.items()}
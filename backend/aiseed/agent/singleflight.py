@@ -0,0 +1,88 @@
+"""
+AIseed Single-Flight
+同じ内容の同時AI問い合わせをまとめる
+
+同じキーの問い合わせが実行中なら新しく呼ばずに、実行中の結果を待って受け取る。
+実行中の問い合わせはタスクとして独立して動くため、最初に呼んだリクエストが
+切断（キャンセル）されても、待っている他のリクエストには結果が届く。
+
+    ai_query = flights.wrap("grow_analysis", ai_query)
+
+キャッシュ（ResponseCache.wrap）と併用する場合はこちらを外側にする
+（キャッシュの確認・保存も1回にまとまる）。
+"""
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Hashable
+
+from config import get_model_id
+from .response_cache import cache_key
+
+logger = logging.getLogger("aiseed.agent")
+
+
+class SingleFlight:
+    """実行中の同じ問い合わせをまとめる"""
+
+    def __init__(self):
+        # キー → 実行中のタスク
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        # 名前ごとの統計（calls: 呼び出し数、executions: 実際に実行した数、coalesced: まとめた数）
+        self._stats: dict[str, dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str, field: str):
+        with self._stats_lock:
+            counts = self._stats.setdefault(name, {"calls": 0, "executions": 0, "coalesced": 0})
+            counts["calls"] += 1
+            counts[field] += 1
+
+    async def do(self, name: str, key: Hashable, func: Callable[[], Awaitable]):
+        """
+        key が同じ実行中の呼び出しがあればその結果を、なければ func() を実行して返す
+
+        例外も待っている全員に同じものが届く。
+        """
+        flight_key = (name, key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda done: self._finish(flight_key, done))
+            self._count(name, "executions")
+        else:
+            self._count(name, "coalesced")
+            logger.info(f"[SingleFlight] coalesced name={name}")
+        return await asyncio.shield(task)
+
+    def _finish(self, flight_key: tuple, task: asyncio.Task):
+        self._inflight.pop(flight_key, None)
+        # 待っている全員がキャンセルされた場合も、例外を未回収のままにしない
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"[SingleFlight] failed name={flight_key[0]} - {task.exception()}")
+
+    def inflight(self, name: str) -> int:
+        """名前ごとの実行中の問い合わせ数"""
+        return sum(1 for n, _ in self._inflight if n == name)
+
+    def wrap(
+        self,
+        task_name: str,
+        ai_query: Callable[[str], Awaitable[str]]
+    ) -> Callable[[str], Awaitable[str]]:
+        """ai_query を包む（キーは ResponseCache と同じ: 処理名 + モデルID + 正規化したプロンプト）"""
+
+        async def coalesced_query(prompt: str) -> str:
+            key = cache_key(task_name, get_model_id(task_name), prompt)
+            return await self.do(task_name, key, lambda: ai_query(prompt))
+
+        return coalesced_query
+
+    def stats(self) -> dict:
+        """名前ごとの呼び出し数・実行数・まとめた数（/health 用）"""
+        with self._stats_lock:
+            return {
+                name: {**counts, "inflight": self.inflight(name)}
+                for name, counts in self._stats.items()
+            }
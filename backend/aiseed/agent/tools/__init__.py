@@ -6,13 +6,20 @@ from .insight import InsightTools
 from .skill import SkillTools
 from .history import HistoryTools
 from .experience import SparkExperience, TaskResult, TASKS, TASK_ORDER
+from .registry import ToolRegistry
+from .sessions import SessionStore, MemorySessionStore, SQLiteSessionStore, create_session_store
 
 __all__ = [
     "InsightTools",
     "SkillTools",
     "HistoryTools",
+    "ToolRegistry",
     "SparkExperience",
     "TaskResult",
     "TASKS",
     "TASK_ORDER",
+    "SessionStore",
+    "MemorySessionStore",
+    "SQLiteSessionStore",
+    "create_session_store",
 ]
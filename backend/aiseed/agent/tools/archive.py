@@ -0,0 +1,318 @@
+"""
+AIseed Spark Experience Archive
+体験タスクの生の結果（タップ列・配置座標など）を日ごとに保存する
+
+ファイル構成（user_memory/experience_archive/）:
+  ├── .lock             # 追記・読み込み（共有）と締め処理（排他）のロック（全ワーカー共通）
+  ├── 2026-06-01.npz     # 締めた日: 列ごとのNumPy配列（圧縮）
+  └── 2026-06-02.jsonl   # 締める前の日: セッション完了ごとに追記（1行1件のTaskResult）
+
+結果はJSONLに追記し、メンテナンスコマンド（python -m agent.maintenance seal-archive）で
+日が過ぎた分を列形式の .npz に変換する（APIの処理中には締めない）。
+.npz は JSONを解析せずに配列として読めるため、
+数百万件のタップの集計や TaskAnalyzer の再分析を日ごとのストリームで行える。
+
+.npz の列（N = 結果の件数）:
+  task_id, user_id, session_id, archived_at,
+  selected_option, other_text, selected_color, completed_at   # 文字列（Noneは空文字）
+  duration_ms, hesitation_count                               # int64
+  tap_x, tap_y, has_tap                                       # tap_position（キーがなければnan）
+  arranged_offsets (N+1), arranged_id, arranged_x, arranged_y # arranged_positions（全件をつないだ値）
+  tap_offsets (N+1), tap_time_ms, tap_seq_x, tap_seq_y        # tap_sequence（全件をつないだ値）
+i件目の配置は arranged_*[arranged_offsets[i]:arranged_offsets[i+1]]。
+"""
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+from .experience import TaskAnalyzer, TaskResult
+from .batch import pad_rows, analyze_observe_batch, analyze_arrange_batch, analyze_rhythm_batch
+
+logger = logging.getLogger("aiseed.experience")
+
+LOCK_FILE = ".lock"
+
+STRING_COLUMNS = (
+    "task_id", "user_id", "session_id", "archived_at",
+    "selected_option", "other_text", "selected_color", "completed_at",
+)
+# TaskResult で Optional の文字列（空文字はNoneに戻す）
+OPTIONAL_STRING_COLUMNS = ("selected_option", "other_text", "selected_color")
+INT_COLUMNS = ("duration_ms", "hesitation_count")
+
+
+def _float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _offsets(rows: list[list]) -> np.ndarray:
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=offsets[1:])
+    return offsets
+
+
+def to_columns(records: list[dict]) -> dict[str, np.ndarray]:
+    """TaskResult形式の dict のリスト → 列ごとの配列"""
+    columns = {
+        name: np.array([r.get(name) or "" for r in records], dtype=str)
+        for name in STRING_COLUMNS
+    }
+    for name in INT_COLUMNS:
+        columns[name] = np.array([r.get(name) or 0 for r in records], dtype=np.int64)
+
+    taps = [r.get("tap_position") or {} for r in records]
+    columns["tap_x"] = np.array([_float(t.get("x")) for t in taps], dtype=np.float64)
+    columns["tap_y"] = np.array([_float(t.get("y")) for t in taps], dtype=np.float64)
+    columns["has_tap"] = np.array([bool(t) for t in taps], dtype=bool)
+
+    positions = [r.get("arranged_positions") or [] for r in records]
+    columns["arranged_offsets"] = _offsets(positions)
+    flat = list(chain.from_iterable(positions))
+    columns["arranged_id"] = np.array([p.get("id") or "" for p in flat], dtype=str)
+    columns["arranged_x"] = np.array([_float(p.get("x")) for p in flat], dtype=np.float64)
+    columns["arranged_y"] = np.array([_float(p.get("y")) for p in flat], dtype=np.float64)
+
+    sequences = [r.get("tap_sequence") or [] for r in records]
+    columns["tap_offsets"] = _offsets(sequences)
+    flat = list(chain.from_iterable(sequences))
+    columns["tap_time_ms"] = np.array([_float(t.get("time_ms")) for t in flat], dtype=np.float64)
+    columns["tap_seq_x"] = np.array([_float(t.get("x")) for t in flat], dtype=np.float64)
+    columns["tap_seq_y"] = np.array([_float(t.get("y")) for t in flat], dtype=np.float64)
+    return columns
+
+
+def concat_columns(parts: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    """列形式のデータを連結（オフセットは件数をずらしてつなぐ）"""
+    parts = [p for p in parts if len(p["task_id"])]
+    if not parts:
+        return to_columns([])
+    columns = {}
+    for name in parts[0]:
+        if name.endswith("_offsets"):
+            shifted, base = [parts[0][name][:1]], 0
+            for part in parts:
+                shifted.append(part[name][1:] + base)
+                base += int(part[name][-1])
+            columns[name] = np.concatenate(shifted)
+        else:
+            columns[name] = np.concatenate([part[name] for part in parts])
+    return columns
+
+
+def to_records(columns: dict[str, np.ndarray]) -> list[dict]:
+    """列ごとの配列 → TaskResult形式の dict のリスト（nanのキーは省く）"""
+    def point(keys: tuple, values: tuple) -> dict:
+        return {k: v for k, v in zip(keys, values) if not (isinstance(v, float) and np.isnan(v))}
+
+    records = []
+    arranged = columns["arranged_offsets"].tolist()
+    sequence = columns["tap_offsets"].tolist()
+    lists = {name: columns[name].tolist() for name in columns if not name.endswith("_offsets")}
+    for i in range(len(columns["task_id"])):
+        record = {name: lists[name][i] for name in STRING_COLUMNS}
+        record.update({name: lists[name][i] or None for name in OPTIONAL_STRING_COLUMNS})
+        record.update({name: lists[name][i] for name in INT_COLUMNS})
+        record["tap_position"] = (
+            point(("x", "y"), (lists["tap_x"][i], lists["tap_y"][i])) if lists["has_tap"][i] else None
+        )
+        start, stop = arranged[i], arranged[i + 1]
+        record["arranged_positions"] = [
+            {"id": lists["arranged_id"][j] or None, **point(("x", "y"), (lists["arranged_x"][j], lists["arranged_y"][j]))}
+            for j in range(start, stop)
+        ] or None
+        start, stop = sequence[i], sequence[i + 1]
+        record["tap_sequence"] = [
+            point(("time_ms", "x", "y"), (lists["tap_time_ms"][j], lists["tap_seq_x"][j], lists["tap_seq_y"][j]))
+            for j in range(start, stop)
+        ] or None
+        records.append(record)
+    return records
+
+
+class ExperienceArchive:
+    """体験タスクの結果の日別アーカイブ"""
+
+    def __init__(self, base_path: str = "user_memory/experience_archive"):
+        self.base_path = Path(base_path)
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        # 追記と締め処理を直列化（このプロセス内。プロセス間は _locked の flock）
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """
+        アーカイブのロック（uvicorn の複数ワーカー・メンテナンスコマンドの間でも有効）
+
+        追記と読み込みは共有、締め処理は排他。締め処理が .npz を書いてから JSONL を消すまでの間に、
+        別のプロセスが同じ日を締めたり（二重に数える）、消される JSONL に追記したり（失われる）しない。
+        """
+        with self._lock, open(self.base_path / LOCK_FILE, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield  # 閉じるとロックも外れる
+
+    def _staging_path(self, day: str) -> Path:
+        return self.base_path / f"{day}.jsonl"
+
+    def _sealed_path(self, day: str) -> Path:
+        return self.base_path / f"{day}.npz"
+
+    # ==================== 書き込み ====================
+
+    def append(self, results: list[dict], now: Optional[datetime] = None):
+        """1セッション分の結果を当日のJSONLに追記（締め処理はメンテナンスコマンドで行う）"""
+        now = now or datetime.now()
+        day = now.strftime("%Y-%m-%d")
+        archived_at = now.isoformat()
+        lines = "".join(
+            json.dumps({**r, "archived_at": archived_at}, ensure_ascii=False, default=str) + "\n"
+            for r in results
+        )
+        with self._locked(exclusive=False):
+            with open(self._staging_path(day), "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def seal(self, day: str) -> int:
+        """その日のJSONLを列形式に変換（既存の .npz があれば連結）。締めた後の件数"""
+        with self._locked(exclusive=True):
+            return self._seal(day)
+
+    def seal_before(self, day: str) -> list[str]:
+        """day より前の日のJSONLをすべて締める"""
+        with self._locked(exclusive=True):
+            sealed = []
+            for staging_day in self._staging_days():
+                if staging_day < day:
+                    self._seal(staging_day)
+                    sealed.append(staging_day)
+            return sealed
+
+    def _seal(self, day: str) -> int:
+        staging = self._staging_path(day)
+        if not staging.exists():
+            return len(self._read_day(day)["task_id"])
+
+        columns = concat_columns([self._read_sealed(day), to_columns(self._read_staging(day))])
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_path, prefix=f".{day}.", suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **columns)
+            os.replace(tmp_path, self._sealed_path(day))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        staging.unlink(missing_ok=True)
+        logger.info(f"[Experience] Archive sealed: day={day} results={len(columns['task_id'])}")
+        return len(columns["task_id"])
+
+    # ==================== 読み込み ====================
+
+    def _staging_days(self) -> list[str]:
+        return sorted(path.stem for path in self.base_path.glob("*.jsonl"))
+
+    def days(self) -> list[str]:
+        """結果のある日（古い順）"""
+        return sorted({path.stem for path in self.base_path.glob("*.npz")} | set(self._staging_days()))
+
+    def _read_sealed(self, day: str) -> dict[str, np.ndarray]:
+        path = self._sealed_path(day)
+        if not path.exists():
+            return to_columns([])
+        with np.load(path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    def _read_staging(self, day: str) -> list[dict]:
+        try:
+            with open(self._staging_path(day), "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        # 書き込み途中の行は読まない
+        return [json.loads(line) for line in lines if line.endswith("\n")]
+
+    def read_day(self, day: str) -> dict[str, np.ndarray]:
+        """その日の結果を列形式で（締める前の分も含む）"""
+        with self._locked(exclusive=False):
+            return self._read_day(day)
+
+    def _read_day(self, day: str) -> dict[str, np.ndarray]:
+        return concat_columns([self._read_sealed(day), to_columns(self._read_staging(day))])
+
+    def iter_days(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[tuple[str, dict[str, np.ndarray]]]:
+        """start〜end（両端を含む）の (日付, 列) を1日ずつ読む"""
+        for day in self.days():
+            if (start is None or day >= start) and (end is None or day <= end):
+                yield day, self.read_day(day)
+
+
+# ==================== 再分析 ====================
+
+def _segments(offsets: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """選んだ行の (各行の長さ, つないだ値の中の位置のマスク)"""
+    lengths = np.diff(offsets)
+    element_rows = np.repeat(np.arange(len(lengths)), lengths)
+    return lengths[rows], rows[element_rows]
+
+
+def analyze_columns(columns: dict[str, np.ndarray]) -> list[Optional[dict]]:
+    """
+    列形式の結果を一括分析（行と同じ順）
+
+    Returns:
+        TaskAnalyzer.analyze_* と同じ分析結果。分析対象でないタスク（story, color）はNone
+    """
+    task_ids = columns["task_id"]
+    analyses: list[Optional[dict]] = [None] * len(task_ids)
+
+    def put(rows: np.ndarray, task_analyses: list[dict]):
+        for i, analysis in zip(np.flatnonzero(rows).tolist(), task_analyses):
+            analyses[i] = analysis
+
+    rows = task_ids == "observe"
+    put(rows, analyze_observe_batch(
+        np.nan_to_num(columns["tap_x"][rows], nan=0.5),
+        np.nan_to_num(columns["tap_y"][rows], nan=0.5),
+        columns["has_tap"][rows],
+    ))
+
+    rows = task_ids == "arrange"
+    counts, elements = _segments(columns["arranged_offsets"], rows)
+    xy = np.stack([columns["arranged_x"][elements], columns["arranged_y"][elements]], axis=1)
+    xy = pad_rows(np.nan_to_num(xy, nan=0.0), counts)
+    put(rows, analyze_arrange_batch(xy[:, :, 0], xy[:, :, 1], counts, columns["duration_ms"][rows]))
+
+    rows = task_ids == "rhythm"
+    counts, elements = _segments(columns["tap_offsets"], rows)
+    times = pad_rows(np.nan_to_num(columns["tap_time_ms"][elements], nan=0.0), counts)
+    put(rows, analyze_rhythm_batch(times, counts))
+
+    rows = task_ids == "sound"
+    by_option: dict[str, dict] = {}
+    sound_analyses = []
+    for option in columns["selected_option"][rows].tolist():
+        if option not in by_option:
+            by_option[option] = TaskAnalyzer.analyze_sound(
+                TaskResult(task_id="sound", user_id="", session_id="", duration_ms=0, selected_option=option or None)
+            )
+        sound_analyses.append(dict(by_option[option]))
+    put(rows, sound_analyses)
+    return analyses
+
+
+def reanalyze(
+    archive: ExperienceArchive,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[tuple[str, dict[str, np.ndarray], list[Optional[dict]]]]:
+    """アーカイブを1日ずつ読み、(日付, 列, 分析結果) を返すストリーム"""
+    for day, columns in archive.iter_days(start, end):
+        yield day, columns, analyze_columns(columns)
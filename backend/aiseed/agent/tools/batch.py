@@ -0,0 +1,206 @@
+"""
+AIseed Spark Experience Batch Analysis
+体験タスク結果の一括分析（保存済みセッションの再分析用）
+
+TaskAnalyzer の1件ずつの分析と同じ判定を、NumPy配列にまとめた多数の結果に対して行う。
+可変長のデータ（配置・タップ列）は (件数, 最大長) にゼロ埋めし、件数の配列を添える。
+
+浮動小数点の計算順序が1件ずつの分析と異なるため、しきい値のごく近くの値だけは
+1件ずつの分析と同じ式で計算し直す（結果は TaskAnalyzer と完全に一致する）。
+
+    arrays = pack_arrange(results)
+    analyses = analyze_arrange_batch(**arrays)
+"""
+from itertools import chain
+from typing import Callable, Optional
+
+import numpy as np
+
+from .experience import (
+    TaskAnalyzer,
+    TaskResult,
+    OBSERVE_CENTER_RADIUS,
+    ARRANGE_QUICK_MS,
+    ARRANGE_REGULAR_VARIANCE,
+    RHYTHM_REGULAR_VARIANCE,
+    center_distance,
+    variance,
+)
+
+# しきい値からの相対距離がこれ以下なら1件ずつ計算し直す
+BORDER_TOLERANCE = 1e-9
+
+
+# ==================== 配列への変換 ====================
+
+def pad_rows(flat: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """全行をつないだ値と各行の長さ → ゼロ埋めした (行数, 最大長, ...) の配列"""
+    width = int(counts.max()) if len(counts) else 0
+    values = np.zeros((len(counts), width) + flat.shape[1:], dtype=np.float64)
+    # 行優先で並んだマスク位置に、全行の値を一度に書き込む
+    values[np.arange(width) < counts[:, None]] = flat
+    return values
+
+
+def _lengths(rows: list[list]) -> np.ndarray:
+    return np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+
+
+def pack_observe(results: list[TaskResult]) -> dict[str, np.ndarray]:
+    """観察タスクの結果 → {"x", "y", "has_tap"}"""
+    taps = [r.tap_position or {} for r in results]
+    return {
+        "x": np.array([t.get("x", 0.5) for t in taps], dtype=np.float64),
+        "y": np.array([t.get("y", 0.5) for t in taps], dtype=np.float64),
+        "has_tap": np.array([bool(t) for t in taps], dtype=bool),
+    }
+
+
+def pack_arrange(results: list[TaskResult]) -> dict[str, np.ndarray]:
+    """配置タスクの結果 → {"xs", "ys", "counts", "duration_ms"}"""
+    positions = [r.arranged_positions or [] for r in results]
+    counts = _lengths(positions)
+    flat = np.array(
+        [(p.get("x", 0), p.get("y", 0)) for p in chain.from_iterable(positions)], dtype=np.float64
+    ).reshape(-1, 2)
+    xy = pad_rows(flat, counts)
+    return {
+        "xs": xy[:, :, 0],
+        "ys": xy[:, :, 1],
+        "counts": counts,
+        "duration_ms": np.array([r.duration_ms for r in results], dtype=np.int64),
+    }
+
+
+def pack_rhythm(results: list[TaskResult]) -> dict[str, np.ndarray]:
+    """リズムタスクの結果 → {"times", "counts"}"""
+    taps = [r.tap_sequence or [] for r in results]
+    counts = _lengths(taps)
+    flat = np.array([t.get("time_ms", 0) for t in chain.from_iterable(taps)], dtype=np.float64)
+    return {"times": pad_rows(flat, counts), "counts": counts}
+
+
+# ==================== 統計量 ====================
+
+def center_distances(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """画面中心からの距離"""
+    return np.sqrt((x - 0.5) ** 2 + (y - 0.5) ** 2)
+
+
+def _row_variances(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """各行の先頭counts件の分散（counts=0の行はnan）"""
+    mask = np.arange(values.shape[1]) < counts[:, None]
+    n = np.where(counts > 0, counts, np.nan)
+    mean = np.where(mask, values, 0.0).sum(axis=1) / n
+    deviation = np.where(mask, values - mean[:, None], 0.0)
+    return (deviation * deviation).sum(axis=1) / n
+
+
+def position_variances(xs: np.ndarray, ys: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """配置のx/y座標の分散"""
+    return _row_variances(xs, counts), _row_variances(ys, counts)
+
+
+def interval_stats(times: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """タップ間隔の平均と分散（タップ1件以下の行はnan）"""
+    intervals = np.diff(times, axis=1) if times.shape[1] > 1 else np.zeros((len(times), 0))
+    interval_counts = np.maximum(counts - 1, 0)
+    mask = np.arange(intervals.shape[1]) < interval_counts[:, None]
+    n = np.where(interval_counts > 0, interval_counts, np.nan)
+    mean = np.where(mask, intervals, 0.0).sum(axis=1) / n
+    return mean, _row_variances(intervals, interval_counts)
+
+
+def _near(values: np.ndarray, threshold: float) -> np.ndarray:
+    """しきい値のごく近く（計算順序で判定が変わりうる）"""
+    return np.abs(values - threshold) <= BORDER_TOLERANCE * abs(threshold)
+
+
+def _expand(codes: np.ndarray, make: Callable[[int], dict]) -> list[dict]:
+    """
+    判定の組み合わせ（コード）ごとの分析結果を各行に展開
+
+    同じコードの行は同じ結果になるため、コードごとに最初の行で make(i) を1回だけ呼び、
+    以降はその複製を返す。
+    """
+    templates: dict[int, dict] = {}
+    analyses = []
+    for i, code in enumerate(codes.tolist()):
+        template = templates.get(code)
+        if template is None:
+            template = templates[code] = make(i)
+        analyses.append(dict(template))
+    return analyses
+
+
+# ==================== 一括分析 ====================
+
+def analyze_observe_batch(x: np.ndarray, y: np.ndarray, has_tap: np.ndarray) -> list[dict]:
+    """TaskAnalyzer.analyze_observe と同じ結果を一括で"""
+    distances = center_distances(x, y)
+    for i in np.flatnonzero(_near(distances, OBSERVE_CENTER_RADIUS)):
+        distances[i] = center_distance(float(x[i]), float(y[i]))
+    codes = has_tap * (1 + (distances < OBSERVE_CENTER_RADIUS))
+    return _expand(codes, lambda i: TaskAnalyzer.observe_result(distances[i]) if has_tap[i] else {})
+
+
+def analyze_arrange_batch(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    counts: np.ndarray,
+    duration_ms: np.ndarray
+) -> list[dict]:
+    """TaskAnalyzer.analyze_arrange と同じ結果を一括で"""
+    x_var, y_var = position_variances(xs, ys, counts)
+    border = _near(x_var, ARRANGE_REGULAR_VARIANCE) | _near(y_var, ARRANGE_REGULAR_VARIANCE)
+    for i in np.flatnonzero(border & (counts >= 3)):
+        x_var[i] = variance(xs[i, :counts[i]].tolist())
+        y_var[i] = variance(ys[i, :counts[i]].tolist())
+    analyzed = counts >= 3
+    regular = (x_var < ARRANGE_REGULAR_VARIANCE) | (y_var < ARRANGE_REGULAR_VARIANCE)
+    codes = analyzed * (1 + regular + 2 * (duration_ms < ARRANGE_QUICK_MS))
+    return _expand(codes, lambda i: (
+        TaskAnalyzer.arrange_result(x_var[i], y_var[i], duration_ms[i]) if analyzed[i] else {}
+    ))
+
+
+def analyze_rhythm_batch(times: np.ndarray, counts: np.ndarray) -> list[dict]:
+    """TaskAnalyzer.analyze_rhythm と同じ結果を一括で"""
+    _, interval_var = interval_stats(times, counts)
+    analyzed = counts >= 3
+    for i in np.flatnonzero(_near(interval_var, RHYTHM_REGULAR_VARIANCE) & analyzed):
+        interval_var[i] = variance(np.diff(times[i, :counts[i]]).tolist())
+    codes = analyzed * (1 + (interval_var < RHYTHM_REGULAR_VARIANCE))
+    return _expand(codes, lambda i: TaskAnalyzer.rhythm_result(interval_var[i] if analyzed[i] else None))
+
+
+BATCH_ANALYZERS = {
+    "observe": (pack_observe, analyze_observe_batch),
+    "arrange": (pack_arrange, analyze_arrange_batch),
+    "rhythm": (pack_rhythm, analyze_rhythm_batch),
+}
+
+
+def analyze_results(results: list[TaskResult]) -> list[Optional[dict]]:
+    """
+    種類の混ざったタスク結果を一括分析（入力と同じ順）
+
+    Returns:
+        TaskAnalyzer.analyze_* と同じ分析結果。分析対象でないタスク（story, color）はNone
+    """
+    analyses: list[Optional[dict]] = [None] * len(results)
+    by_task: dict[str, list[int]] = {}
+    for i, result in enumerate(results):
+        by_task.setdefault(result.task_id, []).append(i)
+
+    for task_id, indexes in by_task.items():
+        if task_id in BATCH_ANALYZERS:
+            pack, analyze = BATCH_ANALYZERS[task_id]
+            task_analyses = analyze(**pack([results[i] for i in indexes]))
+        elif task_id == "sound":
+            task_analyses = [TaskAnalyzer.analyze_sound(results[i]) for i in indexes]
+        else:
+            continue
+        for i, analysis in zip(indexes, task_analyses):
+            analyses[i] = analysis
+    return analyses
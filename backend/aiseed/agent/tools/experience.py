@@ -5,10 +5,14 @@ AIseed Spark Experience Tasks
 質問しない、正解がない、ラベルを貼らない。
 体験させて反応を観察し、傾向を詩的に表現する。
 """
+import logging
 from typing import Optional
 from datetime import datetime
 from pydantic import BaseModel
 from memory.store import UserMemory
+from .sessions import SessionStore, MemorySessionStore
+
+logger = logging.getLogger("aiseed.experience")
 
 
 # ==================== タスク定義 ====================
@@ -151,6 +155,24 @@ class SessionProgress(BaseModel):
 
 # ==================== 分析ロジック ====================
 
+# 判定のしきい値（一括分析 agent/tools/batch.py と共通）
+OBSERVE_CENTER_RADIUS = 0.2  # 中心からの距離がこれ未満なら全体把握型
+ARRANGE_QUICK_MS = 10000  # 配置にかかった時間がこれ未満なら即断型
+ARRANGE_REGULAR_VARIANCE = 0.05  # x/yどちらかの分散がこれ未満なら規則性志向
+RHYTHM_REGULAR_VARIANCE = 10000  # タップ間隔の分散がこれ未満なら規則的
+
+
+def center_distance(x: float, y: float) -> float:
+    """画面中心からの距離（正規化座標）"""
+    return ((x - 0.5) ** 2 + (y - 0.5) ** 2) ** 0.5
+
+
+def variance(values: list) -> float:
+    """分散（母分散）"""
+    mean = sum(values) / len(values)
+    return sum((v - mean) ** 2 for v in values) / len(values)
+
+
 class TaskAnalyzer:
     """タスク結果の分析"""
 
@@ -163,9 +185,12 @@ class TaskAnalyzer:
         x, y = result.tap_position.get("x", 0.5), result.tap_position.get("y", 0.5)
 
         # 中心に近いか周辺か
-        center_distance = ((x - 0.5) ** 2 + (y - 0.5) ** 2) ** 0.5
+        return TaskAnalyzer.observe_result(center_distance(x, y))
 
-        if center_distance < 0.2:
+    @staticmethod
+    def observe_result(distance: float) -> dict:
+        """中心からの距離 → 観察タスクの分析結果"""
+        if distance < OBSERVE_CENTER_RADIUS:
             tendency = "全体把握型"
             description = "まず全体を見渡す傾向があるかもしれません"
         else:
@@ -218,11 +243,13 @@ class TaskAnalyzer:
         xs = [p.get("x", 0) for p in positions]
         ys = [p.get("y", 0) for p in positions]
 
-        x_variance = sum((x - sum(xs)/len(xs))**2 for x in xs) / len(xs)
-        y_variance = sum((y - sum(ys)/len(ys))**2 for y in ys) / len(ys)
+        return TaskAnalyzer.arrange_result(variance(xs), variance(ys), duration)
 
+    @staticmethod
+    def arrange_result(x_variance: float, y_variance: float, duration: int) -> dict:
+        """配置の分散・かかった時間 → 配置タスクの分析結果"""
         # 時間による判定
-        if duration < 10000:  # 10秒未満
+        if duration < ARRANGE_QUICK_MS:  # 10秒未満
             speed = "即断型"
             speed_desc = "直感で動くタイプかもしれません"
         else:
@@ -230,7 +257,7 @@ class TaskAnalyzer:
             speed_desc = "じっくり考えるタイプかもしれません"
 
         # 配置パターンによる判定
-        if x_variance < 0.05 or y_variance < 0.05:
+        if x_variance < ARRANGE_REGULAR_VARIANCE or y_variance < ARRANGE_REGULAR_VARIANCE:
             pattern = "規則性志向"
             pattern_desc = "きちんと整理することが好きかもしれません"
         else:
@@ -249,11 +276,7 @@ class TaskAnalyzer:
         taps = result.tap_sequence or []
 
         if len(taps) < 3:
-            return {
-                "tendency": "控えめ",
-                "description": "慎重に様子を見るタイプかもしれません",
-                "confidence": 0.3
-            }
+            return TaskAnalyzer.rhythm_result(None)
 
         # タップ間隔の分析
         intervals = []
@@ -264,10 +287,19 @@ class TaskAnalyzer:
         if not intervals:
             return {}
 
-        avg_interval = sum(intervals) / len(intervals)
-        variance = sum((i - avg_interval)**2 for i in intervals) / len(intervals)
+        return TaskAnalyzer.rhythm_result(variance(intervals))
+
+    @staticmethod
+    def rhythm_result(interval_variance: Optional[float]) -> dict:
+        """タップ間隔の分散 → リズムタスクの分析結果（Noneは3タップ未満）"""
+        if interval_variance is None:
+            return {
+                "tendency": "控えめ",
+                "description": "慎重に様子を見るタイプかもしれません",
+                "confidence": 0.3
+            }
 
-        if variance < 10000:  # 間隔が一定
+        if interval_variance < RHYTHM_REGULAR_VARIANCE:  # 間隔が一定
             return {
                 "tendency": "規則的",
                 "description": "自分のリズムを持っているかもしれません",
@@ -331,9 +363,16 @@ class TaskAnalyzer:
 class SparkExperience:
     """Spark体験タスク管理"""
 
-    def __init__(self, memory: UserMemory):
+    def __init__(self, memory: UserMemory, sessions: Optional[SessionStore] = None, archive=None):
+        """
+        Args:
+            memory: ユーザーメモリ
+            sessions: 進行中のセッションの保存先（複数ワーカーでは共有の保存先を渡す）
+            archive: 完了したセッションの生の結果の保存先（ExperienceArchive、Noneなら保存しない）
+        """
         self.memory = memory
-        self.sessions: dict[str, SessionProgress] = {}
+        self.sessions = sessions or MemorySessionStore()
+        self.archive = archive
 
     def start_session(self, user_id: str, session_id: str) -> dict:
         """体験セッションを開始"""
@@ -341,7 +380,8 @@ class SparkExperience:
             session_id=session_id,
             user_id=user_id
         )
-        self.sessions[session_id] = progress
+        self.sessions.delete(session_id)  # 同じIDで開始し直した場合は最初から
+        self.sessions.put(session_id, progress.model_dump())
 
         return {
             "session_id": session_id,
@@ -371,9 +411,10 @@ class SparkExperience:
 
     def submit_result(self, result: TaskResult) -> dict:
         """タスク結果を送信"""
-        session = self.sessions.get(result.session_id)
-        if not session:
+        data = self.sessions.get(result.session_id)
+        if not data:
             return {"error": "Session not found"}
+        session = SessionProgress(**data)
 
         # 結果を保存
         session.results.append(result.model_dump())
@@ -382,6 +423,7 @@ class SparkExperience:
 
         # 次のタスクがあるか
         if session.current_task_index < len(TASK_ORDER):
+            self.sessions.put(session.session_id, session.model_dump())
             next_task_id = TASK_ORDER[session.current_task_index]
             return {
                 "status": "continue",
@@ -391,6 +433,7 @@ class SparkExperience:
             }
         else:
             # 全タスク完了 → 分析
+            self.sessions.delete(session.session_id)
             return self._complete_session(session)
 
     def _complete_session(self, session: SessionProgress) -> dict:
@@ -401,16 +444,23 @@ class SparkExperience:
         # 分析
         analysis = TaskAnalyzer.analyze_all(results)
 
-        # メモリに保存（insightとして記録）
-        for tendency in analysis.get("tendencies", []):
-            if tendency:
-                self.memory.add_insight(
-                    user_id=session.user_id,
-                    type="personality",
-                    content=tendency,
-                    context="Spark体験タスクから発見",
-                    confidence=0.3  # 体験タスクは確信度低め
-                )
+        # 生の結果をアーカイブ（再分析用。失敗しても体験の完了は妨げない）
+        if self.archive is not None:
+            try:
+                self.archive.append(session.results)
+            except Exception as e:
+                logger.warning(f"[Experience] Archive failed: session={session.session_id} error={e}")
+
+        # メモリに保存（insightとして記録、まとめて1回で書き込む）
+        with self.memory.batch(session.user_id) as tx:
+            for tendency in analysis.get("tendencies", []):
+                if tendency:
+                    tx.add_insight(
+                        type="personality",
+                        content=tendency,
+                        context="Spark体験タスクから発見",
+                        confidence=0.3  # 体験タスクは確信度低め
+                    )
 
         # Grow/Createへの提案を生成
         suggestions = self._generate_suggestions(analysis)
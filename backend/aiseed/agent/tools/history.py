@@ -119,14 +119,14 @@ class HistoryTools:
         key_discoveries: list[str] = None
     ) -> dict:
         """要約を保存"""
-        self.memory.add_history(
-            user_id=user_id,
-            session_id=session_id,
-            service=service,
-            summary=summary,
-            key_discoveries=key_discoveries
-        )
-        self.memory.increment_conversation_count(user_id)
+        with self.memory.batch(user_id) as tx:
+            tx.add_history(
+                session_id=session_id,
+                service=service,
+                summary=summary,
+                key_discoveries=key_discoveries
+            )
+            tx.increment_conversation_count()
 
         return {
             "status": "saved",
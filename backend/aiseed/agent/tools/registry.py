@@ -0,0 +1,162 @@
+"""
+AIseed Tool Registry
+エージェントのツール定義とハンドラーの登録簿
+
+エージェントの生成時に一度だけ各ツール群（InsightTools等）から定義とハンドラーを集め、
+定義とハンドラーの対応・引数を検証する。以降の呼び出しは名前で直接引く。
+
+- 同期ハンドラー（ファイルI/Oを伴う）はI/O用スレッドプールで、async ハンドラーはそのまま実行
+- 呼び出し側が指定したロックは同期ハンドラーの実行中だけ保持する
+  （async ハンドラーは UserMemory.*_async など自分でロックを取るため、保持したまま await しない）
+- ツールごとの呼び出し回数・エラー数・所要時間を記録（/health 用）
+"""
+import inspect
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from storage import run_io, file_locks
+
+logger = logging.getLogger("aiseed.agent")
+
+
+class ToolStats:
+    """1ツールの呼び出し統計"""
+
+    __slots__ = ("calls", "errors", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class ToolRegistry:
+    """ツール定義とハンドラーの登録簿（生成時に検証済み）"""
+
+    def __init__(self, toolsets: list):
+        """
+        Args:
+            toolsets: get_tool_definitions() / get_handlers() を持つツール群
+
+        Raises:
+            ValueError: 定義とハンドラーが対応しない、名前の重複、引数の不一致
+        """
+        self._definitions: list[dict] = []
+        self._handlers: dict[str, Callable] = {}
+        self._is_async: dict[str, bool] = {}
+        for toolset in toolsets:
+            definitions = toolset.get_tool_definitions()
+            handlers = toolset.get_handlers()
+            for definition in definitions:
+                name = definition.get("name")
+                if name in self._handlers:
+                    raise ValueError(f"Duplicate tool: {name}")
+                if name not in handlers:
+                    raise ValueError(f"Tool has no handler: {name}")
+                self._validate(definition, handlers[name])
+                self._definitions.append(definition)
+                self._handlers[name] = handlers[name]
+                self._is_async[name] = inspect.iscoroutinefunction(handlers[name])
+            extra = set(handlers) - {d.get("name") for d in definitions}
+            if extra:
+                raise ValueError(f"Handler has no tool definition: {', '.join(sorted(extra))}")
+
+        self._stats = {name: ToolStats() for name in self._handlers}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def _validate(definition: dict, handler: Callable):
+        """定義のスキーマとハンドラーの引数が対応しているか"""
+        name = definition["name"]
+        schema = definition.get("input_schema")
+        if not definition.get("description") or not isinstance(schema, dict) or schema.get("type") != "object":
+            raise ValueError(f"Invalid tool definition: {name}")
+
+        properties = set(schema.get("properties", {}))
+        required = set(schema.get("required", []))
+        if not required <= properties:
+            raise ValueError(f"Tool {name}: required not in properties: {', '.join(sorted(required - properties))}")
+
+        parameters = inspect.signature(handler).parameters
+        if any(p.kind == p.VAR_KEYWORD for p in parameters.values()):
+            return
+        accepted = {n for n, p in parameters.items() if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)}
+        if properties - accepted:
+            raise ValueError(f"Tool {name}: handler does not accept: {', '.join(sorted(properties - accepted))}")
+        mandatory = {n for n in accepted if parameters[n].default is inspect.Parameter.empty}
+        if mandatory - required:
+            raise ValueError(f"Tool {name}: handler requires non-required: {', '.join(sorted(mandatory - required))}")
+
+    # ==================== 参照 ====================
+
+    @property
+    def definitions(self) -> list[dict]:
+        """全ツール定義（生成時に作ったリストをそのまま返す。変更しないこと）"""
+        return self._definitions
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._handlers)
+
+    def get(self, name: str) -> Optional[Callable]:
+        """ツール名からハンドラーを取得"""
+        return self._handlers.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._handlers
+
+    def __len__(self) -> int:
+        return len(self._handlers)
+
+    # ==================== 実行 ====================
+
+    async def execute(self, name: str, arguments: dict, lock_keys: Optional[list] = None) -> dict:
+        """
+        ツールを実行（未登録・例外は {"error": ...} を返す）
+
+        Args:
+            lock_keys: 同期ハンドラーの実行中に保持する file_locks のキー
+                       （async ハンドラーには適用しない。ロックは再入不可のため、
+                       保持したまま *_async を await すると自分自身を待ち続ける）
+        """
+        handler = self._handlers.get(name)
+        if handler is None:
+            return {"error": f"Unknown tool: {name}"}
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            if self._is_async[name]:
+                return await handler(**arguments)
+            async with file_locks.hold(*(lock_keys or [])):
+                return await run_io(handler, **arguments)
+        except Exception as e:
+            failed = True
+            logger.error(f"Tool execution error: {name} - {e}")
+            return {"error": str(e)}
+        finally:
+            self._record(name, (time.perf_counter() - start) * 1000, failed)
+
+    def _record(self, name: str, elapsed_ms: float, failed: bool):
+        with self._stats_lock:
+            stats = self._stats[name]
+            stats.calls += 1
+            stats.errors += failed
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def stats(self) -> dict:
+        """ツールごとの呼び出し統計（/health 用）"""
+        with self._stats_lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
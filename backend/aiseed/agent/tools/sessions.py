@@ -0,0 +1,270 @@
+"""
+AIseed Spark Experience Session Stores
+体験タスクのセッション保存先
+
+- MemorySessionStore: プロセス内のLRU（単一ワーカー・開発用）
+- SQLiteSessionStore: 組み込みSQLite（WALモード）
+    複数ワーカー間で共有され、再起動後も残る
+
+どちらも次の条件でセッションを破棄する:
+- ttl_sec: 開始からの経過時間
+- idle_sec: 最後のアクセスからの経過時間
+- max_sessions: 上限を超えたら最後のアクセスが古いものから
+
+セッションは SessionProgress.model_dump() と同じ形式の dict でやり取りする。
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+EVICTION_REASONS = ("ttl", "idle", "capacity")
+
+
+class SessionStore:
+    """セッション保存先の基底クラス"""
+
+    kind = ""
+
+    def __init__(
+        self,
+        ttl_sec: float = 24 * 3600,
+        idle_sec: float = 3600,
+        max_sessions: int = 10000,
+        clock: Callable[[], float] = time.time
+    ):
+        self.ttl_sec = ttl_sec
+        self.idle_sec = idle_sec
+        self.max_sessions = max_sessions
+        self.clock = clock
+        # 破棄件数（このプロセスで破棄した分）
+        self.evictions = {reason: 0 for reason in EVICTION_REASONS}
+
+    def _expired_reason(self, created_at: float, accessed_at: float, now: float) -> Optional[str]:
+        if now - created_at > self.ttl_sec:
+            return "ttl"
+        if now - accessed_at > self.idle_sec:
+            return "idle"
+        return None
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """セッションを取得（期限切れならNone）。最終アクセス時刻を更新する"""
+        raise NotImplementedError
+
+    def put(self, session_id: str, session: dict):
+        """セッションを保存（新規・更新）"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        """セッションを削除（完了時）"""
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """期限切れのセッションをまとめて破棄（破棄した件数）"""
+        raise NotImplementedError
+
+    def active_count(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """メトリクス（/health 用）"""
+        return {
+            "backend": self.kind,
+            "active_sessions": self.active_count(),
+            "max_sessions": self.max_sessions,
+            "evictions": dict(self.evictions),
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """プロセス内のLRU（ワーカー間で共有されず、再起動で消える）"""
+
+    kind = "memory"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # session_id → (作成時刻, 最終アクセス時刻, セッション)。最終アクセスが古い順
+        self._sessions: OrderedDict[str, tuple[float, float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        now = self.clock()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            created_at, accessed_at, session = entry
+            reason = self._expired_reason(created_at, accessed_at, now)
+            if reason:
+                del self._sessions[session_id]
+                self.evictions[reason] += 1
+                return None
+            self._sessions[session_id] = (created_at, now, session)
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session_id: str, session: dict):
+        now = self.clock()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            created_at = entry[0] if entry else now
+            self._sessions[session_id] = (created_at, now, session)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions["capacity"] += 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self) -> int:
+        now = self.clock()
+        purged = 0
+        with self._lock:
+            for session_id, (created_at, accessed_at, _) in list(self._sessions.items()):
+                reason = self._expired_reason(created_at, accessed_at, now)
+                if reason:
+                    del self._sessions[session_id]
+                    self.evictions[reason] += 1
+                    purged += 1
+        return purged
+
+    def active_count(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite（WALモード）
+
+    - 同じファイルを指す全ワーカーでセッションを共有
+    - 接続はスレッドごとに保持（スレッドプールからの利用に対応）
+    - 期限切れの破棄は保存時にまとめて行う（インデックスで範囲削除）
+    """
+
+    kind = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions (created_at);
+    CREATE INDEX IF NOT EXISTS idx_sessions_accessed ON sessions (accessed_at);
+    """
+
+    def __init__(self, path: str = "user_memory/spark_sessions.db", **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = Path(path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """スレッドローカルな接続を取得"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[dict]:
+        now = self.clock()
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                "SELECT data, created_at, accessed_at FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            data, created_at, accessed_at = row
+            reason = self._expired_reason(created_at, accessed_at, now)
+            if reason:
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self.evictions[reason] += 1
+                return None
+            conn.execute(
+                "UPDATE sessions SET accessed_at = ? WHERE session_id = ?", (now, session_id)
+            )
+        return json.loads(data)
+
+    def put(self, session_id: str, session: dict):
+        now = self.clock()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """INSERT INTO sessions (session_id, data, created_at, accessed_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT (session_id) DO UPDATE SET
+                       data = excluded.data,
+                       accessed_at = excluded.accessed_at""",
+                (session_id, json.dumps(session, ensure_ascii=False, default=str), now, now)
+            )
+            self._purge_expired(conn, now)
+            excess = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+            if excess > 0:
+                conn.execute(
+                    """DELETE FROM sessions WHERE session_id IN (
+                           SELECT session_id FROM sessions ORDER BY accessed_at LIMIT ?)""",
+                    (excess,)
+                )
+                self.evictions["capacity"] += excess
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _purge_expired(self, conn: sqlite3.Connection, now: float) -> int:
+        ttl = conn.execute(
+            "DELETE FROM sessions WHERE created_at < ?", (now - self.ttl_sec,)
+        ).rowcount
+        idle = conn.execute(
+            "DELETE FROM sessions WHERE accessed_at < ?", (now - self.idle_sec,)
+        ).rowcount
+        self.evictions["ttl"] += ttl
+        self.evictions["idle"] += idle
+        return ttl + idle
+
+    def purge_expired(self) -> int:
+        conn = self._conn()
+        with conn:
+            return self._purge_expired(conn, self.clock())
+
+    def active_count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        """このスレッドの接続を閉じる"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+SESSION_STORES = {
+    "memory": MemorySessionStore,
+    "sqlite": SQLiteSessionStore,
+}
+
+
+def create_session_store(kind: str, **kwargs) -> SessionStore:
+    """設定名からセッション保存先を生成（"memory" / "sqlite"）"""
+    store_class = SESSION_STORES.get(kind)
+    if store_class is None:
+        raise ValueError(f"Unknown session store: {kind}")
+    if store_class is MemorySessionStore:
+        kwargs.pop("path", None)
+    return store_class(**kwargs)
@@ -0,0 +1,2071 @@
+#!/usr/bin/env python3
+"""
+AIseed ベンチマークスクリプト
+
+サーバー・DB不要。一時ディレクトリ上でサービスを直接呼び出して計測する。
+
+使用方法:
+    python benchmark.py --memory-batch   # 会話分析の保存（個別書き込み vs 一括書き込み）
+    python benchmark.py --memory-cache   # get_user_summary（キャッシュなし vs LRUキャッシュ）
+    python benchmark.py --load           # 同時接続200でのAPIレイテンシ（ブロッキング vs スレッドプール）
+    python benchmark.py --stress         # 同じファイルへの並行追記（ロックなし vs ファイル単位ロック）
+    python benchmark.py --observations   # 観察記録の追加・ページング（JSON配列 vs JSONL + インデックス）
+    python benchmark.py --stats          # 植物・ユーザー統計（全件集計 vs 集計済みの値）
+    python benchmark.py --today          # 全植物の今日・直近30日の観察（植物500件×3年）
+    python benchmark.py --followers      # 農家のフォロワー一覧・数（全ユーザー走査 vs フォロワー索引）
+    python benchmark.py --user-checkins  # ユーザーの来店履歴（全農家走査 vs ユーザー別来店記録、農家数を変えて）
+    python benchmark.py --sessions       # 体験セッション（ワーカー2つに交互に振り分け、プロセス内 vs SQLite共有）
+    python benchmark.py --analyzer       # 体験タスク結果の再分析（1件ずつ vs NumPy一括）
+    python benchmark.py --archive        # 体験タスク結果のアーカイブ再分析（JSONL vs 列形式 .npz）
+    python benchmark.py --tools          # ツール定義・ハンドラーの取得（呼び出しごとに組み立て vs 登録簿）
+    python benchmark.py --stream         # 会話の最初の1バイトまでの時間（全文を待つ vs SSE、スタブSDK）
+    python benchmark.py --prompt         # 会話プロンプトの組み立て（毎回全体を作る vs PromptBuilder）
+    python benchmark.py --context        # 長いセッションのプロンプトの大きさと応答時間（全履歴 vs 窓 + 要約）
+    python benchmark.py --ai-cache       # 同じ内容の診断の繰り返し（キャッシュなし vs メモリ + SQLite）
+    python benchmark.py --coalesce       # 同じ内容の診断の同時実行（個別に呼ぶ vs single-flight）
+    python benchmark.py --scheduler      # 会話分析の集中中の対話の待ち時間（先着順 vs 実行枠 + 優先順位）
+    python benchmark.py --notify         # 購読者への通知（1件ずつ順に送る vs 並行・バッチ・再送）
+    python benchmark.py --outbox         # 投稿APIの応答（送信を待つ vs outbox）とワーカーの送信・再開・デッドレター
+    python benchmark.py --parser         # 出荷メッセージの商品の抽出（野菜ごとの正規表現 vs 1回の走査）
+    python benchmark.py --parse-batch    # 出荷メッセージの一括解析（AIを1件ずつ vs まとめて、ルールベースのプロセスプール）
+    python benchmark.py --cascade        # 出荷メッセージの解析（AIを先に呼ぶ vs ルールベースの確信度が低いときだけAI）
+    python benchmark.py --all            # 全ベンチマーク
+"""
+import sys
+import os
+
+# パスを追加（各モジュールのため）
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import json
+import logging
+import tempfile
+import time
+
+
+# ===========================================
+# ヘルパー
+# ===========================================
+
+def count_calls(obj, method_names: list[str]) -> dict:
+    """インスタンスのメソッド呼び出し回数を数える（計測用のラッパーを差し込む）"""
+    counts = {name: 0 for name in method_names}
+
+    for name in method_names:
+        original = getattr(obj, name)
+
+        def wrapper(*args, _name=name, _original=original, **kwargs):
+            counts[_name] += 1
+            return _original(*args, **kwargs)
+
+        setattr(obj, name, wrapper)
+    return counts
+
+
+def print_row(label: str, elapsed: float, iterations: int, extra: str = ""):
+    """計測結果を1行で表示"""
+    per_op = elapsed / iterations * 1000
+    print(f"  {label:<28} {per_op:>9.3f} ms/回  {extra}")
+
+
+def percentile(values: list[float], p: float) -> float:
+    """パーセンタイル（p: 0〜100）"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# ===========================================
+# メモリ: 会話分析の保存
+# ===========================================
+
+SAMPLE_ANALYSIS = {
+    "age_group": "adult",
+    "abilities": [
+        {"content": f"能力{i}", "context": "会話分析", "confidence": 0.4} for i in range(4)
+    ],
+    "personalities": [
+        {"content": f"らしさ{i}", "context": "会話分析", "confidence": 0.4} for i in range(3)
+    ],
+    "interests": [
+        {"content": f"興味{i}", "context": "会話分析", "confidence": 0.4} for i in range(3)
+    ],
+    "summary": "ベンチマーク用の会話",
+    "key_discoveries": ["発見1", "発見2"],
+}
+
+
+def _save_analysis_per_call(memory, user_id: str, session_id: str, result: dict):
+    """変更前の保存方法（更新のたびに読み込み→書き込み）"""
+    if result.get("age_group"):
+        memory.update_age_group(user_id, result["age_group"])
+    for insight_type, key in (("ability", "abilities"), ("personality", "personalities"), ("interest", "interests")):
+        for item in result.get(key, []):
+            memory.add_insight(
+                user_id=user_id,
+                type=insight_type,
+                content=item["content"],
+                context=item.get("context", "会話分析"),
+                confidence=item.get("confidence", 0.5)
+            )
+    memory.add_history(
+        user_id=user_id,
+        session_id=session_id,
+        service="spark",
+        summary=result.get("summary", ""),
+        key_discoveries=result.get("key_discoveries", [])
+    )
+
+
+def bench_memory_batch(iterations: int = 50):
+    """会話分析1回あたりの書き込み回数と時間（個別 vs 一括）"""
+    print("=== メモリ: 会話分析の保存 ===\n")
+
+    from memory.store import UserMemory
+    from agent.core import AIseedAgent
+
+    insight_count = sum(len(SAMPLE_ANALYSIS[k]) for k in ("abilities", "personalities", "interests"))
+    print(f"分析1回: 特性{insight_count}件 + 年齢層 + 履歴 / {iterations}回計測\n")
+
+    write_methods = {
+        "json": ["_write_json"],
+        "sqlite": ["append_insight", "update_profile", "increment_conversation_count",
+                   "append_history", "save_profile", "apply_batch"],
+    }
+
+    for backend in ("json", "sqlite"):
+        print(f"--- backend: {backend} ---")
+        unit = "ファイル書き込み" if backend == "json" else "トランザクション"
+
+        for mode in ("per_call", "batch"):
+            with tempfile.TemporaryDirectory() as tmp:
+                agent = AIseedAgent.__new__(AIseedAgent)
+                agent.memory = UserMemory(base_path=tmp, backend=backend)
+                counts = count_calls(agent.memory.backend, write_methods[backend])
+
+                start = time.perf_counter()
+                for i in range(iterations):
+                    if mode == "per_call":
+                        _save_analysis_per_call(agent.memory, "bench_user", f"s{i}", SAMPLE_ANALYSIS)
+                    else:
+                        agent._save_analysis("bench_user", f"s{i}", "spark", SAMPLE_ANALYSIS)
+                elapsed = time.perf_counter() - start
+
+                writes = sum(counts.values()) / iterations
+                label = "個別（変更前）" if mode == "per_call" else "一括（batch）"
+                print_row(label, elapsed, iterations, f"{unit} {writes:.1f}回/分析")
+        print()
+
+    return True
+
+
+def bench_memory_cache(iterations: int = 500, insights: int = 60, history: int = 100):
+    """chat毎に呼ばれるget_user_summaryの時間（キャッシュなし vs あり）"""
+    print("=== メモリ: get_user_summary ===\n")
+
+    from memory.store import UserMemory
+
+    print(f"特性{insights}件・履歴{history}件のユーザー / {iterations}回計測\n")
+
+    for backend in ("json", "sqlite"):
+        print(f"--- backend: {backend} ---")
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = UserMemory(base_path=tmp, backend=backend)
+            with writer.batch("bench_user") as tx:
+                for i in range(insights):
+                    tx.add_insight(type="ability", content=f"能力{i}", context="ベンチマーク")
+                for i in range(history):
+                    tx.add_history(f"s{i}", "spark", f"要約{i}")
+            writer.save_skill("bench_user", "spark", "# spark")
+
+            for label, max_entries in (("キャッシュなし", 0), ("LRUキャッシュ", 1024)):
+                memory = UserMemory(base_path=tmp, backend=backend, cache_max_entries=max_entries)
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    memory.get_user_summary("bench_user")
+                elapsed = time.perf_counter() - start
+
+                stats = memory.cache_stats()
+                print_row(label, elapsed, iterations, f"hit率 {stats['hit_rate']:.0%}")
+        print()
+
+    return True
+
+
+# ===========================================
+# API: 同時接続時のレイテンシ
+# ===========================================
+
+class _ServerProcess:
+    """main.appを別プロセスのuvicornで起動（lifespanなし）し、イベントループの最大停止時間を返す"""
+
+    def __init__(self, port: int, io_runner):
+        import multiprocessing
+
+        self.port = port
+        self.io_runner = io_runner
+        context = multiprocessing.get_context("fork")  # 計測用に差し替えた状態を引き継ぐ
+        self.stop = context.Event()
+        self.result, self._child_result = context.Pipe(duplex=False)
+        self.process = context.Process(target=self._run, daemon=True)
+        self.max_stall = 0.0
+
+    def _run(self):
+        import uvicorn
+        import main
+        import storage.aio
+        from config import IO
+
+        storage.aio.configure_io_pool(IO["max_workers"])
+        storage.aio.run_io = self.io_runner
+        config = uvicorn.Config(main.app, host="127.0.0.1", port=self.port, lifespan="off",
+                                log_level="warning", access_log=False, timeout_keep_alive=120)
+        server = uvicorn.Server(config)
+        max_stall = 0.0
+
+        async def ticker():
+            # イベントループが塞がれていると、sleepからの復帰が遅れる
+            nonlocal max_stall
+            while not self.stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                max_stall = max(max_stall, time.perf_counter() - start - 0.005)
+            server.should_exit = True
+
+        async def serve():
+            tick = asyncio.create_task(ticker())
+            await server.serve()
+            await tick
+
+        asyncio.run(serve())
+        self._child_result.send(max_stall)
+
+    def __enter__(self):
+        import socket
+
+        self.process.start()
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        if self.result.poll(30):
+            self.max_stall = self.result.recv()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+async def _run_load(port: int, clients: int, rounds: int) -> dict:
+    """同時接続で観察追加・一覧・統計を繰り返し、軽いリクエスト（/health）も並行して送る"""
+    import httpx
+
+    io_latencies: list[float] = []
+    probe_latencies: list[float] = []
+    done = asyncio.Event()
+
+    async def client(http, index: int):
+        user_id = f"load_user{index}"
+        plant_id = f"plant{index}"
+        for r in range(rounds):
+            for method, url, body in (
+                ("POST", "/internal/grow/observation",
+                 {"plant_id": plant_id, "user_id": user_id, "text": f"観察{r} 葉が増えた", "watered": True}),
+                ("GET", f"/internal/grow/observation/{user_id}/{plant_id}?limit=30", None),
+                ("GET", f"/internal/grow/stats/{user_id}/{plant_id}", None),
+            ):
+                start = time.perf_counter()
+                response = await http.request(method, url, json=body)
+                io_latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+    async def probe(http):
+        while not done.is_set():
+            start = time.perf_counter()
+            await http.get("/health")
+            probe_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    limits = httpx.Limits(max_connections=clients + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120,
+                                 trust_env=False) as http:
+        probe_task = asyncio.create_task(probe(http))
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http, i) for i in range(clients)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    return {"io": io_latencies, "probe": probe_latencies, "elapsed": elapsed}
+
+
+def seed_observations(user_id: str, plant_id: str, count: int, start: str = "2025-01-01") -> list[dict]:
+    """1日1件の観察記録を生成（保存形式のdict）"""
+    from datetime import datetime, timedelta
+    from grow.models import Observation
+
+    first = datetime.fromisoformat(start)
+    records = []
+    for i in range(count):
+        day = first + timedelta(days=i)
+        records.append(Observation(
+            id=f"{plant_id}_{i:05d}",
+            plant_id=plant_id,
+            user_id=user_id,
+            date=day.strftime("%Y-%m-%d"),
+            time="07:30",
+            text=f"観察{i} 葉が増えた。水やりをした。",
+            watered=i % 2 == 0,
+            harvested=i % 30 == 29,
+            insights=["水やり記録"],
+            created_at=day,
+        ).model_dump())
+    return records
+
+
+def bench_load(clients: int = 200, rounds: int = 3, history: int = 300, port: int = 18931):
+    """同時接続時のp50/p99レイテンシ（ハンドラー内でブロッキングI/O vs スレッドプール）"""
+    print("=== API: 同時接続時のレイテンシ ===\n")
+
+    import main
+    import storage.aio
+    from grow import GrowService
+
+    print(f"クライアント{clients} × {rounds}ラウンド（観察追加・一覧・統計）/ 植物ごとに観察{history}件")
+    print("並行して /health を10ms間隔で送信\n")
+    logging.disable(logging.INFO)  # リクエストごとのINFOログを抑止
+
+    async def run_inline(func, *args, **kwargs):
+        # 変更前の動作: ハンドラーのコルーチン内で直接ファイルI/O
+        return func(*args, **kwargs)
+
+    for label, runner in (("ブロッキング（変更前）", run_inline), ("スレッドプール", storage.aio.run_io)):
+        with tempfile.TemporaryDirectory() as tmp:
+            main.grow_service = GrowService(base_path=tmp)
+            for i in range(clients):
+                user_id = f"load_user{i}"
+                main.grow_service._save_plants(user_id, [{
+                    "id": f"plant{i}", "user_id": user_id, "name": "トマト",
+                    "started_at": "2025-01-01T00:00:00", "created_at": "2025-01-01T00:00:00",
+                    "updated_at": "2025-01-01T00:00:00",
+                }])
+                main.grow_service._save_observations(
+                    user_id, f"plant{i}", seed_observations(user_id, f"plant{i}", history)
+                )
+
+            with _ServerProcess(port, runner) as server:
+                result = asyncio.run(_run_load(port, clients, rounds))
+
+        io_latencies, probe = result["io"], result["probe"]
+        print(f"--- {label} ---")
+        print(
+            f"  観察API   p50 {percentile(io_latencies, 50) * 1000:>8.1f} ms  "
+            f"p99 {percentile(io_latencies, 99) * 1000:>8.1f} ms  "
+            f"{len(io_latencies) / result['elapsed']:>6.0f} req/s"
+        )
+        print(
+            f"  /health   p50 {percentile(probe, 50) * 1000:>8.1f} ms  "
+            f"p99 {percentile(probe, 99) * 1000:>8.1f} ms  "
+            f"ループ最大停止 {server.max_stall * 1000:.1f} ms"
+        )
+    print()
+    logging.disable(logging.NOTSET)
+
+    return True
+
+# ===========================================
+# 栽培記録: 観察記録の追加・ページング
+# ===========================================
+
+class _LegacyObservations:
+    """変更前の保存方法（植物ごとのJSON配列を毎回全件読み書き）"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _load(self) -> list[dict]:
+        import json
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def add(self, record: dict):
+        import json
+        observations = self._load()
+        observations.append(record)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(observations, f, ensure_ascii=False, indent=2, default=str)
+
+    def page(self, offset: int, limit: int) -> list[dict]:
+        observations = sorted(self._load(), key=lambda x: (x.get("date", ""), x.get("time", "")), reverse=True)
+        return observations[offset:offset + limit]
+
+    def find(self, observation_id: str):
+        return next((o for o in self._load() if o.get("id") == observation_id), None)
+
+    def by_date(self, date: str) -> list[dict]:
+        return [o for o in self._load() if o.get("date") == date]
+
+
+def bench_observations(history: int = 3650, iterations: int = 100):
+    """長期栽培（1日1件×10年）の植物で、追加・ページング・ID検索・日付検索"""
+    print("=== 栽培記録: 観察記録の追加・ページング ===\n")
+
+    import json
+    from grow import GrowService
+
+    print(f"観察{history}件の植物 / 各{iterations}回計測\n")
+    logging.disable(logging.INFO)
+
+    records = seed_observations("bench_user", "plant1", history)
+    target_id = records[history // 2]["id"]
+    target_date = records[history // 2]["date"]
+    new_record = dict(records[-1], id="new", date="2099-01-01")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "observations_plant1.json")
+        with open(legacy_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2, default=str)
+        legacy = _LegacyObservations(legacy_path)
+
+        grow = GrowService(base_path=os.path.join(tmp, "grow"))
+        grow._save_observations("bench_user", "plant1", records)
+        log = grow._observation_log("bench_user", "plant1")
+
+        cases = (
+            ("ページング(30件)", lambda: legacy.page(60, 30), lambda: log.read_newest(60, 30)),
+            ("ID検索", lambda: legacy.find(target_id), lambda: log.find(target_id)),
+            ("日付検索", lambda: legacy.by_date(target_date), lambda: log.read_date(target_date)),
+            ("追加", lambda: legacy.add(new_record), lambda: log.append(new_record)),
+        )
+        for name, legacy_call, log_call in cases:
+            print(f"--- {name} ---")
+            for label, call in (("JSON配列（変更前）", legacy_call), ("JSONL + インデックス", log_call)):
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    call()
+                print_row(label, time.perf_counter() - start, iterations)
+        print()
+
+        start = time.perf_counter()
+        count = grow.compact_observations("bench_user", "plant1")
+        print_row("コンパクション（参考）", time.perf_counter() - start, 1, f"{count}件を書き直し")
+    print()
+    logging.disable(logging.NOTSET)
+
+    return True
+
+
+# ===========================================
+# 栽培記録: 統計
+# ===========================================
+
+def _legacy_plant_stats(grow, user_id: str, plant_id: str) -> dict:
+    """変更前の集計方法（観察記録を全件読み込み、並べ替えて数える）"""
+    from datetime import datetime, timedelta
+
+    observations = grow._load_observations(user_id, plant_id)
+    latest = sorted(observations, key=lambda x: x.get("date", ""), reverse=True)
+    dates = set(o.get("date") for o in observations)
+    current, streak = datetime.now().date(), 0
+    while current.isoformat() in dates:
+        streak += 1
+        current -= timedelta(days=1)
+    return {
+        "observation_count": len(observations),
+        "last_observation": latest[0].get("date") if latest else None,
+        "total_harvests": sum(1 for o in observations if o.get("harvested")),
+        "streak_days": streak,
+    }
+
+
+def bench_stats(plants: int = 20, history: int = 1000, iterations: int = 20):
+    """植物統計・ユーザー統計（観察記録を全件集計 vs 集計済みの値）"""
+    print("=== 栽培記録: 統計 ===\n")
+
+    from grow import GrowService
+
+    print(f"植物{plants}件 × 観察{history}件のユーザー / {iterations}回計測\n")
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        grow = GrowService(base_path=tmp)
+        for i in range(plants):
+            plant = grow.create_plant("bench_user", f"植物{i}")
+            grow._save_observations("bench_user", plant.id, seed_observations("bench_user", plant.id, history))
+        grow.rebuild_stats("bench_user")
+        plant_ids = [plant.id for plant in grow.get_plants("bench_user")]
+
+        cases = (
+            ("植物統計",
+             lambda: _legacy_plant_stats(grow, "bench_user", plant_ids[0]),
+             lambda: grow.get_plant_stats("bench_user", plant_ids[0])),
+            ("ユーザー統計",
+             lambda: [_legacy_plant_stats(grow, "bench_user", plant_id) for plant_id in plant_ids],
+             lambda: grow.get_user_stats("bench_user")),
+        )
+        for name, legacy_call, new_call in cases:
+            print(f"--- {name} ---")
+            for label, call in (("全件集計（変更前）", legacy_call), ("集計済み（stats.json）", new_call)):
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    call()
+                print_row(label, time.perf_counter() - start, iterations)
+        print()
+    logging.disable(logging.NOTSET)
+
+    return True
+
+
+# ===========================================
+# 栽培記録: 日付指定の一覧（全植物）
+# ===========================================
+
+def bench_today(plants: int = 500, days: int = 365 * 3, iterations: int = 3):
+    """全植物から指定日・期間の観察を集める（植物ごとに読む vs 日付別インデックス）"""
+    print("=== 栽培記録: 日付指定の一覧（全植物） ===\n")
+
+    from datetime import date, timedelta
+    from grow import GrowService
+
+    print(f"植物{plants}件 × {days}日（1日1件、計{plants * days}件）/ 各{iterations}回計測\n")
+    logging.disable(logging.INFO)
+
+    first = date.today() - timedelta(days=days - 1)
+    today = date.today().isoformat()
+    month_ago = (date.today() - timedelta(days=29)).isoformat()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        grow = GrowService(base_path=tmp)
+        start = time.perf_counter()
+        for i in range(plants):
+            plant = grow.create_plant("bench_user", f"植物{i}")
+            grow._save_observations(
+                "bench_user", plant.id, seed_observations("bench_user", plant.id, days, start=first.isoformat())
+            )
+        grow._day_index("bench_user")  # 既存データから日付別インデックスを構築
+        print(f"  （準備 {time.perf_counter() - start:.1f} 秒）\n")
+        plant_ids = [plant.id for plant in grow.get_plants("bench_user")]
+
+        def scan_all(match):
+            # 変更前: 全植物の観察記録を全件読み込んで絞り込む
+            return [o for plant_id in plant_ids for o in grow._load_observations("bench_user", plant_id) if match(o)]
+
+        cases = (
+            ("今日（1日）", (
+                ("全件読み込み（変更前）", lambda: scan_all(lambda o: o["date"] == today)),
+                ("植物ごとの日付検索", lambda: [
+                    o for plant_id in plant_ids for o in grow._observation_log("bench_user", plant_id).read_date(today)
+                ]),
+                ("日付別インデックス", lambda: grow.get_today_observations("bench_user")),
+            )),
+            ("直近30日", (
+                ("全件読み込み（変更前）", lambda: scan_all(lambda o: month_ago <= o["date"] <= today)),
+                ("日付別インデックス", lambda: grow.get_observations_in_range("bench_user", month_ago, today)),
+            )),
+        )
+        for name, variants in cases:
+            print(f"--- {name} ---")
+            for label, call in variants:
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    count = len(call())
+                print_row(label, time.perf_counter() - start, iterations, f"{count}件")
+        print()
+    logging.disable(logging.NOTSET)
+
+    return True
+
+
+# ===========================================
+# コミュニティ: 農家のフォロワー
+# ===========================================
+
+def bench_followers(users: int = 10000, farmers: int = 50, favorites: int = 5, iterations: int = 20):
+    """農家のフォロワー一覧・数（全ユーザーのお気に入りを走査 vs フォロワー索引）"""
+    print("=== コミュニティ: 農家のフォロワー ===\n")
+
+    from community import CommunityService
+    from community.models import Favorite
+    from storage import atomic_write_json
+
+    print(f"ユーザー{users}人 × お気に入り{favorites}件（農家{farmers}件）/ {iterations}回計測\n")
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        community = CommunityService(base_path=tmp)
+        start = time.perf_counter()
+        for i in range(users):
+            user_dir = community.base_path / f"user_u{i}"
+            user_dir.mkdir()
+            atomic_write_json(user_dir / "favorites.json", [
+                {"id": f"{i}-{j}", "user_id": f"u{i}", "farmer_id": f"f{(i + j) % farmers}",
+                 "notify_shipment": True, "created_at": "2026-06-01T00:00:00"}
+                for j in range(favorites)
+            ])
+        community.rebuild_follower_index()
+        print(f"  （準備・索引構築 {time.perf_counter() - start:.1f} 秒）\n")
+
+        def scan_followers():
+            # 変更前: 全ユーザーの favorites.json を読んで絞り込む
+            return [Favorite(**f) for f in community._scan_followers().get("f0", {}).values()]
+
+        for label, call in (
+            ("全ユーザー走査（変更前）", scan_followers),
+            ("フォロワー索引（一覧）", lambda: community.get_farmer_followers("f0")),
+            ("フォロワー索引（数）", lambda: [None] * community.get_follower_count("f0")),
+        ):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                count = len(call())
+            print_row(label, time.perf_counter() - start, iterations, f"{count}人")
+        print()
+
+        problems = community.check_follower_index()
+        print(f"  整合性チェック: {'不整合なし' if not problems else f'{len(problems)}農家で不整合'}\n")
+    logging.disable(logging.NOTSET)
+
+    return not problems
+
+
+# ===========================================
+# コミュニティ: ユーザーの来店履歴
+# ===========================================
+
+def bench_user_checkins(farmer_counts: tuple = (10, 100, 1000), checkins: int = 200, iterations: int = 20):
+    """ユーザーの来店履歴（全農家の来店記録を走査 vs ユーザー別来店記録）を農家数を変えて計測"""
+    print("=== コミュニティ: ユーザーの来店履歴 ===\n")
+
+    import json
+    from community import CommunityService
+    from community.models import CheckIn
+    from storage import atomic_write_json
+
+    print(f"農家1件あたり来店{checkins}件、対象ユーザーは各農家に1件 / 直近20件を{iterations}回取得\n")
+    logging.disable(logging.INFO)
+
+    print(f"  {'農家数':<8} {'全農家走査（変更前）':>22} {'ユーザー別来店記録':>20}")
+    for farmers in farmer_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            community = CommunityService(base_path=tmp)
+            for i in range(farmers):
+                farmer_dir = community.base_path / f"farmer_f{i}"
+                farmer_dir.mkdir()
+                atomic_write_json(farmer_dir / "checkins.json", [
+                    {"id": f"{i}-{j}", "user_id": "bench_user" if j == 0 else f"u{j}", "farmer_id": f"f{i}",
+                     "location_name": None, "created_at": f"2026-06-01T00:{i // 60 % 60:02d}:{i % 60:02d}"}
+                    for j in range(checkins)
+                ])
+            community.rebuild_user_checkin_index()
+
+            def scan_farmers():
+                # 変更前: 全農家の checkins.json を読んで絞り込む
+                found = []
+                for checkins_file in community.base_path.glob("farmer_*/checkins.json"):
+                    with open(checkins_file, "r", encoding="utf-8") as f:
+                        found += [c for c in json.load(f) if c.get("user_id") == "bench_user"]
+                found.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+                return [CheckIn(**c) for c in found[:20]]
+
+            timings = []
+            for call in (scan_farmers, lambda: community.get_user_checkins("bench_user", limit=20)):
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    call()
+                timings.append((time.perf_counter() - start) / iterations * 1000)
+            print(f"  {farmers:<10} {timings[0]:>18.3f} ms/回 {timings[1]:>16.3f} ms/回")
+    print()
+    logging.disable(logging.NOTSET)
+
+    return True
+
+
+# ===========================================
+# Spark体験: セッションの共有
+# ===========================================
+
+def bench_sessions(sessions: int = 300, workers: int = 2):
+    """体験セッションを複数ワーカーに振り分けたときの成否と1操作あたりの時間"""
+    print("=== Spark体験: セッションの共有 ===\n")
+
+    from agent.tools import SparkExperience, TaskResult, TASK_ORDER, create_session_store
+    from memory.store import UserMemory
+
+    print(f"セッション{sessions}件 × タスク{len(TASK_ORDER)}件、リクエストをワーカー{workers}つに順番に振り分け\n")
+    logging.disable(logging.INFO)
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = UserMemory(base_path=os.path.join(tmp, "memory"))
+        for label, kind in (("プロセス内（変更前）", "memory"), ("SQLite共有", "sqlite")):
+            path = os.path.join(tmp, "spark_sessions.db")
+            pool = [SparkExperience(memory, create_session_store(kind, path=path)) for _ in range(workers)]
+            requests = 0
+            failed = 0
+            start = time.perf_counter()
+            for i in range(sessions):
+                pool[requests % workers].start_session(f"user{i}", f"exp{i}")
+                requests += 1
+                for task_id in TASK_ORDER:
+                    result = pool[requests % workers].submit_result(TaskResult(
+                        task_id=task_id, user_id=f"user{i}", session_id=f"exp{i}", duration_ms=1000,
+                        tap_position={"x": 0.5, "y": 0.5}, selected_option="sea",
+                    ))
+                    requests += 1
+                    if result.get("error"):
+                        failed += 1
+                        break
+            elapsed = time.perf_counter() - start
+            print_row(label, elapsed, requests, f"Session not found {failed}/{sessions}件")
+            if kind == "sqlite" and failed:
+                ok = False
+    print()
+    logging.disable(logging.NOTSET)
+
+    if not ok:
+        print("✗ 共有セッションで Session not found が発生しました")
+    return ok
+
+
+# ===========================================
+# Spark体験: 結果の一括再分析
+# ===========================================
+
+def bench_analyzer(results: int = 100000, seed: int = 0):
+    """保存済みの体験タスク結果の再分析（TaskAnalyzer 1件ずつ vs NumPy一括）"""
+    print("=== Spark体験: 結果の一括再分析 ===\n")
+
+    import random
+    from agent.tools.experience import TaskAnalyzer, TaskResult
+    from agent.tools import batch
+
+    rng = random.Random(seed)
+
+    def arrange(i: int) -> TaskResult:
+        return TaskResult(
+            task_id="arrange", user_id=f"user{i}", session_id=f"exp{i}", duration_ms=rng.randint(2000, 30000),
+            arranged_positions=[
+                {"id": shape, "x": rng.random(), "y": rng.random() * rng.choice((0.2, 1.0))}
+                for shape in ("circle", "square", "triangle", "star", "heart")
+            ],
+        )
+
+    def rhythm(i: int) -> TaskResult:
+        time_ms = 0
+        taps = []
+        for _ in range(rng.randint(0, 40)):
+            time_ms += rng.randint(200, 260) if i % 2 else rng.randint(50, 900)
+            taps.append({"time_ms": time_ms, "x": 0.5, "y": 0.5})
+        return TaskResult(task_id="rhythm", user_id=f"user{i}", session_id=f"exp{i}", duration_ms=10000,
+                          tap_sequence=taps)
+
+    cases = (
+        ("配置（5個）", [arrange(i) for i in range(results)], TaskAnalyzer.analyze_arrange,
+         batch.pack_arrange, batch.analyze_arrange_batch),
+        ("リズム（0〜40タップ）", [rhythm(i) for i in range(results)], TaskAnalyzer.analyze_rhythm,
+         batch.pack_rhythm, batch.analyze_rhythm_batch),
+    )
+
+    print(f"各{results}件の結果を再分析\n")
+    ok = True
+    for name, task_results, analyze_one, pack, analyze_batch in cases:
+        print(f"--- {name}（1回 = {results}件） ---")
+        start = time.perf_counter()
+        expected = [analyze_one(r) for r in task_results]
+        scalar = time.perf_counter() - start
+        print_row("1件ずつ（変更前）", scalar, 1)
+
+        start = time.perf_counter()
+        arrays = pack(task_results)
+        packed = time.perf_counter()
+        actual = analyze_batch(**arrays)
+        done = time.perf_counter()
+        print_row("配列への変換", packed - start, 1)
+        print_row("一括分析（配列から）", done - packed, 1, f"{scalar / (done - packed):.1f}倍")
+
+        mismatched = sum(1 for a, b in zip(expected, actual) if a != b)
+        print(f"  結果の不一致: {mismatched}件\n")
+        ok = ok and mismatched == 0
+
+    if not ok:
+        print("✗ 一括分析の結果が1件ずつの分析と一致しません")
+    return ok
+
+
+# ===========================================
+# Spark体験: 結果アーカイブの再分析
+# ===========================================
+
+def bench_archive(days: int = 10, sessions: int = 2000, seed: int = 0):
+    """日別アーカイブの全期間を再分析（JSONLを解析して1件ずつ vs 列形式 .npz を一括）"""
+    print("=== Spark体験: 結果アーカイブの再分析 ===\n")
+
+    import json
+    import random
+    from datetime import datetime, timedelta
+    from agent.tools.experience import TaskAnalyzer, TaskResult, TASK_ORDER
+    from agent.tools.archive import ExperienceArchive, reanalyze
+
+    rng = random.Random(seed)
+    analyzers = {
+        "observe": TaskAnalyzer.analyze_observe,
+        "sound": TaskAnalyzer.analyze_sound,
+        "arrange": TaskAnalyzer.analyze_arrange,
+        "rhythm": TaskAnalyzer.analyze_rhythm,
+    }
+
+    def session_results(i: int) -> list[dict]:
+        time_ms = 0
+        taps = []
+        for _ in range(rng.randint(5, 40)):
+            time_ms += rng.randint(50, 900)
+            taps.append({"time_ms": time_ms, "x": rng.random(), "y": rng.random()})
+        common = {"user_id": f"user{i}", "session_id": f"exp{i}", "duration_ms": rng.randint(2000, 30000)}
+        return [TaskResult(
+            task_id=task_id, **common,
+            tap_position={"x": rng.random(), "y": rng.random()} if task_id == "observe" else None,
+            selected_option=rng.choice(("umbrella", "sea", "city")) if task_id in ("sound", "story") else None,
+            arranged_positions=[
+                {"id": shape, "x": rng.random(), "y": rng.random()} for shape in ("circle", "square", "star")
+            ] if task_id == "arrange" else None,
+            tap_sequence=taps if task_id == "rhythm" else None,
+            selected_color="#FF6B6B" if task_id == "color" else None,
+        ).model_dump() for task_id in TASK_ORDER]
+
+    print(f"{days}日 × 1日{sessions}セッション（{days * sessions * len(TASK_ORDER)}件）\n")
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = ExperienceArchive(base_path=tmp)
+        first = datetime(2026, 6, 1, 12)
+        for day in range(days):
+            archive.append([r for i in range(sessions) for r in session_results(i)], now=first + timedelta(days=day))
+        staging = sorted(archive.base_path.glob("*.jsonl"))
+        jsonl_bytes = sum(path.stat().st_size for path in staging)
+
+        # 変更前に相当: JSONLを解析して TaskResult ごとに分析
+        start = time.perf_counter()
+        expected = []
+        for path in staging:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    result = TaskResult(**json.loads(line))
+                    analyze = analyzers.get(result.task_id)
+                    expected.append(analyze(result) if analyze else None)
+        jsonl_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        archive.seal_before("9999-12-31")
+        seal_elapsed = time.perf_counter() - start
+        npz_bytes = sum(path.stat().st_size for path in archive.base_path.glob("*.npz"))
+
+        start = time.perf_counter()
+        actual = []
+        taps = 0
+        for _, columns, analyses in reanalyze(archive):
+            actual += analyses
+            taps += int(columns["tap_offsets"][-1])
+        npz_elapsed = time.perf_counter() - start
+
+        print(f"  {'JSONL（1件ずつ分析）':<24} {jsonl_elapsed * 1000:>10.1f} ms  {jsonl_bytes / 1e6:>6.1f} MB")
+        print(f"  {'列形式 .npz（一括分析）':<24} {npz_elapsed * 1000:>10.1f} ms  {npz_bytes / 1e6:>6.1f} MB")
+        print(f"  （.npzへの変換 {seal_elapsed * 1000:.0f} ms、タップ{taps}件）")
+        mismatched = sum(1 for a, b in zip(expected, actual) if a != b) + abs(len(expected) - len(actual))
+        print(f"  結果の不一致: {mismatched}件\n")
+    logging.disable(logging.NOTSET)
+
+    if mismatched:
+        print("✗ アーカイブの再分析結果が1件ずつの分析と一致しません")
+    return mismatched == 0
+
+
+# ===========================================
+# エージェント: ツールの登録簿
+# ===========================================
+
+def bench_tools(iterations: int = 20000, executions: int = 2000):
+    """ツール定義・ハンドラーの取得（呼び出しごとに組み立て vs 登録簿）と実行のオーバーヘッド"""
+    print("=== エージェント: ツールの登録簿 ===\n")
+
+    from agent.tools import InsightTools, SkillTools, HistoryTools, ToolRegistry
+    from memory.store import UserMemory
+
+    print(f"取得 {iterations}回 / get_history の実行 {executions}回\n")
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = UserMemory(base_path=tmp)
+        toolsets = [InsightTools(memory), SkillTools(memory), HistoryTools(memory)]
+        start = time.perf_counter()
+        registry = ToolRegistry(toolsets)
+        print(f"  （登録簿の構築・検証 {(time.perf_counter() - start) * 1000:.2f} ms、{len(registry)}ツール）\n")
+
+        def legacy_handler(name: str):
+            # 変更前: 呼び出しごとに全ツール群のハンドラーを集め直す
+            handlers = {}
+            for toolset in toolsets:
+                handlers.update(toolset.get_handlers())
+            return handlers.get(name)
+
+        def legacy_definitions():
+            tools = []
+            for toolset in toolsets:
+                tools.extend(toolset.get_tool_definitions())
+            return tools
+
+        for label, call in (
+            ("ハンドラー取得（変更前）", lambda: legacy_handler("get_history")),
+            ("ハンドラー取得（登録簿）", lambda: registry.get("get_history")),
+            ("ツール定義取得（変更前）", legacy_definitions),
+            ("ツール定義取得（登録簿）", lambda: registry.definitions),
+        ):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                call()
+            print_row(label, time.perf_counter() - start, iterations)
+        print()
+
+        async def run_executions():
+            for _ in range(executions):
+                await registry.execute("get_history", {"user_id": "bench_user", "limit": 5})
+            return await registry.execute("unknown_tool", {})
+
+        start = time.perf_counter()
+        unknown = asyncio.run(run_executions())
+        print_row("get_history 実行（登録簿）", time.perf_counter() - start, executions)
+        stats = registry.stats()["get_history"]
+        print(f"  統計: calls={stats['calls']} errors={stats['errors']} "
+              f"avg={stats['avg_ms']}ms max={stats['max_ms']}ms\n")
+    logging.disable(logging.NOTSET)
+
+    return stats["calls"] == executions and "error" in unknown
+
+
+# ===========================================
+# 会話: ストリーミング応答
+# ===========================================
+
+def bench_stream(tokens: int = 200, token_delay_ms: float = 10.0, first_token_ms: float = 300.0, port: int = 18932):
+    """会話エンドポイントの最初の1バイトまでの時間（全文を待って返す vs SSEで差分を返す）"""
+    print("=== 会話: ストリーミング応答 ===\n")
+
+    import httpx
+    import uvicorn
+    from claude_agent_sdk import AssistantMessage, StreamEvent, TextBlock
+    import agent.core
+    import main
+
+    print(f"スタブSDK: 最初の断片まで{first_token_ms:.0f}ms、以降{tokens}断片を{token_delay_ms:.0f}msごと\n")
+    logging.disable(logging.INFO)
+
+    async def stub_query(prompt, options=None):
+        # 実際のSDKと同じく、差分（StreamEvent）の後に完成メッセージを返す
+        await asyncio.sleep(first_token_ms / 1000)
+        for i in range(tokens):
+            if i:
+                await asyncio.sleep(token_delay_ms / 1000)
+            yield StreamEvent(uuid=str(i), session_id="bench", event={
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": f"語{i} "},
+            })
+        yield AssistantMessage(content=[TextBlock(text="".join(f"語{i} " for i in range(tokens)))], model="stub")
+
+    saved = []
+
+    async def record_save(session_id, service, role, content, user_id=None):
+        saved.append((role, content))
+
+    async def measure(stream: bool) -> tuple[float, float, bytes]:
+        # ASGITransport は応答本文をまとめて返すため、同じループで uvicorn を起動して実際に接続する
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, lifespan="off",
+                                               log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, trust_env=False) as client:
+                start = time.perf_counter()
+                first = None
+                body = b""
+                async with client.stream("POST", "/internal/spark/conversation", json={
+                    "user_message": "こんにちは", "user_id": "bench_user", "session_id": "s1", "stream": stream,
+                }) as response:
+                    async for chunk in response.aiter_bytes():
+                        if first is None and chunk:
+                            first = time.perf_counter() - start
+                        body += chunk
+                return first, time.perf_counter() - start, body
+        finally:
+            server.should_exit = True
+            await serving
+
+    original_query, original_save, original_agent = agent.core.query, main.save_conversation, main.agent
+    expected = "".join(f"語{i} " for i in range(tokens)).strip()
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        agent.core.query = stub_query
+        main.save_conversation = record_save
+        main.agent = agent.core.AIseedAgent(memory_base_path=tmp)
+        try:
+            for label, stream in (("全文を待って返す（変更前）", False), ("SSEで差分を返す", True)):
+                saved.clear()
+                ttfb, total, body = asyncio.run(measure(stream))
+                print(f"  {label:<22} 最初の1バイト {ttfb * 1000:>7.1f} ms  完了 {total * 1000:>7.1f} ms")
+                if stream:
+                    done = body.decode().split("event: done\ndata: ")[-1]
+                    ai_message = json.loads(done)["ai_message"]
+                else:
+                    ai_message = json.loads(body)["ai_message"]
+                if ai_message != expected or saved != [("user", "こんにちは"), ("assistant", expected)]:
+                    ok = False
+        finally:
+            agent.core.query, main.save_conversation, main.agent = original_query, original_save, original_agent
+    print(f"  応答本文・会話履歴の保存: {'一致' if ok else '不一致'}\n")
+    logging.disable(logging.NOTSET)
+
+    return ok
+
+
+# ===========================================
+# 会話: プロンプトの組み立て
+# ===========================================
+
+def bench_prompt(turns: int = 100, message_chars: int = 400):
+    """1セッションで会話を続けたときのプロンプト組み立て（毎回全体を作る vs PromptBuilder）"""
+    print("=== 会話: プロンプトの組み立て ===\n")
+
+    from agent.prompts import get_prompt
+    from agent.prompt_builder import PromptBuilder, render_context
+    from memory.store import UserMemory
+
+    print(f"1セッション{turns}往復（1発言{message_chars}文字）、特性30件のユーザー\n")
+    logging.disable(logging.INFO)
+
+    async def legacy_build(memory, user_id, session_id, history, user_message):
+        # 変更前: 毎回ユーザー概要を読み、履歴を += で連結し、全体を f-string で作る
+        history_text = ""
+        for msg in history:
+            role = "ユーザー" if msg.get("role") == "user" else "AI"
+            history_text += f"{role}: {msg.get('content', '')}\n"
+        summary = await memory.get_user_summary_async(user_id)
+        context_info = render_context(user_id, session_id, summary)
+        return f"""
+{get_prompt("spark")}
+
+{context_info}
+
+【これまでの会話】
+{history_text}
+
+【ユーザーの最新メッセージ】
+{user_message}
+
+自然に会話を続けてください。
+必要に応じてツールを使用して特性を記録してください。
+"""
+
+    async def run_session(memory, build) -> tuple[float, list[str]]:
+        history, prompts, elapsed = [], [], 0.0
+        for i in range(turns):
+            message = f"{i}" + "あ" * message_chars
+            start = time.perf_counter()
+            prompts.append(await build(memory, "bench_user", "s1", history, message))
+            elapsed += time.perf_counter() - start
+            history = history + [{"role": "user", "content": message}, {"role": "assistant", "content": "い" * message_chars}]
+        return elapsed, prompts
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = UserMemory(base_path=tmp)
+        for i in range(30):
+            memory.add_insight("bench_user", ("ability", "personality", "interest")[i % 3], f"特性{i}", "会話")
+        # 会話履歴を全部入れる予算（変更前と同じ内容になる）
+        builder = PromptBuilder(memory, budgets={"default": {
+            "keep_turns": None, "max_history_tokens": None, "summary_max_tokens": 0, "summary_turn_chars": 0,
+        }})
+
+        async def builder_build(memory, user_id, session_id, history, user_message):
+            return (await builder.build("spark", user_id, session_id, history, user_message)).text
+
+        legacy_elapsed, legacy_prompts = asyncio.run(run_session(memory, legacy_build))
+        builder_elapsed, builder_prompts = asyncio.run(run_session(memory, builder_build))
+
+    print_row("毎回全体を作る（変更前）", legacy_elapsed, turns)
+    print_row("PromptBuilder", builder_elapsed, turns)
+    stats = builder.stats()
+    print(f"  最終プロンプト {len(builder_prompts[-1])}文字 / 平均 {stats['avg_chars']}文字")
+    print(f"  ユーザー情報キャッシュ ヒット率 {stats['context_cache']['hit_rate']:.0%}、"
+          f"会話履歴キャッシュ ヒット率 {stats['history_cache']['hit_rate']:.0%}")
+    ok = legacy_prompts == builder_prompts
+    print(f"  プロンプトの内容: {'一致' if ok else '不一致'}\n")
+    logging.disable(logging.NOTSET)
+
+    return ok
+
+
+# ===========================================
+# 会話: 会話履歴の窓と要約
+# ===========================================
+
+def bench_context(turns: int = 200, message_chars: int = 200, ms_per_1k_tokens: float = 10.0):
+    """長いセッションでのプロンプトの大きさと応答時間（全履歴 vs 予算内の窓 + 要約）"""
+    print("=== 会話: 会話履歴の窓と要約 ===\n")
+
+    from claude_agent_sdk import AssistantMessage, TextBlock
+    import agent.core
+    from agent.context import estimate_tokens
+    from config import CONTEXT
+
+    print(f"1セッション{turns}往復（1発言{message_chars}文字）")
+    print(f"スタブSDK: プロンプトの推定1000トークンあたり{ms_per_1k_tokens:.0f}msで応答\n")
+    logging.disable(logging.INFO)
+
+    prompt_tokens = []
+
+    async def stub_query(prompt, options=None):
+        prompt_tokens.append(estimate_tokens(prompt))
+        await asyncio.sleep(prompt_tokens[-1] / 1000 * ms_per_1k_tokens / 1000)
+        yield AssistantMessage(content=[TextBlock(text="い" * message_chars)], model="stub")
+
+    unlimited = {"default": {"keep_turns": None, "max_history_tokens": None,
+                             "summary_max_tokens": 0, "summary_turn_chars": 0}}
+    checkpoints = sorted({10, turns // 4, turns // 2, turns})
+
+    async def run_session(chat_agent) -> dict:
+        history, results = [], {}
+        for i in range(1, turns + 1):
+            message = f"{i}" + "あ" * message_chars
+            start = time.perf_counter()
+            reply = await chat_agent.chat("spark", message, "bench_user", "s1", history)
+            elapsed = time.perf_counter() - start
+            if i in checkpoints:
+                results[i] = (prompt_tokens[-1], elapsed)
+            history = history + [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+        return results
+
+    original_query = agent.core.query
+    agent.core.query = stub_query
+    try:
+        runs = {}
+        for label, budgets in (("全履歴（変更前）", unlimited), ("窓 + 要約", CONTEXT)):
+            with tempfile.TemporaryDirectory() as tmp:
+                chat_agent = agent.core.AIseedAgent(memory_base_path=tmp)
+                chat_agent.prompts.history.budgets = budgets
+                runs[label] = asyncio.run(run_session(chat_agent))
+    finally:
+        agent.core.query = original_query
+
+    print(f"  {'往復目':<8}" + "".join(f"{label:>28}" for label in runs))
+    for i in checkpoints:
+        cells = "".join(f"{runs[label][i][0]:>14}トークン {runs[label][i][1] * 1000:>7.1f} ms" for label in runs)
+        print(f"  {i:<10}{cells}")
+    print()
+    logging.disable(logging.NOTSET)
+
+    windowed = runs["窓 + 要約"]
+    return windowed[checkpoints[-1]][0] < runs["全履歴（変更前）"][checkpoints[-1]][0]
+
+
+# ===========================================
+# AI応答のキャッシュ
+# ===========================================
+
+def bench_ai_cache(requests: int = 200, distinct: int = 20, latency_ms: float = 50.0):
+    """同じ内容の診断が繰り返されるときの所要時間（キャッシュなし vs メモリ + SQLite、再起動後）"""
+    print("=== AI応答のキャッシュ ===\n")
+
+    from agent.response_cache import ResponseCache
+    from grow import GrowAIService
+    from grow.models import Plant
+
+    print(f"診断{requests}件（植物と症状の組み合わせ{distinct}通り、空白・全角の揺れあり）")
+    print(f"スタブAI: 1回{latency_ms:.0f}ms\n")
+    logging.disable(logging.INFO)
+
+    model_calls = []
+
+    async def stub_query(prompt: str) -> str:
+        model_calls.append(prompt)
+        await asyncio.sleep(latency_ms / 1000)
+        return '{"problem_type": "pest", "confidence": 0.8, "description": "アブラムシ", ' \
+               '"possible_causes": ["乾燥"], "solutions": ["水で洗い流す"], "urgency": "medium"}'
+
+    plants = [Plant(user_id="bench_user", name=f"トマト{i % 5}", location="ベランダ") for i in range(distinct)]
+    problems = [f"葉の裏に小さな虫がいる（{i}）" for i in range(distinct)]
+    # 同じ内容でも空白・全角数字の違いがある入力
+    variants = ("{}", " {} ", "{}\n", "{}\u3000")
+
+    async def run(ai_query) -> float:
+        service = GrowAIService(ai_query=ai_query)
+        start = time.perf_counter()
+        for i in range(requests):
+            k = i % distinct
+            problem = variants[i % len(variants)].format(problems[k])
+            if i % 3 == 0:
+                problem = problem.translate(str.maketrans("0123456789", "０１２３４５６７８９"))
+            await service.diagnose_problem(plants[k], problem)
+        return time.perf_counter() - start
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ai_cache.db")
+        for label, make_query in (
+            ("キャッシュなし（変更前）", lambda: stub_query),
+            ("キャッシュあり", lambda: ResponseCache({"grow_analysis": 3600}, path=path).wrap("grow_analysis", stub_query)),
+            ("再起動後（ディスクから）", lambda: ResponseCache({"grow_analysis": 3600}, path=path).wrap("grow_analysis", stub_query)),
+        ):
+            model_calls.clear()
+            elapsed = asyncio.run(run(make_query()))
+            print_row(label, elapsed, requests, f"モデル呼び出し {len(model_calls)}回")
+            if label != "キャッシュなし（変更前）" and len(model_calls) > distinct:
+                ok = False
+        stats = ResponseCache({"grow_analysis": 3600}, path=path).stats()
+        print(f"  ディスク側 {stats['disk_entries']}件\n")
+    logging.disable(logging.NOTSET)
+
+    return ok
+
+
+# ===========================================
+# AI問い合わせ: 同時の同じ問い合わせのまとめ
+# ===========================================
+
+def bench_coalesce(clients: int = 100, distinct: int = 5, latency_ms: float = 200.0):
+    """同じ内容の診断が同時に届いたときのモデル呼び出し数（個別に呼ぶ vs single-flight）"""
+    print("=== AI問い合わせ: 同時の同じ問い合わせのまとめ ===\n")
+
+    from agent.singleflight import SingleFlight
+    from grow import GrowAIService
+    from grow.models import Plant
+
+    print(f"診断{clients}件を同時に（植物と症状の組み合わせ{distinct}通り）/ スタブAI: 1回{latency_ms:.0f}ms\n")
+    logging.disable(logging.INFO)
+
+    model_calls = []
+    concurrent = {"now": 0, "max": 0}
+
+    async def stub_query(prompt: str) -> str:
+        model_calls.append(prompt)
+        concurrent["now"] += 1
+        concurrent["max"] = max(concurrent["max"], concurrent["now"])
+        await asyncio.sleep(latency_ms / 1000)
+        concurrent["now"] -= 1
+        return '{"problem_type": "pest", "confidence": 0.8, "description": "アブラムシ", ' \
+               '"possible_causes": ["乾燥"], "solutions": ["水で洗い流す"], "urgency": "medium"}'
+
+    plants = [Plant(user_id="bench_user", name=f"トマト{i}") for i in range(distinct)]
+
+    async def run(ai_query) -> tuple[float, list]:
+        service = GrowAIService(ai_query=ai_query)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            service.diagnose_problem(plants[i % distinct], f"葉の裏に小さな虫がいる（{i % distinct}）")
+            for i in range(clients)
+        ))
+        return time.perf_counter() - start, results
+
+    flights = SingleFlight()
+    rows = {}
+    for label, ai_query in (("個別に呼ぶ（変更前）", stub_query),
+                            ("single-flight", flights.wrap("grow_analysis", stub_query))):
+        model_calls.clear()
+        concurrent["max"] = 0
+        elapsed, results = asyncio.run(run(ai_query))
+        rows[label] = results
+        print(f"  {label:<22} {elapsed * 1000:>7.1f} ms  モデル呼び出し {len(model_calls):>4}回  同時実行 最大{concurrent['max']}")
+    stats = flights.stats()["grow_analysis"]
+    print(f"  統計: calls={stats['calls']} executions={stats['executions']} coalesced={stats['coalesced']}\n")
+    logging.disable(logging.NOTSET)
+
+    same = rows["個別に呼ぶ（変更前）"] == rows["single-flight"]
+    return same and stats["executions"] == distinct
+
+
+# ===========================================
+# AI問い合わせ: 処理タイプごとの実行枠と優先順位
+# ===========================================
+
+def bench_scheduler(background: int = 40, interactive: int = 10, capacity: int = 4, latency_ms: float = 200.0):
+    """会話分析の集中中に届いた対話の待ち時間（先着順 vs 実行枠 + 優先順位）と429"""
+    print("=== AI問い合わせ: 処理タイプごとの実行枠と優先順位 ===\n")
+
+    from claude_agent_sdk import AssistantMessage, TextBlock
+    import agent.core
+    from agent.scheduler import ModelScheduler, ModelQueueFull
+
+    print(f"会話分析（heavy・バックグラウンド）{background}件の直後に、Spark対話（heavy）{interactive}件")
+    print(f"スタブSDK: 1回{latency_ms:.0f}ms、モデル側の同時処理は{capacity}件まで（超えた分は先着順で待つ）\n")
+    logging.disable(logging.WARNING)
+
+    async def run(limits: dict) -> tuple[list[float], list[float], int]:
+        provider = asyncio.Semaphore(capacity)
+
+        async def stub_query(prompt, options=None):
+            async with provider:
+                await asyncio.sleep(latency_ms / 1000)
+            yield AssistantMessage(content=[TextBlock(text='{"summary": "要約"}')], model="stub")
+
+        agent.core.query = stub_query
+        with tempfile.TemporaryDirectory() as tmp:
+            chat_agent = agent.core.AIseedAgent(memory_base_path=tmp)
+            chat_agent.scheduler = ModelScheduler(limits, ["analyze_conversation"])
+            history = [{"role": "user", "content": "こんにちは"}]
+
+            async def timed(coro) -> float:
+                start = time.perf_counter()
+                try:
+                    await coro
+                except ModelQueueFull:
+                    return -1.0
+                return time.perf_counter() - start
+
+            jobs = [timed(chat_agent.analyze_conversation(f"u{i}", f"s{i}", "spark", history))
+                    for i in range(background)]
+            jobs += [timed(chat_agent.chat("spark", "こんにちは", f"chat{i}", f"c{i}")) for i in range(interactive)]
+            results = await asyncio.gather(*jobs)
+        done = [r for r in results if r >= 0]
+        return results[:background], results[background:], len(results) - len(done)
+
+    unlimited = {t: {"max_concurrent": 10 ** 6, "max_queue": 10 ** 6} for t in ("heavy", "medium", "light")}
+    limited = {t: {"max_concurrent": capacity, "max_background": capacity // 2, "max_queue": 32}
+               for t in ("heavy", "medium", "light")}
+    original_query = agent.core.query
+    chat_p50 = {}
+    chat_rejected = {}
+    try:
+        for label, limits in (("先着順（変更前）", unlimited), ("実行枠 + 優先順位", limited)):
+            bg, chats, rejected = asyncio.run(run(limits))
+            chats_ok = [c for c in chats if c >= 0]
+            bg_ok = [b for b in bg if b >= 0]
+            chat_p50[label] = percentile(chats_ok, 50)
+            chat_rejected[label] = len(chats) - len(chats_ok)
+            print(f"--- {label} ---")
+            print(f"  対話       p50 {chat_p50[label] * 1000:>7.0f} ms  最大 {max(chats_ok) * 1000:>7.0f} ms"
+                  f"  429 {chat_rejected[label]}件")
+            print(f"  会話分析   p50 {percentile(bg_ok, 50) * 1000:>7.0f} ms  最大 {max(bg_ok) * 1000:>7.0f} ms"
+                  f"  429 {rejected - chat_rejected[label]}件")
+    finally:
+        agent.core.query = original_query
+    print()
+    logging.disable(logging.NOTSET)
+
+    before, after = chat_p50.values()
+    ok = after < before and not any(chat_rejected.values())
+    if ok:
+        print(f"対話の待ち時間 p50: {before / after:.1f}倍短縮（会話分析の超過分は429）\n")
+    else:
+        print("✗ 対話が会話分析の後ろで待たされた（または429になった）\n")
+    return ok
+
+
+# ===========================================
+# 出荷情報の通知: 並行送信・バッチ・再送
+# ===========================================
+
+async def _smtp_stub(connect_ms: float, message_ms: float, received: list):
+    """ローカルのSMTPスタブ（接続ごとに connect_ms、1通ごとに message_ms かかる）"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await asyncio.sleep(connect_ms / 1000)
+        writer.write(b"220 stub\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                writer.write(b"250 stub\r\n")
+            elif command == "DATA":
+                writer.write(b"354 end with .\r\n")
+                await writer.drain()
+                while (await reader.readline()) not in (b".\r\n", b""):
+                    pass
+                await asyncio.sleep(message_ms / 1000)
+                received.append(1)
+                writer.write(b"250 queued\r\n")
+            elif command == "QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:  # MAIL / RCPT / RSET / NOOP
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def bench_notify(subscribers: int = 300, connect_ms: float = 10.0, message_ms: float = 2.0,
+                 push_ms: float = 5.0, port: int = 18933):
+    """購読者への通知（1件ずつ順に送る vs 並行・バッチ・再送）と投稿APIの応答時間"""
+    print("=== 出荷情報の通知: 並行送信・バッチ・再送 ===\n")
+
+    import storage.aio
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+    from config import IO
+    from shipment import ShipmentService, ShipmentInfo, ShipmentItem, Subscriber, NotificationPipeline
+    from shipment.notifier import SMTPProvider, HTTPPushProvider
+
+    print(f"購読者{subscribers}人（メール + Webプッシュ）、ローカルのSMTP・プッシュ中継スタブに送信")
+    print(f"SMTP: 接続{connect_ms:.0f}ms + 1通{message_ms:.0f}ms / プッシュ: 1リクエスト{push_ms:.0f}ms"
+          f"（各バッチの初回は503を返す）\n")
+    logging.disable(logging.WARNING)
+
+    push_app = FastAPI()
+    pushed = []
+    seen_batches = set()
+
+    @push_app.post("/push")
+    async def push(request: Request):
+        body = await request.json()
+        await asyncio.sleep(push_ms / 1000)
+        batch_key = body["notifications"][0]["subscription"]["endpoint"]
+        if batch_key not in seen_batches:
+            # 一時的な失敗（再送で成功する）
+            seen_batches.add(batch_key)
+            return JSONResponse({"detail": "unavailable"}, status_code=503)
+        pushed.extend(body["notifications"])
+        return {"results": [{"ok": True} for _ in body["notifications"]]}
+
+    async def run(label: str, batch_email: int, batch_push: int, concurrency: int) -> bool:
+        received: list = []
+        pushed.clear()
+        seen_batches.clear()
+        smtp = await _smtp_stub(connect_ms, message_ms, received)
+        smtp_port = smtp.sockets[0].getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(push_app, host="127.0.0.1", port=port, log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        notifier = NotificationPipeline(
+            {
+                "email": SMTPProvider(batch_size=batch_email, host="127.0.0.1", port=smtp_port),
+                "push": HTTPPushProvider(batch_size=batch_push, endpoint=f"http://127.0.0.1:{port}/push"),
+            },
+            max_concurrency=concurrency,
+            backoff_base_sec=0.01,
+        )
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                service = ShipmentService(base_path=tmp, notifier=notifier)
+                for i in range(subscribers):
+                    service.subscribe(Subscriber(
+                        farmer_id="farmer1", email=f"user{i}@example.com",
+                        push_subscription={"endpoint": f"https://push.example/{i}"},
+                    ))
+                shipment = service.post_shipment(ShipmentInfo(
+                    farmer_id="farmer1", date="2025-01-01", time="10:00", location_name="道の駅ひまわり",
+                    items=[ShipmentItem(name="トマト", price=100)],
+                ))
+
+                # 投稿API: 全件の送信を待つ（変更前） vs バックグラウンドに渡して戻る
+                start = time.perf_counter()
+                result = await service.notify_subscribers("farmer1", shipment)
+                elapsed = time.perf_counter() - start
+
+                start = time.perf_counter()
+                queued = await service.enqueue_notifications("farmer1", shipment)
+                queued_ms = (time.perf_counter() - start) * 1000
+                await notifier.drain()
+        finally:
+            await notifier.close()
+            server.should_exit = True
+            await serving
+            smtp.close()
+            await smtp.wait_closed()
+
+        stats = notifier.stats()
+        retried = sum(c["retried"] for c in stats["channels"].values())
+        total = subscribers * 2
+        print(f"  {label:<20} {elapsed * 1000:>8.1f} ms  {total / elapsed:>5.0f} 件/秒"
+              f"  メール{result.email_sent} プッシュ{result.push_sent}  再送{retried}件")
+        enqueue_ms.append(queued_ms)
+        # notify_subscribers と enqueue_notifications の2回分が届いている
+        return result.success and queued == total and len(received) == len(pushed) == total
+
+    enqueue_ms: list[float] = []
+    storage.aio.configure_io_pool(IO["max_workers"])
+    try:
+        ok = asyncio.run(run("1件ずつ順に送る（変更前）", 1, 1, 1))
+        ok = asyncio.run(run("並行 + バッチ（8並行）", 50, 100, 8)) and ok
+    finally:
+        storage.aio.shutdown_io_pool()
+    print(f"\n  投稿APIの応答（通知をバックグラウンドに渡して戻る）: {min(enqueue_ms):.1f} ms\n")
+    logging.disable(logging.NOTSET)
+
+    return ok
+
+
+# ===========================================
+# 出荷情報の通知: 送信待ち（outbox）とワーカー
+# ===========================================
+
+def bench_outbox(subscribers: int = 500, batch_ms: float = 200.0, rate_per_sec: float = 200.0):
+    """投稿APIの応答（送信を待つ vs outboxに書き込む）、ワーカーの送信、重複排除・停止からの再開・デッドレター"""
+    print("=== 出荷情報の通知: 送信待ち（outbox）とワーカー ===\n")
+
+    import storage.aio
+    from config import IO
+    from shipment import (
+        ShipmentService, ShipmentInfo, ShipmentItem, Subscriber,
+        NotificationPipeline, NotificationOutbox, OutboxWorker, DeliveryError,
+    )
+    from shipment.notifier import NotificationProvider
+
+    refused = {"user7@example.com", "user42@example.com"}
+
+    class StubProvider(NotificationProvider):
+        """1バッチ batch_ms かかる送信先（refused の宛先は恒久的な失敗）"""
+
+        def __init__(self, channel: str):
+            super().__init__(channel, batch_size=100)
+            self.delivered: list = []
+
+        async def send_batch(self, batch):
+            await asyncio.sleep(batch_ms / 1000)
+            results = []
+            for n in batch:
+                if n.target in refused:
+                    results.append(DeliveryError("recipient refused", retryable=False))
+                else:
+                    self.delivered.append(n.target)
+                    results.append(None)
+            return results
+
+    print(f"購読者{subscribers}人（メールのみ）、送信先は1バッチ（100件）{batch_ms:.0f}ms、"
+          f"送信数の上限 {rate_per_sec:.0f}件/秒、うち{len(refused)}件は宛先不正\n")
+    logging.disable(logging.WARNING)
+
+    def make(tmp: str, with_outbox: bool) -> tuple:
+        provider = StubProvider("email")
+        notifier = NotificationPipeline(
+            {"email": provider, "push": StubProvider("push")},
+            max_concurrency=8, backoff_base_sec=0.01, rate_limits={"email": rate_per_sec},
+        )
+        outbox = NotificationOutbox(os.path.join(tmp, "outbox.db")) if with_outbox else None
+        service = ShipmentService(base_path=os.path.join(tmp, "data"), notifier=notifier, outbox=outbox)
+        for i in range(subscribers):
+            service.subscribe(Subscriber(farmer_id="farmer1", email=f"user{i}@example.com"))
+        return service, provider
+
+    def shipment() -> ShipmentInfo:
+        return ShipmentInfo(farmer_id="farmer1", date="2025-01-01", location_name="道の駅ひまわり",
+                            items=[ShipmentItem(name="トマト", price=100)])
+
+    async def run() -> bool:
+        ok = True
+        with tempfile.TemporaryDirectory() as tmp:
+            # 変更前: 投稿APIが全件の送信を待つ
+            service, _ = make(os.path.join(tmp, "inline"), with_outbox=False)
+            start = time.perf_counter()
+            saved = await service.post_shipment_async(shipment())
+            await service.notify_subscribers("farmer1", saved)
+            inline_ms = (time.perf_counter() - start) * 1000
+            print(f"  投稿API（送信の完了を待つ、変更前）   {inline_ms:>8.1f} ms")
+
+            # outbox: 投稿と同じ処理で書き込んで戻る
+            service, provider = make(os.path.join(tmp, "outbox"), with_outbox=True)
+            start = time.perf_counter()
+            saved, queued = await service.post_shipment_and_enqueue_async(shipment())
+            outbox_ms = (time.perf_counter() - start) * 1000
+            print(f"  投稿API（outboxに書き込むだけ）       {outbox_ms:>8.1f} ms  送信待ち {queued}件")
+
+            # 同じ出荷情報の通知をもう一度書き込んでも増えない
+            duplicates = await service.enqueue_notifications("farmer1", saved)
+            print(f"  同じ出荷情報の再書き込み                    追加 {duplicates}件（重複排除）")
+
+            # 送信中のワーカーが落ちた（取り出したまま送らずに終了）→ リース切れ後に別のワーカーが送る
+            outbox = service.outbox
+            crashed = await storage.aio.run_io(outbox.claim, 100, 0.2)
+            worker = OutboxWorker(outbox, service.notifier, batch_size=100, lease_sec=30, poll_interval_sec=0.05)
+            start = time.perf_counter()
+            worker.start()
+            while True:
+                depth = await storage.aio.run_io(outbox.depth)
+                if depth["pending"] + depth["sending"] == 0:
+                    break
+                await asyncio.sleep(0.02)
+            drain = time.perf_counter() - start
+            await worker.stop()
+            print(f"  ワーカーの送信（{len(crashed)}件はリース切れから再開） {drain * 1000:>8.1f} ms"
+                  f"  {depth['sent'] / drain:>5.0f} 件/秒  送信済み {depth['sent']}件  デッドレター {depth['dead']}件")
+            ok = ok and depth["sent"] == subscribers - len(refused) and depth["dead"] == len(refused)
+            ok = ok and sorted(provider.delivered) == sorted(set(provider.delivered))
+
+            replayed = await storage.aio.run_io(outbox.replay)
+            print(f"  デッドレターを送信待ちに戻す（replay）       {replayed}件")
+            ok = ok and duplicates == 0 and outbox_ms < inline_ms
+        return ok
+
+    storage.aio.configure_io_pool(IO["max_workers"])
+    try:
+        ok = asyncio.run(run())
+    finally:
+        storage.aio.shutdown_io_pool()
+    print()
+    logging.disable(logging.NOTSET)
+
+    return ok
+
+
+# ===========================================
+# 出荷メッセージの解析: 野菜名の照合
+# ===========================================
+
+def _legacy_parse_items(message: str, vegetables: list[str]) -> list:
+    """変更前の ShipmentParser._parse_items（野菜ごとに正規表現を2つ作って走査）"""
+    import re
+    from shipment.models import ShipmentItem
+
+    items = []
+    for veg in vegetables:
+        match = re.search(rf"{veg}\s*(\d+)\s*円", message)
+        if match:
+            items.append(ShipmentItem(name=veg, price=int(match.group(1))))
+            continue
+        match = re.search(rf"{veg}\s*(\d+)\s*(個|袋|本|束|パック|kg|g)\s*(\d+)\s*円", message)
+        if match:
+            items.append(ShipmentItem(
+                name=veg, price=int(match.group(3)), quantity=match.group(1), unit=match.group(2)
+            ))
+    return items
+
+
+def bench_parser(repeat: int = 40, large_vocabulary: int = 1000):
+    """出荷メッセージの商品の抽出（野菜ごとの正規表現 vs 1つにまとめた正規表現）"""
+    print("=== 出荷メッセージの解析: 野菜名の照合 ===\n")
+
+    import random
+    from shipment.vocabulary import VEGETABLES, VegetableMatcher
+
+    corpus_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "shipment", "messages.txt")
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        corpus = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    messages = corpus * repeat
+    print(f"test_data/shipment/messages.txt の{len(corpus)}件 × {repeat}回 = {len(messages)}件\n")
+
+    def key(items) -> list:
+        return [(i.name, i.price, i.quantity, i.unit if i.quantity else None) for i in items]
+
+    def measure(label: str, extract, inputs: list[str]) -> tuple[float, list]:
+        start = time.perf_counter()
+        results = [extract(message) for message in inputs]
+        per_message = (time.perf_counter() - start) / len(inputs)
+        found = sum(len(items) for items in results[:len(corpus)])
+        print(f"  {label:<34} {per_message * 1e6:>8.1f} µs/件  商品 {found}件（{len(corpus)}件中）")
+        return per_message, results[:len(corpus)]
+
+    matcher = VegetableMatcher(VEGETABLES)
+    print(f"--- 組み込みの辞書（{len(VEGETABLES)}語） ---")
+    legacy_sec, legacy = measure("野菜ごとに正規表現（変更前）", lambda m: _legacy_parse_items(m, VEGETABLES), messages)
+    new_sec, new = measure("1つの正規表現・1回の走査", matcher.find_items, messages)
+    print(f"  → {legacy_sec / new_sec:.1f}倍\n")
+
+    # 結果が変わったメッセージ（ミニトマトの二重計上、半角カナ、同じ野菜の2つ目、全角の数量など）
+    # 商品名・価格が変わったものを先に表示する
+    changed = [(m, a, b) for m, a, b in zip(corpus, legacy, new) if sorted(key(a)) != sorted(key(b))]
+    changed.sort(key=lambda c: sorted((i.name, i.price) for i in c[1]) == sorted((i.name, i.price) for i in c[2]))
+    print(f"  結果が変わったメッセージ {len(changed)}件（例）:")
+    for message, before, after in changed[:4]:
+        print(f"    {message[:40]}")
+        print(f"      変更前 {[(i.name, i.price) for i in before]}")
+        print(f"      変更後 {[(i.name, i.price) for i in after]}")
+
+    # 辞書を作物データセットで大きくした場合（変更前は語数に比例して遅くなる）
+    rng = random.Random(0)
+    katakana = [chr(c) for c in range(ord("ア"), ord("ン") + 1)]
+    extra = {"".join(rng.choices(katakana, k=rng.randint(3, 6))) for _ in range(large_vocabulary)}
+    vocabulary = VEGETABLES + sorted(extra)
+    large = VegetableMatcher(vocabulary)
+    print(f"\n--- 作物データセットを加えた辞書（{len(vocabulary)}語、変更前は正規表現のキャッシュに収まらない） ---")
+    legacy_sec, _ = measure("野菜ごとに正規表現（変更前、1回）", lambda m: _legacy_parse_items(m, vocabulary), corpus)
+    new_sec, large_results = measure("1つの正規表現・1回の走査", large.find_items, messages)
+    print(f"  → {legacy_sec / new_sec:.1f}倍")
+
+    # 作物データセットの読み込み（data/data-collection の形式）
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = os.path.join(tmp, "crop_data.json")
+        with open(dataset, "w", encoding="utf-8") as f:
+            json.dump([
+                {"name_jp": "ブロッコリー", "name_kana": "ブロッコリー", "common_names": {"jp": []}},
+                {"name_jp": "サトイモ", "name_kana": "サトイモ", "common_names": {"jp": ["里芋"]}},
+                {"name_jp": "シュンギク", "name_kana": "シュンギク", "common_names": {"jp": ["春菊"]}},
+                {"name_jp": "ミズナ", "name_kana": "ミズナ", "common_names": {"jp": ["水菜"]}},
+            ], f, ensure_ascii=False)
+        extended = VegetableMatcher.from_crop_dataset(dataset)
+        found = sum(len(extended.find_items(m)) for m in corpus)
+    print(f"\n  作物データセット（4作物）を読み込んだ辞書: 商品 {found}件（{len(corpus)}件中）\n")
+
+    # 同じ辞書なら結果が同じ（大きな辞書の追加語はメッセージに出てこない）
+    return key(sum(new, [])) == key(sum(large_results, [])) and found > sum(len(items) for items in new)
+
+
+# ===========================================
+# 出荷メッセージの一括解析
+# ===========================================
+
+def bench_parse_batch(ai_messages: int = 100, call_ms: float = 800.0, message_ms: float = 20.0,
+                      model_slots: int = 4, rules_messages: int = 10000):
+    """出荷メッセージの一括解析（AIを1件ずつ vs まとめて、ルールベースのこのプロセス vs プロセスプール）"""
+    import re
+    import random
+    from config import SHIPMENT_PARSER
+    from shipment import parser as shipment_parser
+
+    logging.getLogger("aiseed.shipment.parser").setLevel(logging.ERROR)
+
+    # ルールベースでは解析できない（場所・価格の書き方が曖昧な）メッセージ
+    rng = random.Random(0)
+    vegetables = ["トマト", "ナス", "キュウリ", "ピーマン", "大根", "白菜"]
+    templates = [
+        "{veg}がたくさん採れたので、いつもの所に置いておきます。お値打ちです",
+        "{veg}持っていきます！値段は昨日と同じで",
+        "{veg}と{veg2}、ワンコインで出してます。いつもの店",
+        "明日も{veg}出します。場所はこの前と一緒、三百円くらいで",
+    ]
+    messages = [
+        (f"farmer_{i % 10}", rng.choice(templates).format(veg=rng.choice(vegetables), veg2=rng.choice(vegetables)))
+        for i in range(ai_messages)
+    ]
+
+    # スタブのモデル: 1回 call_ms + 解析する1件ごとに message_ms、同時実行は model_slots まで
+    stats = {"calls": 0, "prompt_chars": 0}
+    slots = None
+
+    def shipment_json(message: str) -> dict:
+        veg = next(v for v in vegetables if v in message)
+        return {"date": "2025-01-01", "location_name": "いつもの直売所", "items": [{"name": veg, "price": 100}]}
+
+    async def ai_query(prompt: str) -> str:
+        numbered = re.findall(r"^\[(\d+)\] (.+)$", prompt, re.MULTILINE)
+        count = len(numbered) or 1
+        nonlocal slots
+        slots = slots or asyncio.Semaphore(model_slots)
+        async with slots:
+            stats["calls"] += 1
+            stats["prompt_chars"] += len(prompt)
+            await asyncio.sleep((call_ms + message_ms * count) / 1000)
+        if not numbered:
+            return json.dumps(shipment_json(prompt.split("メッセージ: ", 1)[1]), ensure_ascii=False)
+        return json.dumps({"results": [
+            {"index": int(index), "shipment": shipment_json(message)} for index, message in numbered
+        ]}, ensure_ascii=False)
+
+    async def one_by_one() -> tuple[float, float, int]:
+        start = time.perf_counter()
+        first = None
+
+        async def parse(farmer_id: str, message: str):
+            nonlocal first
+            shipment = await shipment_parser.parse_with_ai(farmer_id, message, ai_query)
+            first = first or time.perf_counter() - start
+            return shipment
+
+        shipments = await asyncio.gather(*(parse(f, m) for f, m in messages))
+        return time.perf_counter() - start, first, sum(s is not None for s in shipments)
+
+    async def packed() -> tuple[float, float, int]:
+        start = time.perf_counter()
+        first = None
+        parsed = 0
+        async for _, shipment in shipment_parser.parse_many_async(messages, ai_query):
+            first = first or time.perf_counter() - start
+            parsed += shipment is not None
+        return time.perf_counter() - start, first, parsed
+
+    print(f"AI解析: ルールベースで解析できないメッセージ{ai_messages}件、スタブのモデル"
+          f"（1回 {call_ms:.0f}ms + 1件 {message_ms:.0f}ms、同時実行 {model_slots}）\n")
+    results = {}
+    for label, run in [("1件ずつ呼ぶ（変更前）", one_by_one),
+                       (f"{SHIPMENT_PARSER['ai_batch_size']}件ずつまとめる", packed)]:
+        stats.update(calls=0, prompt_chars=0)
+        slots = None
+        elapsed, first, parsed = asyncio.run(run())
+        results[label] = (elapsed, parsed)
+        print(f"  {label:<22} 全体 {elapsed * 1000:>7.0f}ms  最初の結果 {first * 1000:>6.0f}ms  "
+              f"呼び出し {stats['calls']:>3}回  プロンプト {stats['prompt_chars']:>6}文字  解析 {parsed}件")
+    (before, before_parsed), (after, after_parsed) = results.values()
+    print(f"  → {before / after:.1f}倍\n")
+
+    # ルールベース: このプロセスで一度に解析 vs プロセスプールで分割
+    corpus = [
+        line.strip()
+        for line in open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "shipment", "messages.txt"), encoding="utf-8")
+        if line.strip() and not line.startswith("#")
+    ]
+    rules = [(f"farmer_{i % 10}", corpus[i % len(corpus)]) for i in range(rules_messages)]
+
+    async def parse_rules() -> tuple[float, float, list]:
+        # 5ms ごとに起きるタスクで、イベントループが止まった最長の時間を測る
+        stalled = 0.0
+        done = False
+
+        async def ticker():
+            nonlocal stalled
+            while not done:
+                tick = time.perf_counter()
+                await asyncio.sleep(0.005)
+                stalled = max(stalled, time.perf_counter() - tick - 0.005)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        shipments = [None] * len(rules)
+        async for index, shipment in shipment_parser.parse_many_async(rules):
+            shipments[index] = shipment
+        elapsed = time.perf_counter() - start
+        done = True
+        await task
+        return elapsed, stalled, shipments
+
+    print(f"ルールベース: test_data/shipment/messages.txt を繰り返して{rules_messages}件（CPU {os.cpu_count()}コア）\n")
+    min_batch = SHIPMENT_PARSER["process_pool_min_batch"]
+    try:
+        SHIPMENT_PARSER["process_pool_min_batch"] = rules_messages + 1
+        inline_sec, inline_stall, inline = asyncio.run(parse_rules())
+        print(f"  {'このプロセスで一度に（変更前）':<24} 全体 {inline_sec * 1000:>6.0f}ms  イベントループの停止 最長 {inline_stall * 1000:>5.0f}ms")
+
+        SHIPMENT_PARSER["process_pool_min_batch"] = min_batch
+        for label in ["プロセスプール（起動込み）", "プロセスプール（起動済み）"]:
+            pool_sec, pool_stall, pooled = asyncio.run(parse_rules())
+            print(f"  {label:<24} 全体 {pool_sec * 1000:>6.0f}ms  イベントループの停止 最長 {pool_stall * 1000:>5.0f}ms")
+    finally:
+        SHIPMENT_PARSER["process_pool_min_batch"] = min_batch
+        shipment_parser.shutdown_parse_pool()
+
+    same = [s and s.items for s in inline] == [s and s.items for s in pooled]
+    print(f"\n  結果が同じ: {same}\n")
+    return same and after_parsed == before_parsed == ai_messages and after < before and pool_stall < inline_stall
+
+
+# ===========================================
+# 出荷メッセージの解析: ルールベース → AI
+# ===========================================
+
+def bench_cascade(repeat: int = 4, call_ms: float = 300.0, model_slots: int = 4):
+    """出荷メッセージの解析（AIを先に呼ぶ vs ルールベースの確信度が低いときだけAI）"""
+    from config import SHIPMENT_PARSER
+    from shipment import parser as shipment_parser
+
+    logging.getLogger("aiseed.shipment.parser").setLevel(logging.ERROR)
+
+    corpus = [
+        line.strip()
+        for line in open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "shipment", "messages.txt"), encoding="utf-8")
+        if line.strip() and not line.startswith("#")
+    ]
+    messages = [(f"farmer_{i % 10}", corpus[i % len(corpus)]) for i in range(len(corpus) * repeat)]
+
+    # スタブのモデル: 1回 call_ms、同時実行は model_slots まで
+    calls = 0
+    slots = None
+
+    async def ai_query(prompt: str) -> str:
+        nonlocal calls, slots
+        slots = slots or asyncio.Semaphore(model_slots)
+        async with slots:
+            calls += 1
+            await asyncio.sleep(call_ms / 1000)
+        return json.dumps({"location_name": "直売所", "items": [{"name": "野菜", "price": 100}]}, ensure_ascii=False)
+
+    async def run(threshold: float) -> list[float]:
+        # 投稿は model_slots 件ずつ並行（モデルの待ち行列で待たない程度）
+        clients = asyncio.Semaphore(model_slots)
+
+        async def parse(farmer_id: str, message: str) -> float:
+            async with clients:
+                start = time.perf_counter()
+                await shipment_parser.parse_with_ai(farmer_id, message, ai_query, threshold=threshold)
+                return (time.perf_counter() - start) * 1000
+
+        return await asyncio.gather(*(parse(f, m) for f, m in messages))
+
+    print(f"test_data/shipment/messages.txt の{len(corpus)}件 × {repeat}回 = {len(messages)}件を{model_slots}件ずつ並行に投稿、"
+          f"スタブのモデル（1回 {call_ms:.0f}ms、同時実行 {model_slots}）\n")
+
+    threshold = SHIPMENT_PARSER["ai_confidence_threshold"]
+    results = {}
+    for label, value in [("AIを先に呼ぶ（変更前）", 1.01), (f"確信度 {threshold} 未満だけAI", threshold)]:
+        calls, slots = 0, None
+        shipment_parser.cascade_stats = shipment_parser.CascadeStats()
+        start = time.perf_counter()
+        latencies = asyncio.run(run(value))
+        elapsed = time.perf_counter() - start
+        stats = shipment_parser.cascade_stats.stats()
+        results[label] = (calls, elapsed)
+        print(f"  {label:<22} モデル呼び出し {calls:>3}回  全体 {elapsed * 1000:>6.0f}ms  "
+              f"p50 {percentile(latencies, 50):>6.1f}ms  p95 {percentile(latencies, 95):>6.1f}ms")
+        print(f"  {'':<22} rules={stats['rules']} ai={stats['ai']} fallback={stats['fallback']} "
+              f"rules_rate={stats['rules_rate']:.0%} avg_rule_ms={stats['avg_rule_ms']} saved_ms={stats['saved_ms']}")
+    (before_calls, before), (after_calls, after) = results.values()
+    print(f"  → モデル呼び出し {before_calls}回 → {after_calls}回、全体 {before / after:.1f}倍\n")
+
+    # 確信度の分布（閾値を変えたときにAIを呼ぶ件数の目安）
+    scored = shipment_parser.ShipmentParser().parse_many_scored([("farmer", m) for m in corpus])
+    print(f"  確信度の分布（{len(corpus)}件）:")
+    for low, high in [(0.95, 1.01), (0.9, 0.95), (0.8, 0.9), (0.5, 0.8), (0.0, 0.5)]:
+        count = sum(low <= confidence < high for _, confidence in scored)
+        print(f"    {low:.2f}〜{min(high, 1.0):.2f}  {count:>3}件")
+    print()
+    shipment_parser.cascade_stats = shipment_parser.CascadeStats()
+
+    return after_calls < before_calls and after < before
+
+
+# ===========================================
+# ストレス: 同じファイルへの並行追記
+# ===========================================
+
+async def _fire_appends(grow, shipment, community, writes: int, locked: bool) -> None:
+    """同じ植物・農家に対して観察・出荷・来店を同時に書き込む"""
+    from storage import run_io
+    from shipment.models import ShipmentInfo, ShipmentItem
+
+    def new_shipment(i: int) -> ShipmentInfo:
+        return ShipmentInfo(farmer_id="farmer1", date="2026-06-01", location_name="直売所",
+                            items=[ShipmentItem(name="トマト", price=200)], note=f"出荷{i}")
+
+    if locked:
+        calls = [grow.add_observation_async("plant1", "user1", f"観察{i}") for i in range(writes)]
+        calls += [shipment.post_shipment_async(new_shipment(i)) for i in range(writes)]
+        calls += [community.check_in_async(f"user{i}", "farmer1") for i in range(writes)]
+    else:
+        # ロックなし（スレッドプールで同時にread-modify-write）
+        calls = [run_io(grow.add_observation, "plant1", "user1", f"観察{i}") for i in range(writes)]
+        calls += [run_io(shipment.post_shipment, new_shipment(i)) for i in range(writes)]
+        calls += [run_io(community.check_in, f"user{i}", "farmer1") for i in range(writes)]
+    await asyncio.gather(*calls)
+
+
+def bench_stress(writes: int = 200):
+    """並行追記で書き込みが失われないか（ロックなし vs ファイル単位ロック）"""
+    print("=== ストレス: 同じファイルへの並行追記 ===\n")
+
+    import storage.aio
+    from grow import GrowService
+    from shipment import ShipmentService
+    from community import CommunityService
+    from config import IO
+
+    print(f"観察・出荷・来店 各{writes}件を同時に追加（同じ植物・同じ農家）\n")
+    logging.disable(logging.INFO)
+
+    ok = True
+    for label, locked in (("ロックなし", False), ("ファイル単位ロック", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            grow = GrowService(base_path=os.path.join(tmp, "grow"))
+            shipment = ShipmentService(base_path=os.path.join(tmp, "shipment"))
+            community = CommunityService(base_path=os.path.join(tmp, "community"))
+
+            storage.aio.configure_io_pool(IO["max_workers"])
+            start = time.perf_counter()
+            try:
+                asyncio.run(_fire_appends(grow, shipment, community, writes, locked))
+            finally:
+                storage.aio.shutdown_io_pool()
+            elapsed = time.perf_counter() - start
+
+            saved = {
+                "観察": len(grow.get_observations("user1", "plant1", limit=writes * 2)),
+                "出荷": len(shipment.get_shipments("farmer1", limit=writes * 2)),
+                "来店": len(community.get_checkins("farmer1", limit=writes * 2)),
+            }
+            lost = {name: writes - count for name, count in saved.items()}
+            result = " ".join(f"{name}{count}/{writes}" for name, count in saved.items())
+            print_row(label, elapsed, writes * 3, f"保存 {result}  消失 {sum(lost.values())}件")
+            if locked and any(lost.values()):
+                ok = False
+    print()
+    logging.disable(logging.NOTSET)
+
+    if not ok:
+        print("✗ ロックありで書き込みが失われました")
+    return ok
+
+
+# ===========================================
+# メイン
+# ===========================================
+
+BENCHMARKS = {
+    "--memory-batch": bench_memory_batch,
+    "--memory-cache": bench_memory_cache,
+    "--load": bench_load,
+    "--stress": bench_stress,
+    "--observations": bench_observations,
+    "--stats": bench_stats,
+    "--today": bench_today,
+    "--followers": bench_followers,
+    "--user-checkins": bench_user_checkins,
+    "--sessions": bench_sessions,
+    "--analyzer": bench_analyzer,
+    "--archive": bench_archive,
+    "--tools": bench_tools,
+    "--stream": bench_stream,
+    "--prompt": bench_prompt,
+    "--context": bench_context,
+    "--ai-cache": bench_ai_cache,
+    "--coalesce": bench_coalesce,
+    "--scheduler": bench_scheduler,
+    "--notify": bench_notify,
+    "--outbox": bench_outbox,
+    "--parser": bench_parser,
+    "--parse-batch": bench_parse_batch,
+    "--cascade": bench_cascade,
+}
+
+
+def print_help():
+    """ヘルプを表示"""
+    print("""
+使用方法: python benchmark.py [オプション]
+
+  --memory-batch  会話分析の保存（個別書き込み vs 一括書き込み）
+  --memory-cache  get_user_summary（キャッシュなし vs LRUキャッシュ）
+  --load          同時接続200でのAPIレイテンシ（ブロッキング vs スレッドプール）
+  --stress        同じファイルへの並行追記（ロックなし vs ファイル単位ロック）
+  --observations  観察記録の追加・ページング（JSON配列 vs JSONL + インデックス）
+  --stats         植物・ユーザー統計（全件集計 vs 集計済みの値）
+  --today         全植物の今日・直近30日の観察（植物500件×3年、植物ごと vs 日付別インデックス）
+  --followers     農家のフォロワー一覧・数（ユーザー1万人、全ユーザー走査 vs フォロワー索引）
+  --user-checkins ユーザーの来店履歴（農家10/100/1000件、全農家走査 vs ユーザー別来店記録）
+  --sessions      体験セッション（ワーカー2つに交互に振り分け、プロセス内 vs SQLite共有）
+  --analyzer      体験タスク結果の再分析（10万件、1件ずつ vs NumPy一括）
+  --archive       体験タスク結果のアーカイブ再分析（12万件、JSONL vs 列形式 .npz）
+  --tools         ツール定義・ハンドラーの取得（呼び出しごとに組み立て vs 登録簿）
+  --stream        会話の最初の1バイトまでの時間（全文を待って返す vs SSEで差分を返す、スタブSDK）
+  --prompt        会話プロンプトの組み立て（1セッション100往復、毎回全体を作る vs PromptBuilder）
+  --context       長いセッションのプロンプトの大きさと応答時間（200往復、全履歴 vs 窓 + 要約、スタブSDK）
+  --ai-cache      同じ内容の診断の繰り返し（200件・20通り、キャッシュなし vs メモリ + SQLite、再起動後）
+  --coalesce      同じ内容の診断の同時実行（100件・5通り、個別に呼ぶ vs single-flight）
+  --scheduler     会話分析40件の集中中の対話10件の待ち時間（先着順 vs 実行枠 + 優先順位）と429
+  --notify        購読者300人への通知（1件ずつ順に送る vs 並行・バッチ・再送、ローカルのSMTP・プッシュスタブ）
+  --outbox        購読者500人: 投稿APIの応答（送信を待つ vs outbox）、ワーカーの送信・重複排除・停止からの再開・デッドレター
+  --parser        出荷メッセージ50件×40回の商品の抽出（野菜ごとの正規表現 vs 1回の走査）、辞書1000語での比較
+  --parse-batch   出荷メッセージの一括解析: AI解析100件（1件ずつ呼ぶ vs 20件ずつまとめる、スタブのモデル）、
+                  ルールベース1万件（このプロセス vs プロセスプール、イベントループの停止時間）
+  --cascade       出荷メッセージ50件×4回の解析（AIを先に呼ぶ vs ルールベースの確信度が低いときだけAI、スタブのモデル）
+  --all           全ベンチマーク
+
+その他:
+  --help          このヘルプを表示
+""")
+
+
+if __name__ == "__main__":
+    print("AIseed ベンチマーク\n")
+
+    if "--help" in sys.argv or "-h" in sys.argv or len(sys.argv) < 2:
+        print_help()
+        sys.exit(0)
+
+    selected = list(BENCHMARKS) if "--all" in sys.argv else [a for a in sys.argv[1:] if a in BENCHMARKS]
+    results = [BENCHMARKS[flag]() for flag in selected]
+    print("=== ベンチマーク完了 ===")
+    sys.exit(0 if all(results) else 1)
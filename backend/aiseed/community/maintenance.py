@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+コミュニティデータのメンテナンス
+
+使用方法（backend/aiseed で実行）:
+    python -m community.maintenance rebuild-followers       # フォロワー索引を作り直す
+    python -m community.maintenance check-followers         # 索引とお気に入りの整合性を確認
+    python -m community.maintenance check-followers --fix   # 不整合があれば作り直す
+    python -m community.maintenance rebuild-checkins        # ユーザー別来店記録を作り直す
+
+お気に入りの追加・削除や来店記録と同時に実行すると結果がずれることがあるため、
+サーバー停止中に実行する。
+"""
+import argparse
+import os
+import sys
+
+# パスを追加（community, storageモジュールのため）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from community.service import CommunityService
+
+
+def rebuild_followers(service: CommunityService, args) -> bool:
+    """全ユーザーの favorites.json からフォロワー索引を作り直す"""
+    counts = service.rebuild_follower_index()
+    for farmer_id, count in sorted(counts.items()):
+        print(f"  farmer={farmer_id} followers={count}")
+    return True
+
+
+def check_followers(service: CommunityService, args) -> bool:
+    """フォロワー索引とお気に入りの不整合を表示（--fix で作り直す）"""
+    problems = service.check_follower_index()
+    for farmer_id, result in problems.items():
+        details = " ".join(f"{kind}={','.join(users)}" for kind, users in result.items() if users)
+        print(f"  farmer={farmer_id} {details}")
+    if not problems:
+        print("  不整合なし")
+        return True
+    if args.fix:
+        rebuild_followers(service, args)
+        return True
+    return False
+
+
+def rebuild_checkins(service: CommunityService, args) -> bool:
+    """全農家の checkins.json からユーザー別来店記録を作り直す"""
+    counts = service.rebuild_user_checkin_index()
+    print(f"  users={len(counts)} checkins={sum(counts.values())}")
+    return True
+
+
+COMMANDS = {
+    "rebuild-followers": rebuild_followers,
+    "check-followers": check_followers,
+    "rebuild-checkins": rebuild_checkins,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="コミュニティデータのメンテナンス")
+    parser.add_argument("command", choices=COMMANDS.keys())
+    parser.add_argument("--fix", action="store_true", help="check-followers: 不整合があれば索引を作り直す")
+    parser.add_argument("--base-path", default="community_data", help="データディレクトリ（既定: community_data）")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.base_path):
+        print(f"エラー: データディレクトリが見つかりません: {args.base_path}")
+        sys.exit(1)
+
+    service = CommunityService(base_path=args.base_path)
+
+    print(f"{args.command}:")
+    if not COMMANDS[args.command](service, args):
+        sys.exit(1)
+    print("完了")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,15 @@
 """
 import json
 import logging
+import threading
 import uuid
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from storage import (
+    offload, atomic_write_json, atomic_write_jsonl, append_jsonl, read_jsonl_tail, ThreadKeyedLocks
+)
 from .models import (
     Favorite,
     CheckIn,
@@ -19,6 +23,11 @@ from .models import (
 
 logger = logging.getLogger("aiseed.community")
 
+# フォロワー索引の構築が完了した印（community_data直下）
+FOLLOWER_INDEX_MARKER = ".followers_built"
+# ユーザー別来店記録の構築が完了した印（community_data直下）
+USER_CHECKIN_INDEX_MARKER = ".user_checkins_built"
+
 
 class CommunityService:
     """コミュニティサービス"""
@@ -27,6 +36,12 @@ class CommunityService:
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
 
+        # followers.json の読み込み→更新→保存と、初回構築を直列化
+        self._followers_lock = threading.RLock()
+        # user_{id}/checkins.jsonl への追記をユーザーごとに直列化（キー: user_id）
+        # （別の農家への来店が同じユーザーのファイルに同時に追記される）。構築は全ユーザーを排他する
+        self._user_checkin_locks = ThreadKeyedLocks()
+
     # ==================== お気に入り ====================
 
     def add_favorite(
@@ -55,10 +70,12 @@ class CommunityService:
             # 既にお気に入り済み、設定を更新
             existing["notify_shipment"] = notify_shipment
             self._save_favorites(user_id, favorites)
+            self._update_followers(farmer_id, user_id, existing)
             return Favorite(**existing)
 
         favorites.append(favorite.model_dump())
         self._save_favorites(user_id, favorites)
+        self._update_followers(farmer_id, user_id, favorite.model_dump())
 
         logger.info(f"[Favorite] Added: user={user_id} farmer={farmer_id}")
         return favorite
@@ -70,6 +87,7 @@ class CommunityService:
 
         if len(new_favorites) < len(favorites):
             self._save_favorites(user_id, new_favorites)
+            self._update_followers(farmer_id, user_id, None)
             logger.info(f"[Favorite] Removed: user={user_id} farmer={farmer_id}")
             return True
         return False
@@ -85,21 +103,12 @@ class CommunityService:
         return any(f.get("farmer_id") == farmer_id for f in favorites)
 
     def get_farmer_followers(self, farmer_id: str) -> list[Favorite]:
-        """農家のフォロワー一覧を取得"""
-        # 全ユーザーのお気に入りを検索
-        followers = []
-        for user_dir in self.base_path.glob("user_*"):
-            favorites_file = user_dir / "favorites.json"
-            if favorites_file.exists():
-                try:
-                    with open(favorites_file, "r", encoding="utf-8") as f:
-                        favorites = json.load(f)
-                        for fav in favorites:
-                            if fav.get("farmer_id") == farmer_id:
-                                followers.append(Favorite(**fav))
-                except Exception:
-                    pass
-        return followers
+        """農家のフォロワー一覧を取得（フォロワー索引から）"""
+        return [Favorite(**f) for f in self._load_followers(farmer_id).values()]
+
+    def get_follower_count(self, farmer_id: str) -> int:
+        """農家のフォロワー数"""
+        return len(self._load_followers(farmer_id))
 
     def _load_favorites(self, user_id: str) -> list[dict]:
         """お気に入りを読み込み"""
@@ -116,9 +125,117 @@ class CommunityService:
         """お気に入りを保存"""
         user_dir = self.base_path / f"user_{user_id}"
         user_dir.mkdir(parents=True, exist_ok=True)
-        file_path = user_dir / "favorites.json"
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(favorites, f, ensure_ascii=False, indent=2, default=str)
+        atomic_write_json(user_dir / "favorites.json", favorites, default=str)
+
+    # ==================== フォロワー索引 ====================
+    # farmer_{farmer_id}/followers.json: {user_id: お気に入り} の逆引き
+    # 正はユーザー側の favorites.json。索引はお気に入りの追加・削除で更新する
+
+    def _followers_path(self, farmer_id: str) -> Path:
+        return self.base_path / f"farmer_{farmer_id}" / "followers.json"
+
+    def _load_followers(self, farmer_id: str) -> dict[str, dict]:
+        """フォロワー索引を読み込み（未構築なら全ユーザーから構築）"""
+        self._ensure_follower_index()
+        file_path = self._followers_path(farmer_id)
+        if not file_path.exists():
+            return {}
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save_followers(self, farmer_id: str, followers: dict[str, dict]):
+        """フォロワー索引を保存"""
+        farmer_dir = self.base_path / f"farmer_{farmer_id}"
+        farmer_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(farmer_dir / "followers.json", followers, default=str)
+
+    def _update_followers(self, farmer_id: str, user_id: str, favorite: Optional[dict]):
+        """フォロワー索引の1ユーザー分を更新（favoriteがNoneなら削除）"""
+        with self._followers_lock:
+            followers = self._load_followers(farmer_id)
+            if favorite is None:
+                followers.pop(user_id, None)
+            else:
+                followers[user_id] = favorite
+            self._save_followers(farmer_id, followers)
+
+    def _ensure_follower_index(self):
+        """索引が未構築（このバージョンより前のデータ）なら一度だけ構築"""
+        if not (self.base_path / FOLLOWER_INDEX_MARKER).exists():
+            with self._followers_lock:
+                if not (self.base_path / FOLLOWER_INDEX_MARKER).exists():
+                    self._write_follower_index(self._scan_followers())
+
+    def _scan_followers(self) -> dict[str, dict[str, dict]]:
+        """全ユーザーの favorites.json から農家ごとのフォロワーを集める"""
+        index: dict[str, dict[str, dict]] = {}
+        for user_dir in self.base_path.glob("user_*"):
+            favorites_file = user_dir / "favorites.json"
+            if favorites_file.exists():
+                try:
+                    with open(favorites_file, "r", encoding="utf-8") as f:
+                        favorites = json.load(f)
+                except Exception:
+                    continue
+                for fav in favorites:
+                    index.setdefault(fav.get("farmer_id"), {})[fav.get("user_id")] = fav
+        return index
+
+    def _write_follower_index(self, index: dict[str, dict[str, dict]]):
+        """全農家の followers.json を書き直す（呼び出し側でロックを取る）"""
+        for followers_file in self.base_path.glob("farmer_*/followers.json"):
+            farmer_id = followers_file.parent.name[len("farmer_"):]
+            if farmer_id not in index:
+                followers_file.unlink()
+        for farmer_id, followers in index.items():
+            self._save_followers(farmer_id, followers)
+        (self.base_path / FOLLOWER_INDEX_MARKER).touch()
+        logger.info(f"[Favorite] Follower index built: farmers={len(index)}")
+
+    def rebuild_follower_index(self) -> dict[str, int]:
+        """全ユーザーのお気に入りから索引を作り直す（農家ID → フォロワー数）"""
+        with self._followers_lock:
+            index = self._scan_followers()
+            self._write_follower_index(index)
+        return {farmer_id: len(followers) for farmer_id, followers in index.items()}
+
+    def check_follower_index(self) -> dict[str, dict[str, list[str]]]:
+        """
+        索引とお気に入りの整合性を確認
+
+        Returns:
+            不整合のある農家ごとの {"missing": 索引にないユーザー, "extra": お気に入りにないユーザー,
+            "mismatch": 設定が食い違うユーザー}（整合していれば空）
+        """
+        expected = self._scan_followers()
+        farmer_ids = set(expected)
+        farmer_ids.update(
+            path.parent.name[len("farmer_"):] for path in self.base_path.glob("farmer_*/followers.json")
+        )
+
+        problems = {}
+        for farmer_id in sorted(farmer_ids):
+            want = expected.get(farmer_id, {})
+            file_path = self._followers_path(farmer_id)
+            have = {}
+            if file_path.exists():
+                with open(file_path, "r", encoding="utf-8") as f:
+                    have = json.load(f)
+            result = {
+                "missing": sorted(set(want) - set(have)),
+                "extra": sorted(set(have) - set(want)),
+                "mismatch": sorted(
+                    user_id for user_id in set(want) & set(have)
+                    if json.dumps(want[user_id], sort_keys=True, default=str)
+                    != json.dumps(have[user_id], sort_keys=True, default=str)
+                ),
+            }
+            if any(result.values()):
+                problems[farmer_id] = result
+        return problems
 
     # ==================== 来店記録 ====================
 
@@ -129,6 +246,7 @@ class CommunityService:
         location_name: Optional[str] = None
     ) -> CheckIn:
         """来店を記録"""
+        self._ensure_user_checkin_index()
         checkin = CheckIn(
             id=str(uuid.uuid4())[:8],
             user_id=user_id,
@@ -140,6 +258,7 @@ class CommunityService:
         checkins = self._load_checkins(farmer_id)
         checkins.append(checkin.model_dump())
         self._save_checkins(farmer_id, checkins)
+        self._append_user_checkin(checkin.model_dump())
 
         logger.info(
             f"[CheckIn] user={user_id} farmer={farmer_id} "
@@ -173,29 +292,10 @@ class CommunityService:
         return [CheckIn(**c) for c in checkins[:limit]]
 
     def get_user_checkins(self, user_id: str, limit: int = 20) -> list[CheckIn]:
-        """特定ユーザーの来店記録を取得（全農家から）"""
-        all_checkins = []
-        # 全農家のディレクトリを検索
-        for farmer_dir in self.base_path.glob("farmer_*"):
-            checkins_file = farmer_dir / "checkins.json"
-            if checkins_file.exists():
-                try:
-                    with open(checkins_file, "r", encoding="utf-8") as f:
-                        checkins = json.load(f)
-                        for c in checkins:
-                            if c.get("user_id") == user_id:
-                                all_checkins.append(c)
-                except Exception:
-                    pass
-
-        # 新しい順にソート
-        all_checkins = sorted(
-            all_checkins,
-            key=lambda x: x.get("created_at", ""),
-            reverse=True
-        )
-
-        return [CheckIn(**c) for c in all_checkins[:limit]]
+        """特定ユーザーの来店記録を取得（ユーザー別の来店記録から新しい順）"""
+        self._ensure_user_checkin_index()
+        checkins = read_jsonl_tail(self._user_checkins_path(user_id), limit)
+        return [CheckIn(**c) for c in checkins]
 
     def _load_checkins(self, farmer_id: str) -> list[dict]:
         """来店記録を読み込み"""
@@ -212,9 +312,58 @@ class CommunityService:
         """来店記録を保存"""
         farmer_dir = self.base_path / f"farmer_{farmer_id}"
         farmer_dir.mkdir(parents=True, exist_ok=True)
-        file_path = farmer_dir / "checkins.json"
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(checkins, f, ensure_ascii=False, indent=2, default=str)
+        atomic_write_json(farmer_dir / "checkins.json", checkins, default=str)
+
+    # ==================== ユーザー別来店記録 ====================
+    # user_{user_id}/checkins.jsonl: 全農家への来店の複製（追記順 = 古い順、1行1件）
+    # 正は農家側の checkins.json。来店記録の追加時に追記する
+
+    def _user_checkins_path(self, user_id: str) -> Path:
+        return self.base_path / f"user_{user_id}" / "checkins.jsonl"
+
+    def _append_user_checkin(self, checkin: dict):
+        """ユーザー別来店記録に1件追記"""
+        user_dir = self.base_path / f"user_{checkin['user_id']}"
+        user_dir.mkdir(parents=True, exist_ok=True)
+        with self._user_checkin_locks.hold(checkin["user_id"]):
+            append_jsonl(user_dir / "checkins.jsonl", checkin, default=str)
+
+    def _ensure_user_checkin_index(self):
+        """未構築（このバージョンより前のデータ）なら一度だけ構築"""
+        if not (self.base_path / USER_CHECKIN_INDEX_MARKER).exists():
+            with self._user_checkin_locks.hold_all():
+                if not (self.base_path / USER_CHECKIN_INDEX_MARKER).exists():
+                    self._build_user_checkin_index()
+
+    def _build_user_checkin_index(self) -> dict[str, int]:
+        """全農家の checkins.json からユーザー別来店記録を書き直す（呼び出し側でロックを取る）"""
+        by_user: dict[str, list[dict]] = {}
+        for checkins_file in self.base_path.glob("farmer_*/checkins.json"):
+            try:
+                with open(checkins_file, "r", encoding="utf-8") as f:
+                    checkins = json.load(f)
+            except Exception:
+                continue
+            for c in checkins:
+                by_user.setdefault(c.get("user_id"), []).append(c)
+
+        for stale_file in self.base_path.glob("user_*/checkins.jsonl"):
+            if stale_file.parent.name[len("user_"):] not in by_user:
+                stale_file.unlink()
+        for user_id, checkins in by_user.items():
+            checkins.sort(key=lambda x: x.get("created_at", ""))
+            user_dir = self.base_path / f"user_{user_id}"
+            user_dir.mkdir(parents=True, exist_ok=True)
+            atomic_write_jsonl(user_dir / "checkins.jsonl", checkins, default=str)
+
+        (self.base_path / USER_CHECKIN_INDEX_MARKER).touch()
+        logger.info(f"[CheckIn] User check-in index built: users={len(by_user)}")
+        return {user_id: len(checkins) for user_id, checkins in by_user.items()}
+
+    def rebuild_user_checkin_index(self) -> dict[str, int]:
+        """全農家の来店記録からユーザー別来店記録を作り直す（ユーザーID → 来店数）"""
+        with self._user_checkin_locks.hold_all():
+            return self._build_user_checkin_index()
 
     # ==================== 通知設定 ====================
 
@@ -252,10 +401,7 @@ class CommunityService:
 
         user_dir = self.base_path / f"user_{user_id}"
         user_dir.mkdir(parents=True, exist_ok=True)
-        file_path = user_dir / "notification_settings.json"
-
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(settings.model_dump(), f, ensure_ascii=False, indent=2, default=str)
+        atomic_write_json(user_dir / "notification_settings.json", settings.model_dump(), default=str)
 
         logger.info(f"[NotificationSettings] Updated: user={user_id}")
         return settings
@@ -275,7 +421,6 @@ class CommunityService:
 
     def get_farmer_stats(self, farmer_id: str) -> FarmerStats:
         """農家/店舗の統計を取得"""
-        followers = self.get_farmer_followers(farmer_id)
         checkins = self._load_checkins(farmer_id)
 
         today = datetime.now().strftime("%Y-%m-%d")
@@ -286,7 +431,7 @@ class CommunityService:
 
         return FarmerStats(
             farmer_id=farmer_id,
-            favorite_count=len(followers),
+            favorite_count=self.get_follower_count(farmer_id),
             checkin_count=len(checkins),
             today_checkin_count=len(today_checkins),
         )
@@ -430,3 +575,23 @@ class CommunityService:
   </script>
 </body>
 </html>'''
+
+    # ==================== 非同期API ====================
+    # ファイルI/Oをイベントループ外（I/O用スレッドプール）で実行する
+    # 書き込みはファイル単位のロック（lock=）で直列化する
+
+    add_favorite_async = offload(add_favorite, lock=("community.favorites", "user_id"))
+    remove_favorite_async = offload(remove_favorite, lock=("community.favorites", "user_id"))
+    get_user_favorites_async = offload(get_user_favorites)
+    is_favorite_async = offload(is_favorite)
+    get_farmer_followers_async = offload(get_farmer_followers)
+    get_follower_count_async = offload(get_follower_count)
+    check_in_async = offload(check_in, lock=("community.checkins", "farmer_id"))
+    get_checkins_async = offload(get_checkins)
+    get_user_checkins_async = offload(get_user_checkins)
+    update_notification_settings_async = offload(
+        update_notification_settings, lock=("community.notification_settings", "user_id")
+    )
+    get_notification_settings_async = offload(get_notification_settings)
+    get_farmer_stats_async = offload(get_farmer_stats)
+    generate_checkin_page_async = offload(generate_checkin_page)
@@ -5,11 +5,21 @@ from .settings import (
     AI_PROVIDERS,
     CURRENT_PROVIDER,
     MODEL_ASSIGNMENT,
+    MODEL_CONCURRENCY,
+    BACKGROUND_TASKS,
     TASK_CLASSIFICATION,
     LOG_LEVELS,
     LOG_FORMAT,
     SERVER,
     MEMORY,
+    SPARK_SESSIONS,
+    EXPERIENCE_ARCHIVE,
+    PROMPT,
+    CONTEXT,
+    AI_CACHE,
+    SHIPMENT_PARSER,
+    NOTIFICATIONS,
+    IO,
     get_model_id,
     get_model_info,
 )
@@ -25,11 +35,21 @@ __all__ = [
     "AI_PROVIDERS",
     "CURRENT_PROVIDER",
     "MODEL_ASSIGNMENT",
+    "MODEL_CONCURRENCY",
+    "BACKGROUND_TASKS",
     "TASK_CLASSIFICATION",
     "LOG_LEVELS",
     "LOG_FORMAT",
     "SERVER",
     "MEMORY",
+    "SPARK_SESSIONS",
+    "EXPERIENCE_ARCHIVE",
+    "PROMPT",
+    "CONTEXT",
+    "AI_CACHE",
+    "SHIPMENT_PARSER",
+    "NOTIFICATIONS",
+    "IO",
     "get_model_id",
     "get_model_info",
     # Logging
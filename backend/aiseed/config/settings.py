@@ -58,6 +58,23 @@ MODEL_ASSIGNMENT = {
     "light": "haiku",
 }
 
+# 処理タイプごとのモデル呼び出しの同時実行数と待ち行列
+# - max_concurrent: 同時に実行する呼び出しの数
+# - max_background: そのうちバックグラウンド処理が使える数（残りは対話用に空けておく）
+# - max_queue: 空きを待てる呼び出しの数（対話・バックグラウンドそれぞれ）。超えたらAPIは429（Retry-After付き）を返す
+MODEL_CONCURRENCY = {
+    "heavy": {"max_concurrent": 4, "max_background": 2, "max_queue": 32},
+    "medium": {"max_concurrent": 8, "max_background": 4, "max_queue": 64},
+    "light": {"max_concurrent": 16, "max_background": 8, "max_queue": 128},
+}
+
+# バックグラウンド扱いの処理（対話の後に実行し、max_background の枠だけを使う）
+BACKGROUND_TASKS = [
+    "analyze_conversation",
+    "analyze_strengths",
+    "parse_shipment_batch",  # 出荷メッセージの一括解析（件数が多く、対話の枠を使い切らないように）
+]
+
 # ===========================================
 # Task Classification
 # ===========================================
@@ -75,6 +92,9 @@ TASK_CLASSIFICATION = {
     "create_conversation": "medium",
     "learn_conversation": "medium",
     "experience_feedback": "medium",
+    "grow_analysis": "medium",
+    "parse_shipment": "medium",
+    "parse_shipment_batch": "medium",
 
     # Light
     "get_user_profile": "light",
@@ -112,6 +132,163 @@ SERVER = {
 
 MEMORY = {
     "base_path": "user_memory",
+
+    # ストレージバックエンド
+    # - "json": ユーザーごとのprofile.json / history.json（従来形式）
+    # - "sqlite": base_path/memory.db（WALモード、追加は行単位）
+    "backend": "json",
+
+    # パース済みプロファイル・履歴のLRUキャッシュ
+    # ファイルのmtime（SQLiteは更新列）が変わったエントリは自動的に読み直す
+    "cache_max_entries": 1024,  # 0でキャッシュ無効
+    "cache_max_bytes": 64 * 1024 * 1024,  # 推定メモリ使用量の上限
+}
+
+# ===========================================
+# Spark Experience Sessions
+# ===========================================
+
+SPARK_SESSIONS = {
+    # セッションの保存先
+    # - "sqlite": path のSQLite（複数ワーカーで共有、再起動後も残る）
+    # - "memory": プロセス内のLRU（単一ワーカー・開発用）
+    "backend": "sqlite",
+    "path": "user_memory/spark_sessions.db",
+
+    "ttl_sec": 24 * 3600,  # 開始から破棄までの時間
+    "idle_sec": 3600,  # 最後の操作から破棄までの時間
+    "max_sessions": 10000,  # 上限（超えたら最後の操作が古いものから破棄）
+}
+
+# 完了した体験タスクの生の結果（タップ列・配置座標など）の日別アーカイブ
+# 当日分はJSONLに追記し、日付が変わったら列形式の .npz に変換する
+EXPERIENCE_ARCHIVE = {
+    "enabled": True,
+    "path": "user_memory/experience_archive",
+}
+
+# ===========================================
+# Prompt Configuration
+# ===========================================
+
+PROMPT = {
+    # 会話プロンプトの組み立てキャッシュ（ユーザー情報・描画済みの会話履歴、セッションごと）
+    # ユーザー情報はプロファイルのバージョンが変わったら作り直す
+    "cache_max_entries": 2048,  # 0でキャッシュ無効
+    "cache_max_bytes": 32 * 1024 * 1024,  # 推定メモリ使用量の上限
+}
+
+# 会話履歴をプロンプトに入れる量（推定トークン数、ASCIIは4文字・日本語は1文字で1トークン）
+# サービスごとに default を上書きできる
+# - keep_turns: そのまま入れる直近の発言数の上限（Noneで無制限）
+# - max_history_tokens: そのまま入れる発言の合計の上限（Noneで無制限、最新の1発言は必ず入れる）
+# - summary_max_tokens: それより前の発言の要点（1発言1行）の上限。超えたら古い行から捨てる
+# - summary_turn_chars: 要点に残す1発言あたりの文字数
+CONTEXT = {
+    "default": {
+        "keep_turns": 12,
+        "max_history_tokens": 4000,
+        "summary_max_tokens": 1000,
+        "summary_turn_chars": 60,
+    },
+    # 強み発見は以前の発言への言及が多いため、そのまま入れる範囲を広めに
+    "spark": {
+        "keep_turns": 20,
+        "max_history_tokens": 6000,
+    },
+}
+
+# AI応答のキャッシュ（同じ内容のプロンプトはモデルを呼び直さない）
+# キーは 処理名 + モデルID + 正規化したプロンプト。tasks に挙げた処理名だけをキャッシュする
+AI_CACHE = {
+    "enabled": True,
+    # 処理名（TASK_CLASSIFICATION のもの）→ 有効期限（秒）
+    "tasks": {
+        "grow_analysis": 24 * 3600,  # 栽培の分析・診断・観察の問いかけ
+        "parse_shipment": 24 * 3600,  # 出荷メッセージの解析（プロンプトに今日の日付を含む）
+    },
+    "path": "user_memory/ai_cache.db",  # ディスク側（全ワーカーで共有）
+    "max_entries": 2048,  # メモリ側の最大件数
+    "max_bytes": 16 * 1024 * 1024,  # メモリ側の推定メモリ使用量の上限
+    "disk_max_entries": 50000,  # ディスク側の最大件数
+}
+
+# ===========================================
+# Shipment Parser
+# ===========================================
+
+# 出荷メッセージのルールベース解析と一括解析
+SHIPMENT_PARSER = {
+    # 野菜名の辞書に加える作物データセット（Noneで組み込みの辞書のみ）
+    # data/data-collection の crop_data.json、または c*.json のディレクトリ
+    # name_jp / name_kana / common_names.jp を読み込む
+    "crop_dataset": None,
+
+    # ルールベースの確信度（0〜1）がこれ以上ならAIを呼ばない
+    # 場所 0.4 + 辞書の野菜名 0.4 + 価格の網羅 0.2（商品にできた価格の割合）。
+    # 0.95: 場所と辞書の野菜名があり、メッセージ中の価格の3/4以上を商品にできたとき
+    "ai_confidence_threshold": 0.95,
+
+    # 一括解析（POST /internal/shipment/post/batch）
+    "max_batch_messages": 2000,  # 1回のリクエストのメッセージ数の上限
+    "process_pool_min_batch": 500,  # これ以上の件数はプロセスプールで解析する
+    "process_workers": 2,  # プロセスプールのプロセス数
+    "chunk_size": 250,  # プロセスプールに1回で渡す件数
+    "ai_batch_size": 20,  # ルールベースで解析できなかったものを1回のAI呼び出しにまとめる件数
+}
+
+# ===========================================
+# Shipment Notifications
+# ===========================================
+
+# 出荷情報の購読者への通知
+# 送信先（provider）: "log" ログに出すだけ（開発用） / "smtp" SMTPサーバー / "http" プッシュ中継サーバー
+# SMTPの認証情報は .env の SMTP_USERNAME / SMTP_PASSWORD
+NOTIFICATIONS = {
+    "email": {
+        "provider": "log",
+        "host": "localhost",
+        "port": 25,
+        "sender": "noreply@aiseed.dev",
+        "use_tls": False,
+        "timeout_sec": 30,
+        "batch_size": 50,  # 1接続で送る通数
+        "rate_per_sec": 20,  # 1秒あたりの最大送信数（Noneで無制限）
+    },
+    "push": {
+        "provider": "log",
+        "endpoint": "http://localhost:8002/push",
+        "timeout_sec": 10,
+        "batch_size": 100,  # 1リクエストで送る件数
+        "rate_per_sec": 200,
+    },
+    "max_concurrency": 8,  # 同時に送るバッチ数（メール・プッシュ合計）
+    "max_attempts": 4,  # 1通知あたりの最大送信回数（初回を含む）
+    "backoff_base_sec": 0.5,  # 再送までの待ち時間（失敗ごとに倍、ジッター付き）
+    "backoff_max_sec": 30,
+    # 送信待ち（投稿と同時にSQLiteへ書き込み、ワーカーが送る。再起動後も残る）
+    # 無効にすると投稿したプロセスのバックグラウンドで送る（再起動で未送信分は失われる）
+    "outbox": {
+        "enabled": True,
+        "path": "shipment_data/notification_outbox.db",
+        # このプロセスで送信ワーカーを動かすか
+        # False なら別プロセスで python -m shipment.maintenance worker を動かす
+        "worker": True,
+        "batch_size": 200,  # 1回に取り出す件数
+        "lease_sec": 300,  # 取り出してから他のワーカーに渡さない時間
+        "poll_interval_sec": 1.0,  # 送信待ちを確認する間隔（投稿時は即座に確認）
+        "retention_sec": 7 * 24 * 3600,  # 送信済みを残しておく期間
+    },
+}
+
+# ===========================================
+# I/O Configuration
+# ===========================================
+
+IO = {
+    # JSONファイルの読み書きを実行するスレッドプールのサイズ
+    # APIハンドラーはイベントループを塞がないよう *_async メソッド経由でここに委譲する
+    "max_workers": 8,
 }
 
 # ===========================================
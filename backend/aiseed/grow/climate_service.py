@@ -15,6 +15,7 @@ from pathlib import Path
 from typing import Optional
 from datetime import datetime, timedelta
 
+from storage import offload
 from .climate_models import (
     ClimateData, MonthlyClimate, GrowingCalendar,
     ClimateSimpleResponse
@@ -491,6 +492,12 @@ class ClimateService:
         except Exception as e:
             logger.warning(f"[Climate] Cache save error: {e}")
 
+    # ==================== 非同期API ====================
+    # ファイルI/Oをイベントループ外（I/O用スレッドプール）で実行する
+
+    get_climate_async = offload(get_climate)
+    get_climate_simple_async = offload(get_climate_simple)
+
     # ==================== ERA5 API（将来実装） ====================
 
     async def fetch_era5_data(self, lat: float, lon: float, year_range: str = "1991-2020"):
@@ -0,0 +1,130 @@
+"""
+日付別の観察記録インデックス
+
+ユーザーの全植物の観察記録を日付ごとのファイルにも書き込み、
+「今日の観察」や期間指定の一覧を、該当日のファイルだけ読んで返す。
+
+ファイル構成（grow_data/user_{user_id}/）:
+  └── days/
+      ├── .built             # 既存データからの構築が完了した印
+      ├── 2026-06-01.jsonl   # その日の観察記録（全植物、1行1件の複製）
+      └── 2026-06-02.jsonl
+
+同じ記録が重複して書かれても（構築と追加が重なった場合など）、読み込み時にIDで除く。
+"""
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .stats import is_iso_date, normalize_date
+
+BUILT_MARKER = ".built"
+
+
+class DayIndex:
+    """1ユーザーの日付別インデックス"""
+
+    def __init__(self, user_dir: Path):
+        self.directory = user_dir / "days"
+
+    def _path(self, date: str) -> Path:
+        # 日付はファイル名になる（「../」などでユーザーのディレクトリの外に書かない）
+        if not is_iso_date(date):
+            raise ValueError(f"invalid date for day index: {date!r}")
+        return self.directory / f"{date}.jsonl"
+
+    @staticmethod
+    def _file_date(date) -> Optional[str]:
+        """記録の観察日 → ファイルの日付（旧データの「2026/6/2」もそろえる、読めなければ None）"""
+        try:
+            return normalize_date(date)
+        except ValueError:
+            return None
+
+    def is_built(self) -> bool:
+        return (self.directory / BUILT_MARKER).exists()
+
+    # ==================== 読み込み ====================
+
+    def read(self, date: str) -> list[dict]:
+        """指定日の記録（追加順）"""
+        return self._read_file(self._path(date))
+
+    def read_range(self, start: str, end: str) -> list[dict]:
+        """start〜end（両端を含む）の記録（日付順）"""
+        if not self.directory.exists():
+            return []
+        records = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".jsonl") and start <= name[:-len(".jsonl")] <= end:
+                records += self._read_file(self.directory / name)
+        return records
+
+    def _read_file(self, path: Path) -> list[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        records: dict[str, dict] = {}
+        for line in lines:
+            if line.endswith("\n"):  # 書き込み途中の行は読まない
+                record = json.loads(line)
+                records[record.get("id")] = record
+        return list(records.values())
+
+    # ==================== 書き込み（呼び出し側でユーザー単位のロックを取る） ====================
+
+    def append(self, record: dict):
+        """記録を観察日のファイルに追記"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with open(self._path(record["date"]), "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def build(self, records: Iterable[dict]):
+        """既存の観察記録から作り直す（移行用）"""
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+        self.directory.mkdir(parents=True)
+
+        by_date: dict[str, list[str]] = {}
+        for record in records:
+            date = self._file_date(record.get("date"))
+            if date:
+                by_date.setdefault(date, []).append(
+                    json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                )
+        for date, lines in by_date.items():
+            with open(self._path(date), "w", encoding="utf-8") as f:
+                f.writelines(lines)
+        (self.directory / BUILT_MARKER).touch()
+
+    def remove_plant(self, plant_id: str, dates: Iterable[str]):
+        """植物の記録を、その観察日のファイルから取り除く"""
+        for date in set(filter(None, map(self._file_date, dates))):
+            path = self._path(date)
+            if not path.exists():
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            kept = [
+                line for line in lines
+                if line.endswith("\n") and json.loads(line).get("plant_id") != plant_id
+            ]
+            if len(kept) == len(lines):
+                continue
+            if not kept:
+                path.unlink()
+                continue
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{path.name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.writelines(kept)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
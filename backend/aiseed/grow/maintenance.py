@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+栽培記録のメンテナンス
+
+使用方法（backend/aiseed で実行）:
+    python -m grow.maintenance rebuild-stats                 # 全ユーザーの統計を再集計
+    python -m grow.maintenance rebuild-stats --user USER_ID  # 指定ユーザーのみ
+    python -m grow.maintenance compact                       # 全植物の観察記録ログを並べ替え
+
+観察記録の追加と同時に実行すると集計がずれることがあるため、
+サーバー停止中に実行する。
+"""
+import argparse
+import os
+import sys
+
+# パスを追加（grow, storageモジュールのため）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grow.service import GrowService
+
+
+def list_users(service: GrowService) -> list[str]:
+    """grow_data 配下のユーザーID一覧"""
+    return sorted(
+        path.name[len("user_"):]
+        for path in service.base_path.glob("user_*")
+        if path.is_dir()
+    )
+
+
+def rebuild_stats(service: GrowService, users: list[str]):
+    """観察記録の全件から stats.json を作り直す"""
+    for user_id in users:
+        plants = service.rebuild_stats(user_id)
+        observations = sum(s["observation_count"] for s in plants.values())
+        print(f"  user={user_id} plants={len(plants)} observations={observations}")
+
+
+def compact(service: GrowService, users: list[str]):
+    """全植物の観察記録ログを日付順に書き直す"""
+    for user_id in users:
+        for plant in service.get_plants(user_id):
+            count = service.compact_observations(user_id, plant.id)
+            print(f"  user={user_id} plant={plant.id} observations={count}")
+
+
+COMMANDS = {
+    "rebuild-stats": rebuild_stats,
+    "compact": compact,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="栽培記録のメンテナンス")
+    parser.add_argument("command", choices=COMMANDS.keys())
+    parser.add_argument("--user", help="対象ユーザーID（省略時は全ユーザー）")
+    parser.add_argument("--base-path", default="grow_data", help="データディレクトリ（既定: grow_data）")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.base_path):
+        print(f"エラー: データディレクトリが見つかりません: {args.base_path}")
+        sys.exit(1)
+
+    service = GrowService(base_path=args.base_path)
+    users = [args.user] if args.user else list_users(service)
+
+    print(f"{args.command}: {len(users)}ユーザー")
+    COMMANDS[args.command](service, users)
+    print("完了")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+観察記録ログ
+
+植物ごとの観察記録を追記専用のJSONLと固定長のインデックスで保持する。
+
+ファイル構成（grow_data/user_{user_id}/）:
+  ├── observations_{plant_id}.idx        # インデックス（ヘッダー + 1件46バイト）
+  └── observations_{plant_id}.g{N}.jsonl # 観察記録（1行1件、追記のみ）
+
+インデックスの各レコードは (date, time, id, offset, length)。
+日付順に並んでいる間は、ページングや日付検索をインデックス上のシークで行う。
+過去日付の記録が追加されて順序が崩れた場合は、コンパクション（並べ替えて
+次の世代 g{N+1} に書き直し、インデックスを置き換え）で元に戻す。
+インデックスの置き換えがコミットなので、途中で落ちても前の世代がそのまま読める。
+"""
+import json
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+INDEX_MAGIC = b"OBIX"
+# magic, 世代, 日付順に並んでいる先頭レコード数, インデックス済みのデータサイズ
+HEADER = struct.Struct("<4sIIQ")
+# date(YYYY-MM-DD), time(HH:MM[:SS]), id, データ内のオフセット, 長さ
+RECORD = struct.Struct("<10s8s16sQI")
+ID_OFFSET = 18  # レコード内のidの位置（バイト列のまま検索する）
+
+# 読み込み中にコンパクションで世代が切り替わった場合の再試行回数
+READ_RETRIES = 3
+# 日付検索で一度に読むインデックスのレコード数
+DATE_SCAN_CHUNK = 32
+
+
+def _pack_record(record: dict, offset: int, length: int) -> bytes:
+    return RECORD.pack(
+        (record.get("date") or "").encode(),
+        (record.get("time") or "").encode(),
+        (record.get("id") or "").encode()[:16],
+        offset,
+        length,
+    )
+
+
+class IndexEntry:
+    """インデックスの1レコード"""
+
+    __slots__ = ("date", "time", "id", "offset", "length")
+
+    def __init__(self, raw: tuple):
+        self.date, self.time, self.id, self.offset, self.length = raw
+
+    @property
+    def key(self) -> tuple[bytes, bytes]:
+        """並び順のキー（date, time）"""
+        return (self.date, self.time)
+
+
+class ObservationLog:
+    """1つの植物の観察記録ログ"""
+
+    def __init__(self, directory: Path, plant_id: str):
+        self.directory = directory
+        self.plant_id = plant_id
+        self.index_path = directory / f"observations_{plant_id}.idx"
+
+    def data_path(self, generation: int) -> Path:
+        return self.directory / f"observations_{self.plant_id}.g{generation}.jsonl"
+
+    def exists(self) -> bool:
+        return self.index_path.exists()
+
+    # ==================== インデックス ====================
+
+    def _read_header(self, f) -> tuple[int, int, int]:
+        """(世代, 日付順の件数, インデックス済みデータサイズ)"""
+        magic, generation, sorted_count, data_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"invalid observation index: {self.index_path}")
+        return generation, sorted_count, data_size
+
+    def _count(self, f) -> int:
+        """インデックスのレコード数（書き込み途中の末尾は数えない）"""
+        size = os.fstat(f.fileno()).st_size
+        return (size - HEADER.size) // RECORD.size
+
+    def _read_entries(self, f, start: int, stop: int) -> list[IndexEntry]:
+        """start〜stop-1番目のレコードを読む"""
+        if stop <= start:
+            return []
+        f.seek(HEADER.size + start * RECORD.size)
+        data = f.read((stop - start) * RECORD.size)
+        return [IndexEntry(raw) for raw in RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size])]
+
+    def _bisect(self, f, count: int, key: tuple[bytes, bytes]) -> int:
+        """日付順に並んだ先頭count件で、key以上の最初の位置（1件ずつシーク）"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._read_entries(f, mid, mid + 1)[0].key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _write_index(self, generation: int, entries: list[bytes], sorted_count: int, data_size: int):
+        """インデックスを一時ファイルに書いてから置き換える（コミット）"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{self.index_path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(INDEX_MAGIC, generation, sorted_count, data_size))
+                f.write(b"".join(entries))
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    # ==================== 読み込み ====================
+
+    def _read_records(self, generation: int, entries: list[IndexEntry]) -> list[dict]:
+        """インデックスのオフセットでデータファイルをシークして読む"""
+        if not entries:
+            return []
+        records = []
+        with open(self.data_path(generation), "rb") as f:
+            for entry in entries:
+                f.seek(entry.offset)
+                records.append(json.loads(f.read(entry.length)))
+        return records
+
+    def _with_retry(self, read):
+        """読み込み中に世代が切り替わって旧データが消えた場合は読み直す"""
+        for attempt in range(READ_RETRIES):
+            try:
+                with open(self.index_path, "rb") as f:
+                    generation, sorted_count, _ = self._read_header(f)
+                    return read(f, generation, sorted_count)
+            except FileNotFoundError:
+                if not self.exists():
+                    return read(None, 0, 0)
+                if attempt == READ_RETRIES - 1:
+                    raise
+
+    def read_all(self) -> list[dict]:
+        """全件（追記順）"""
+        def read(f, generation, sorted_count):
+            if f is None:
+                return []
+            return self._read_records(generation, self._read_entries(f, 0, self._count(f)))
+        return self._with_retry(read)
+
+    def read_newest(self, offset: int = 0, limit: int = 30) -> list[dict]:
+        """新しい順（date, time）にoffset件目からlimit件"""
+        def read(f, generation, sorted_count):
+            if f is None:
+                return []
+            count = self._count(f)
+            if sorted_count >= count:
+                # 日付順に並んでいる: 末尾から必要な分だけ読む
+                stop = max(count - offset, 0)
+                entries = self._read_entries(f, max(stop - limit, 0), stop)
+                entries.reverse()
+            else:
+                # 並び替えが未完了: インデックスだけを並べ替える（データは読まない）
+                entries = self._read_entries(f, 0, count)
+                entries.reverse()
+                entries.sort(key=lambda e: e.key, reverse=True)
+                entries = entries[offset:offset + limit]
+            return self._read_records(generation, entries)
+        return self._with_retry(read)
+
+    def find(self, observation_id: str) -> Optional[dict]:
+        """IDで1件取得（インデックスのバイト列からIDを探してシーク）"""
+        needle = observation_id.encode()[:16].ljust(16, b"\0")
+
+        def read(f, generation, sorted_count):
+            if f is None:
+                return None
+            f.seek(HEADER.size)
+            blob = f.read(self._count(f) * RECORD.size)
+            position = blob.find(needle)
+            while position >= 0:
+                start = position - ID_OFFSET
+                if start % RECORD.size == 0:
+                    entry = IndexEntry(RECORD.unpack_from(blob, start))
+                    record = self._read_records(generation, [entry])[0]
+                    if record.get("id") == observation_id:
+                        return record
+                position = blob.find(needle, position + 1)
+            return None
+        return self._with_retry(read)
+
+    def dates(self) -> list[str]:
+        """全レコードの観察日（インデックスだけを読む）"""
+        def read(f, generation, sorted_count):
+            if f is None:
+                return []
+            return [e.date.rstrip(b"\0").decode() for e in self._read_entries(f, 0, self._count(f))]
+        return self._with_retry(read)
+
+    def read_date(self, date: str) -> list[dict]:
+        """指定日の記録（追記順）"""
+        def read(f, generation, sorted_count):
+            if f is None:
+                return []
+            count = self._count(f)
+            sorted_count = min(sorted_count, count)
+            key = date.encode().ljust(10, b"\0")[:10]
+            position = self._bisect(f, sorted_count, (key, b""))
+            entries = []
+            while position < sorted_count:
+                chunk = self._read_entries(f, position, min(position + DATE_SCAN_CHUNK, sorted_count))
+                matched = [e for e in chunk if e.date == key]
+                entries += matched
+                if len(matched) < len(chunk):
+                    break
+                position += len(chunk)
+            # 日付順に並んでいない末尾は走査
+            entries += [e for e in self._read_entries(f, sorted_count, count) if e.date == key]
+            return self._read_records(generation, entries)
+        return self._with_retry(read)
+
+    # ==================== 書き込み（呼び出し側でファイル単位のロックを取る） ====================
+
+    def append(self, record: dict) -> bool:
+        """
+        1件追記
+
+        Returns:
+            日付順が保たれているか（Falseならコンパクション対象）
+        """
+        if not self.exists():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._write_index(0, [], 0, 0)
+
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+        with open(self.index_path, "r+b") as index:
+            generation, sorted_count, data_size = self._read_header(index)
+            count = self._count(index)
+
+            with open(self.data_path(generation), "ab") as data:
+                offset = data.tell()
+                if offset != data_size:
+                    # 前回の追記がインデックス更新前に中断していた: 末尾を切り詰める
+                    data.truncate(data_size)
+                    offset = data_size
+                data.write(line)
+
+            entry = _pack_record(record, offset, len(line))
+            in_order = sorted_count == count and (
+                count == 0
+                or self._read_entries(index, count - 1, count)[0].key <= IndexEntry(RECORD.unpack(entry)).key
+            )
+
+            index.seek(HEADER.size + count * RECORD.size)
+            index.write(entry)
+            index.truncate()
+            index.seek(0)
+            index.write(HEADER.pack(
+                INDEX_MAGIC, generation, count + 1 if in_order else sorted_count, offset + len(line)
+            ))
+        return in_order
+
+    def needs_compaction(self) -> bool:
+        """日付順に並んでいないレコードがあるか"""
+        if not self.exists():
+            return False
+        with open(self.index_path, "rb") as f:
+            _, sorted_count, _ = self._read_header(f)
+            return sorted_count < self._count(f)
+
+    def rewrite(self, records: list[dict]):
+        """
+        全件を次の世代に書き直す（移行・コンパクション用）
+
+        日付順（同じ日時は元の順）に並べてから書き込む。
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        generation = -1
+        if self.exists():
+            with open(self.index_path, "rb") as f:
+                generation, _, _ = self._read_header(f)
+        new_generation = generation + 1
+
+        ordered = sorted(records, key=lambda r: (r.get("date") or "", r.get("time") or ""))
+        entries = []
+        offset = 0
+        with open(self.data_path(new_generation), "wb") as f:
+            for record in ordered:
+                line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                f.write(line)
+                entries.append(_pack_record(record, offset, len(line)))
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._write_index(new_generation, entries, len(entries), offset)
+        self._remove_generations(keep=new_generation)
+
+    def compact(self) -> int:
+        """並べ替えて書き直す（書き直した件数を返す）"""
+        records = self.read_all()
+        self.rewrite(records)
+        return len(records)
+
+    def delete(self):
+        """インデックスと全世代のデータを削除"""
+        if self.index_path.exists():
+            self.index_path.unlink()
+        self._remove_generations(keep=None)
+
+    def _remove_generations(self, keep: Optional[int]):
+        for path in self._generation_files():
+            if keep is None or path.name != self.data_path(keep).name:
+                path.unlink(missing_ok=True)
+
+    def _generation_files(self) -> Iterator[Path]:
+        return self.directory.glob(f"observations_{self.plant_id}.g*.jsonl")
@@ -3,13 +3,18 @@
 
 植物の観察記録を管理する（AI不使用、ルールベース）
 """
+import asyncio
 import json
 import logging
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from storage import offload, atomic_write_json, ThreadKeyedLocks
+from .observation_log import ObservationLog
+from .day_index import DayIndex
+from .stats import compute_plant_stats, compute_streak, apply_observation, streak_days, normalize_date
 from .models import (
     Plant, Observation, PlantStats,
     FARMING_METHODS, SOIL_TYPES, JAPAN_COMMON_SOIL_TYPES
@@ -25,6 +30,16 @@ class GrowService:
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
 
+        # 旧形式（observations_{plant_id}.json）からの移行は植物ごとに1回だけ行う（キー: (user_id, plant_id)）
+        self._migrate_locks = ThreadKeyedLocks()
+        # 日付順が崩れた植物（コンパクション待ち）と実行中のコンパクション
+        self._unsorted_logs: set[tuple[str, str]] = set()
+        self._compaction_tasks: dict[tuple[str, str], asyncio.Task] = {}
+        # ユーザーごとの stats.json の読み込み→更新→保存を直列化（書き込みと取得時の補完の両方、キー: user_id）
+        self._stats_locks = ThreadKeyedLocks()
+        # 日付別インデックスの初回構築はユーザーごとに1回だけ行う（キー: user_id）
+        self._days_locks = ThreadKeyedLocks()
+
     # ==================== 栽培方法 ====================
 
     def get_farming_methods(self, lang: str = "ja") -> dict:
@@ -143,8 +158,11 @@ class GrowService:
 
         if len(new_plants) < len(plants):
             self._save_plants(user_id, new_plants)
-            # 観察記録も削除
+            # 観察記録・日付別インデックス・統計も削除
+            dates = self._observation_log(user_id, plant_id).dates()
+            self._update_day_index(user_id, lambda index: index.remove_plant(plant_id, dates))
             self._delete_observations(user_id, plant_id)
+            self._update_stats(user_id, lambda stats: stats["plants"].pop(plant_id, None))
             return True
         return False
 
@@ -163,9 +181,7 @@ class GrowService:
         """植物データを保存"""
         user_dir = self.base_path / f"user_{user_id}"
         user_dir.mkdir(parents=True, exist_ok=True)
-        file_path = user_dir / "plants.json"
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(plants, f, ensure_ascii=False, indent=2, default=str)
+        atomic_write_json(user_dir / "plants.json", plants, default=str)
 
     # ==================== 観察記録 ====================
 
@@ -184,9 +200,17 @@ class GrowService:
         harvest_amount: Optional[str] = None,
         photo_urls: list[str] = None
     ) -> Observation:
-        """観察記録を追加"""
+        """
+        観察記録を追加
+
+        Raises:
+            ValueError: date が日付として読めない（何も書き込まない）
+        """
+        # 観察日はログ・日付別インデックス（ファイル名）・統計のすべてで使うため、書き込みの前にそろえる
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
+        else:
+            date = normalize_date(date)
         if time is None:
             time = datetime.now().strftime("%H:%M")
 
@@ -211,9 +235,12 @@ class GrowService:
             created_at=datetime.now()
         )
 
-        observations = self._load_observations(user_id, plant_id)
-        observations.append(observation.model_dump())
-        self._save_observations(user_id, plant_id, observations)
+        record = observation.model_dump()
+        log = self._observation_log(user_id, plant_id)
+        if not log.append(record):
+            self._unsorted_logs.add((user_id, plant_id))
+        self._update_day_index(user_id, lambda index: index.append(record))
+        self._record_observation_stats(user_id, plant_id, log, date, harvested)
 
         logger.info(f"[Grow] Observation added: plant={plant_id} date={date}")
         return observation
@@ -225,17 +252,9 @@ class GrowService:
         limit: int = 30,
         offset: int = 0
     ) -> list[Observation]:
-        """観察記録を取得"""
-        observations = self._load_observations(user_id, plant_id)
-
-        # 新しい順にソート
-        observations = sorted(
-            observations,
-            key=lambda x: (x.get("date", ""), x.get("time", "")),
-            reverse=True
-        )
-
-        return [Observation(**o) for o in observations[offset:offset + limit]]
+        """観察記録を取得（新しい順）"""
+        records = self._observation_log(user_id, plant_id).read_newest(offset=offset, limit=limit)
+        return [Observation(**o) for o in records]
 
     def get_observation(
         self,
@@ -244,50 +263,83 @@ class GrowService:
         observation_id: str
     ) -> Optional[Observation]:
         """特定の観察記録を取得"""
-        observations = self._load_observations(user_id, plant_id)
-        for o in observations:
-            if o.get("id") == observation_id:
-                return Observation(**o)
-        return None
+        record = self._observation_log(user_id, plant_id).find(observation_id)
+        return Observation(**record) if record else None
 
     def get_today_observations(self, user_id: str) -> list[Observation]:
         """今日の観察記録を全植物から取得"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        all_observations = []
-
-        plants = self.get_plants(user_id)
-        for plant in plants:
-            observations = self._load_observations(user_id, plant.id)
-            for o in observations:
-                if o.get("date") == today:
-                    all_observations.append(Observation(**o))
+        return self.get_observations_by_date(user_id, datetime.now().strftime("%Y-%m-%d"))
+
+    def get_observations_by_date(self, user_id: str, date: str) -> list[Observation]:
+        """指定日の観察記録を全植物から取得（その日のファイルだけを読む、date が読めなければ ValueError）"""
+        return [Observation(**o) for o in self._day_index(user_id).read(normalize_date(date))]
+
+    def get_observations_in_range(self, user_id: str, start: str, end: str) -> list[Observation]:
+        """期間内（start〜end、両端を含む）の観察記録を全植物から取得（日付順、start・end が読めなければ ValueError）"""
+        start, end = normalize_date(start), normalize_date(end)
+        return [Observation(**o) for o in self._day_index(user_id).read_range(start, end)]
+
+    def compact_observations(self, user_id: str, plant_id: str) -> int:
+        """観察記録ログを日付順に書き直す（書き直した件数を返す）"""
+        self._unsorted_logs.discard((user_id, plant_id))
+        count = self._observation_log(user_id, plant_id).compact()
+        logger.info(f"[Grow] Observations compacted: plant={plant_id} count={count}")
+        return count
+
+    def _observation_log(self, user_id: str, plant_id: str) -> ObservationLog:
+        """植物の観察記録ログ（旧形式のJSONがあれば移行する）"""
+        user_dir = self.base_path / f"user_{user_id}"
+        log = ObservationLog(user_dir, plant_id)
+        legacy_path = user_dir / f"observations_{plant_id}.json"
+        if not log.exists() and legacy_path.exists():
+            with self._migrate_locks.hold((user_id, plant_id)):
+                if not log.exists() and legacy_path.exists():
+                    try:
+                        with open(legacy_path, "r", encoding="utf-8") as f:
+                            records = json.load(f)
+                    except Exception:
+                        records = []
+                    log.rewrite(records)
+                    legacy_path.unlink()
+                    logger.info(f"[Grow] Observations migrated to log: plant={plant_id} count={len(records)}")
+        return log
+
+    def _day_index(self, user_id: str) -> DayIndex:
+        """ユーザーの日付別インデックス（未構築なら既存の観察記録から作る）"""
+        index = DayIndex(self.base_path / f"user_{user_id}")
+        if not index.is_built():
+            with self._days_locks.hold(user_id):
+                if not index.is_built():
+                    records = []
+                    for plant in self.get_plants(user_id):
+                        records += self._load_observations(user_id, plant.id)
+                    index.build(records)
+                    logger.info(f"[Grow] Day index built: user={user_id} count={len(records)}")
+        return index
+
+    def _update_day_index(self, user_id: str, update):
+        """
+        構築済みの日付別インデックスだけを更新
 
-        return all_observations
+        未構築なら何もしない（最初に読まれたときに、更新後の観察記録から構築される）。
+        書き込みのたびに全観察記録を読んで構築しないため。
+        """
+        index = DayIndex(self.base_path / f"user_{user_id}")
+        with self._days_locks.hold(user_id):
+            if index.is_built():
+                update(index)
 
     def _load_observations(self, user_id: str, plant_id: str) -> list[dict]:
-        """観察記録を読み込み"""
-        file_path = self.base_path / f"user_{user_id}" / f"observations_{plant_id}.json"
-        if not file_path.exists():
-            return []
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return []
+        """観察記録を全件読み込み"""
+        return self._observation_log(user_id, plant_id).read_all()
 
     def _save_observations(self, user_id: str, plant_id: str, observations: list[dict]):
-        """観察記録を保存"""
-        user_dir = self.base_path / f"user_{user_id}"
-        user_dir.mkdir(parents=True, exist_ok=True)
-        file_path = user_dir / f"observations_{plant_id}.json"
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(observations, f, ensure_ascii=False, indent=2, default=str)
+        """観察記録を全件書き直す（日付順に並べ替える）"""
+        self._observation_log(user_id, plant_id).rewrite(observations)
 
     def _delete_observations(self, user_id: str, plant_id: str):
         """観察記録を削除"""
-        file_path = self.base_path / f"user_{user_id}" / f"observations_{plant_id}.json"
-        if file_path.exists():
-            file_path.unlink()
+        self._observation_log(user_id, plant_id).delete()
 
     # ==================== 気づき抽出（ルールベース） ====================
 
@@ -353,9 +405,9 @@ class GrowService:
     # ==================== 統計 ====================
 
     def get_plant_stats(self, user_id: str, plant_id: str) -> PlantStats:
-        """植物の統計を取得"""
+        """植物の統計を取得（集計済みの値を読む）"""
         plant = self.get_plant(user_id, plant_id)
-        observations = self._load_observations(user_id, plant_id)
+        stats = self._plant_stats(user_id, plant_id)
 
         # 日数計算
         days_since_start = 0
@@ -365,60 +417,98 @@ class GrowService:
                 start = datetime.fromisoformat(start)
             days_since_start = (datetime.now() - start).days
 
-        # 最後の観察
-        last_observation = None
-        if observations:
-            sorted_obs = sorted(observations, key=lambda x: x.get("date", ""), reverse=True)
-            last_observation = sorted_obs[0].get("date")
-
-        # 収穫回数
-        total_harvests = sum(1 for o in observations if o.get("harvested"))
-
-        # 連続観察日数
-        streak_days = self._calculate_streak(observations)
-
         return PlantStats(
             plant_id=plant_id,
-            observation_count=len(observations),
+            observation_count=stats["observation_count"],
             days_since_start=days_since_start,
-            last_observation=last_observation,
-            total_harvests=total_harvests,
-            streak_days=streak_days
+            last_observation=stats["last_observation"],
+            total_harvests=stats["total_harvests"],
+            streak_days=streak_days(stats, datetime.now().strftime("%Y-%m-%d"))
         )
 
-    def _calculate_streak(self, observations: list[dict]) -> int:
-        """連続観察日数を計算"""
-        if not observations:
-            return 0
-
-        dates = set(o.get("date") for o in observations if o.get("date"))
-        if not dates:
-            return 0
+    def rebuild_stats(self, user_id: str) -> dict:
+        """観察記録の全件から統計を作り直す（メンテナンス用）"""
+        plants = {
+            plant.id: compute_plant_stats(self._load_observations(user_id, plant.id))
+            for plant in self.get_plants(user_id)
+        }
+        with self._stats_locks.hold(user_id):
+            self._save_stats(user_id, {"plants": plants})
+        logger.info(f"[Grow] Stats rebuilt: user={user_id} plants={len(plants)}")
+        return plants
 
-        today = datetime.now().date()
-        streak = 0
+    def _stats_path(self, user_id: str) -> Path:
+        return self.base_path / f"user_{user_id}" / "stats.json"
 
-        current = today
-        while current.isoformat() in dates:
-            streak += 1
-            current -= timedelta(days=1)
+    def _load_stats(self, user_id: str) -> dict:
+        """統計を読み込み"""
+        file_path = self._stats_path(user_id)
+        if not file_path.exists():
+            return {"plants": {}}
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {"plants": {}}
 
-        return streak
+    def _save_stats(self, user_id: str, stats: dict):
+        """統計を保存"""
+        user_dir = self.base_path / f"user_{user_id}"
+        user_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(user_dir / "stats.json", stats)
+
+    def _update_stats(self, user_id: str, update):
+        """統計を読み込み→更新→保存"""
+        with self._stats_locks.hold(user_id):
+            stats = self._load_stats(user_id)
+            update(stats)
+            self._save_stats(user_id, stats)
+
+    def _plant_stats(self, user_id: str, plant_id: str, all_stats: Optional[dict] = None) -> dict:
+        """植物の集計値（未集計なら観察記録から作って保存）"""
+        all_stats = all_stats if all_stats is not None else self._load_stats(user_id)
+        stats = all_stats["plants"].get(plant_id)
+        if stats is None:
+            stats = compute_plant_stats(self._load_observations(user_id, plant_id))
+            self._update_stats(user_id, lambda s: s["plants"].setdefault(plant_id, stats))
+        return stats
+
+    def _record_observation_stats(
+        self,
+        user_id: str,
+        plant_id: str,
+        log: ObservationLog,
+        date: str,
+        harvested: bool
+    ):
+        """観察1件分を統計に反映"""
+        def update(all_stats: dict):
+            stats = all_stats["plants"].get(plant_id)
+            if stats is None:
+                # 未集計（移行前のデータ）: 追記済みの全件から作る
+                all_stats["plants"][plant_id] = compute_plant_stats(log.read_all())
+                return
+            if apply_observation(stats, date, harvested):
+                # 過去日付の追加で前の連続と繋がる場合は観察日から数え直す
+                stats["streak_end"], stats["streak_len"] = compute_streak(log.dates())
+
+        self._update_stats(user_id, update)
 
     # ==================== ユーザー統計 ====================
 
     def get_user_stats(self, user_id: str) -> dict:
-        """ユーザーの全体統計"""
+        """ユーザーの全体統計（集計済みの値を合計）"""
         plants = self.get_plants(user_id)
+        all_stats = self._load_stats(user_id)
 
         total_observations = 0
         total_harvests = 0
         active_plants = 0
 
         for plant in plants:
-            observations = self._load_observations(user_id, plant.id)
-            total_observations += len(observations)
-            total_harvests += sum(1 for o in observations if o.get("harvested"))
+            stats = self._plant_stats(user_id, plant.id, all_stats)
+            total_observations += stats["observation_count"]
+            total_harvests += stats["total_harvests"]
             if plant.status == "growing":
                 active_plants += 1
 
@@ -556,3 +646,45 @@ class GrowService:
   </div>
 </body>
 </html>'''
+
+    # ==================== 非同期API ====================
+    # ファイルI/Oをイベントループ外（I/O用スレッドプール）で実行する
+    # 書き込みはファイル単位のロック（lock=）で直列化する
+
+    create_plant_async = offload(create_plant, lock=("grow.plants", "user_id"))
+    get_plant_async = offload(get_plant)
+    get_plants_async = offload(get_plants)
+    update_plant_async = offload(update_plant, lock=("grow.plants", "user_id"))
+    delete_plant_async = offload(delete_plant, lock=[
+        ("grow.plants", "user_id"), ("grow.observations", "user_id", "plant_id"), ("grow.days", "user_id")
+    ])
+    _add_observation_async = offload(
+        add_observation, lock=[("grow.observations", "user_id", "plant_id"), ("grow.days", "user_id")]
+    )
+    compact_observations_async = offload(
+        compact_observations, lock=("grow.observations", "user_id", "plant_id")
+    )
+    get_observations_async = offload(get_observations)
+    get_observation_async = offload(get_observation)
+    get_today_observations_async = offload(get_today_observations)
+    get_observations_by_date_async = offload(get_observations_by_date)
+    get_observations_in_range_async = offload(get_observations_in_range)
+    get_plant_stats_async = offload(get_plant_stats)
+    get_user_stats_async = offload(get_user_stats)
+    rebuild_stats_async = offload(rebuild_stats)
+    generate_plant_page_async = offload(generate_plant_page)
+
+    async def add_observation_async(self, plant_id: str, user_id: str, *args, **kwargs) -> Observation:
+        """観察記録を追加（日付順が崩れたらバックグラウンドでコンパクション）"""
+        observation = await self._add_observation_async(plant_id, user_id, *args, **kwargs)
+        key = (user_id, plant_id)
+        if key in self._unsorted_logs and key not in self._compaction_tasks:
+            task = asyncio.create_task(self.compact_observations_async(user_id, plant_id))
+            self._compaction_tasks[key] = task
+            task.add_done_callback(lambda t: self._compaction_done(key, t))
+        return observation
+
+    def _compaction_done(self, key: tuple[str, str], task: asyncio.Task):
+        self._compaction_tasks.pop(key, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"[Grow] Compaction failed: plant={key[1]} error={task.exception()}")
@@ -0,0 +1,126 @@
+"""
+栽培統計の集計
+
+植物ごとの集計値を grow_data/user_{user_id}/stats.json に保持し、
+観察記録の追加時に差分で更新する（統計の取得時に観察記録を読み込まない）。
+
+stats.json:
+{
+  "plants": {
+    "{plant_id}": {
+      "observation_count": 120,
+      "last_observation": "2026-06-01",
+      "total_harvests": 4,
+      "streak_end": "2026-06-01",   # 最新の連続観察の最終日
+      "streak_len": 12              # その連続日数
+    }
+  }
+}
+"""
+import re
+from datetime import date as Date, timedelta
+from typing import Iterable, Optional
+
+# 観察日の形式（stats.json・日付別インデックスのファイル名）
+ISO_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+_DATE_INPUT_PATTERN = re.compile(r"(\d{4})[-/](\d{1,2})[-/](\d{1,2})")
+
+
+def is_iso_date(value) -> bool:
+    """YYYY-MM-DD の実在する日付か"""
+    if not isinstance(value, str) or not ISO_DATE_PATTERN.fullmatch(value):
+        return False
+    try:
+        Date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def normalize_date(value: str) -> str:
+    """
+    観察日を YYYY-MM-DD にそろえる（「2026/6/2」も可）
+
+    Raises:
+        ValueError: 日付として読めない・実在しない
+    """
+    match = _DATE_INPUT_PATTERN.fullmatch(value.strip()) if isinstance(value, str) else None
+    if not match:
+        raise ValueError(f"日付は YYYY-MM-DD で指定してください: {value!r}")
+    try:
+        return Date(*map(int, match.groups())).isoformat()
+    except ValueError:
+        raise ValueError(f"存在しない日付です: {value!r}") from None
+
+
+def empty_plant_stats() -> dict:
+    return {
+        "observation_count": 0,
+        "last_observation": None,
+        "total_harvests": 0,
+        "streak_end": None,
+        "streak_len": 0,
+    }
+
+
+def compute_streak(dates: Iterable[str]) -> tuple[Optional[str], int]:
+    """観察日の集合から、最新日で終わる連続日数を求める（YYYY-MM-DD でない日付は数えない）"""
+    days = set(d for d in dates if is_iso_date(d))
+    if not days:
+        return None, 0
+    end = max(days)
+    current = Date.fromisoformat(end)
+    length = 0
+    while current.isoformat() in days:
+        length += 1
+        current -= timedelta(days=1)
+    return end, length
+
+
+def compute_plant_stats(records: list[dict]) -> dict:
+    """観察記録の全件から集計する（移行・再構築用）"""
+    stats = empty_plant_stats()
+    dates = [r.get("date") for r in records if is_iso_date(r.get("date"))]
+    stats["observation_count"] = len(records)
+    stats["last_observation"] = max(dates) if dates else None
+    stats["total_harvests"] = sum(1 for r in records if r.get("harvested"))
+    stats["streak_end"], stats["streak_len"] = compute_streak(dates)
+    return stats
+
+
+def apply_observation(stats: dict, date: str, harvested: bool) -> bool:
+    """
+    観察1件を集計に反映
+
+    Returns:
+        連続日数を観察日から再計算する必要があるか
+        （最新日より前の日付が追加され、過去の連続と繋がる可能性がある場合）
+    """
+    stats["observation_count"] += 1
+    if harvested:
+        stats["total_harvests"] += 1
+    if not stats["last_observation"] or date > stats["last_observation"]:
+        stats["last_observation"] = date
+
+    end = stats["streak_end"]
+    if end is None:
+        stats["streak_end"], stats["streak_len"] = date, 1
+        return False
+    if date == end:
+        return False
+    if date > end:
+        if Date.fromisoformat(date) - Date.fromisoformat(end) == timedelta(days=1):
+            stats["streak_len"] += 1
+        else:
+            stats["streak_len"] = 1
+        stats["streak_end"] = date
+        return False
+
+    # 連続の開始日の前日なら、さらに前の連続と繋がるかもしれない
+    start = Date.fromisoformat(end) - timedelta(days=stats["streak_len"] - 1)
+    return Date.fromisoformat(date) == start - timedelta(days=1)
+
+
+def streak_days(stats: dict, today: str) -> int:
+    """今日まで続いている連続観察日数（今日の観察がなければ0）"""
+    return stats["streak_len"] if stats["streak_end"] == today else 0
@@ -9,9 +9,12 @@ Dual-licensed with a Commercial License. See LICENSE for details.
 import os
 import sys
 import logging
+import json
 import asyncpg
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 from typing import Optional
@@ -23,15 +26,21 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from agent.core import AIseedAgent
 from agent.prompts import get_prompt, PROMPTS, SERVICES, get_service_info
 from agent.tools.experience import SparkExperience, TaskResult, TASKS, TASK_ORDER
+from agent.tools.sessions import create_session_store
+from agent.tools.archive import ExperienceArchive
+from agent.response_cache import ResponseCache
+from agent.singleflight import SingleFlight
+from agent.scheduler import ModelQueueFull
 from memory.store import UserMemory
-from config import get_model_id, get_model_info, setup_logging, get_logger, SERVER, MEMORY
-from shipment import ShipmentService
+from config import get_model_id, get_model_info, setup_logging, get_logger, SERVER, MEMORY, SPARK_SESSIONS, EXPERIENCE_ARCHIVE, AI_CACHE, NOTIFICATIONS, SHIPMENT_PARSER, IO
+from storage import configure_io_pool, shutdown_io_pool, run_io, file_locks
+from shipment import ShipmentService, NotificationOutbox, OutboxWorker, create_notifier
 from shipment.models import (
     ShipmentInfo, ShipmentItem, Subscriber,
-    ShipmentPostRequest, ShipmentPostStructuredRequest,
+    ShipmentPostRequest, ShipmentPostStructuredRequest, ShipmentBatchPostRequest,
     SubscribeRequest, NotificationResult
 )
-from shipment.parser import ShipmentParser, parse_with_ai
+from shipment.parser import parse_with_ai, parse_many_async, shutdown_parse_pool, cascade_stats
 from community import CommunityService
 from community.models import (
     Favorite, CheckIn, NotificationSettings,
@@ -44,6 +53,7 @@ from grow.models import (
     GrowthAnalysisRequest, ProblemDiagnosisRequest, HarvestPredictionRequest
 )
 from grow.climate_models import ClimateData, ClimateSimpleResponse, ClimateRequest
+from grow.stats import normalize_date
 
 # ==================== 設定 ====================
 class Settings(BaseSettings):
@@ -56,6 +66,11 @@ class Settings(BaseSettings):
 
     # Memory（settings.pyからデフォルト値）
     memory_base_path: str = MEMORY["base_path"]
+    memory_backend: str = MEMORY["backend"]
+
+    # 通知（秘匿情報は.envから）
+    smtp_username: str = ""
+    smtp_password: str = ""
 
     class Config:
         env_file = ".env"
@@ -72,10 +87,13 @@ db_pool: Optional[asyncpg.Pool] = None
 agent: Optional[AIseedAgent] = None
 spark_experience: Optional[SparkExperience] = None
 shipment_service: Optional[ShipmentService] = None
+outbox_worker: Optional[OutboxWorker] = None
 community_service: Optional[CommunityService] = None
 grow_service: Optional[GrowService] = None
 grow_ai_service: Optional[GrowAIService] = None  # BYOA対応AI分析
 climate_service: Optional[ClimateService] = None  # ERA5気候データ
+response_cache: Optional[ResponseCache] = None  # AI応答のキャッシュ
+ai_flights = SingleFlight()  # 同じ内容の同時AI問い合わせをまとめる
 
 # ==================== データベース ====================
 async def init_db():
@@ -106,20 +124,52 @@ async def close_db():
 async def lifespan(app: FastAPI):
     """アプリケーションライフサイクル管理"""
     global agent, spark_experience, shipment_service, community_service, grow_service, grow_ai_service, climate_service
+    global response_cache, outbox_worker
 
     await init_db()
 
+    # ファイルI/O用スレッドプール
+    configure_io_pool(IO["max_workers"])
+
     # エージェントの初期化
-    agent = AIseedAgent(memory_base_path=settings.memory_base_path)
-    logger.info(f"AIseed Agent 初期化完了 (memory: {settings.memory_base_path})")
+    agent = AIseedAgent(
+        memory_base_path=settings.memory_base_path,
+        memory_backend=settings.memory_backend
+    )
+    logger.info(f"AIseed Agent 初期化完了 (memory: {settings.memory_base_path}, backend: {settings.memory_backend})")
 
     # 体験タスクの初期化
-    spark_experience = SparkExperience(memory=agent.memory)
-    logger.info("Spark Experience 初期化完了")
+    sessions = create_session_store(
+        SPARK_SESSIONS["backend"],
+        path=SPARK_SESSIONS["path"],
+        ttl_sec=SPARK_SESSIONS["ttl_sec"],
+        idle_sec=SPARK_SESSIONS["idle_sec"],
+        max_sessions=SPARK_SESSIONS["max_sessions"],
+    )
+    archive = ExperienceArchive(EXPERIENCE_ARCHIVE["path"]) if EXPERIENCE_ARCHIVE["enabled"] else None
+    spark_experience = SparkExperience(memory=agent.memory, sessions=sessions, archive=archive)
+    logger.info(f"Spark Experience 初期化完了 (sessions: {SPARK_SESSIONS['backend']})")
 
     # 出荷情報サービスの初期化
-    shipment_service = ShipmentService(base_path="shipment_data")
-    logger.info("Shipment Service 初期化完了")
+    notifier = create_notifier(NOTIFICATIONS, settings.smtp_username, settings.smtp_password)
+    outbox_config = NOTIFICATIONS["outbox"]
+    outbox = NotificationOutbox(outbox_config["path"]) if outbox_config["enabled"] else None
+    shipment_service = ShipmentService(base_path="shipment_data", notifier=notifier, outbox=outbox)
+    if outbox and outbox_config["worker"]:
+        outbox_worker = OutboxWorker(
+            outbox,
+            notifier,
+            batch_size=outbox_config["batch_size"],
+            lease_sec=outbox_config["lease_sec"],
+            poll_interval_sec=outbox_config["poll_interval_sec"],
+            retention_sec=outbox_config["retention_sec"],
+        )
+        outbox_worker.start()
+    logger.info(
+        f"Shipment Service 初期化完了 (email: {NOTIFICATIONS['email']['provider']}, "
+        f"push: {NOTIFICATIONS['push']['provider']}, "
+        f"outbox: {'worker' if outbox_worker else 'external' if outbox else 'off'})"
+    )
 
     # コミュニティサービスの初期化
     community_service = CommunityService(base_path="community_data")
@@ -129,6 +179,16 @@ async def lifespan(app: FastAPI):
     grow_service = GrowService(base_path="grow_data")
     logger.info("Grow Service 初期化完了")
 
+    # AI応答のキャッシュ（AI_CACHE["tasks"] の処理名だけ）
+    response_cache = ResponseCache(
+        AI_CACHE["tasks"] if AI_CACHE["enabled"] else {},
+        path=AI_CACHE["path"],
+        max_entries=AI_CACHE["max_entries"],
+        max_bytes=AI_CACHE["max_bytes"],
+        disk_max_entries=AI_CACHE["disk_max_entries"],
+    )
+    logger.info(f"AI Response Cache 初期化完了 (tasks: {', '.join(response_cache.tasks) or 'なし'})")
+
     # 栽培AI分析サービスの初期化（BYOA: 開発版ではagent.chatを使用）
     async def ai_query_wrapper(prompt: str) -> str:
         return await agent.chat(
@@ -137,7 +197,10 @@ async def lifespan(app: FastAPI):
             user_id="system",
             task_name="grow_analysis"
         )
-    grow_ai_service = GrowAIService(ai_query=ai_query_wrapper)
+    # 同時の同じ問い合わせは1回にまとめ（外側）、その中でキャッシュを確認する
+    grow_ai_service = GrowAIService(
+        ai_query=ai_flights.wrap("grow_analysis", response_cache.wrap("grow_analysis", ai_query_wrapper))
+    )
     logger.info("Grow AI Service 初期化完了 (BYOA対応)")
 
     # 気候データサービスの初期化
@@ -146,7 +209,12 @@ async def lifespan(app: FastAPI):
 
     logger.info("AIseed API Server 起動")
     yield
+    if outbox_worker:
+        await outbox_worker.stop()
+    await shipment_service.notifier.close()
     await close_db()
+    shutdown_io_pool()
+    shutdown_parse_pool()
     logger.info("AIseed API Server 停止")
 
 # ==================== FastAPI ====================
@@ -157,6 +225,16 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+
+@app.exception_handler(ModelQueueFull)
+async def model_queue_full_handler(request: Request, exc: ModelQueueFull):
+    """モデル呼び出しの待ち行列が満杯 → 429（Retry-After付き）"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "混み合っています。しばらくしてから再度お試しください。", "task_type": exc.task_type},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # ==================== モデル ====================
 class ConversationRequest(BaseModel):
     user_message: str
@@ -164,6 +242,7 @@ class ConversationRequest(BaseModel):
     session_id: Optional[str] = None
     user_id: Optional[str] = None  # 追加: ユーザーID
     user_context: Optional[dict] = None
+    stream: bool = False  # True: text/event-stream で差分を返す
 
 class ConversationResponse(BaseModel):
     ai_message: str
@@ -227,6 +306,11 @@ async def handle_conversation(service: str, request: ConversationRequest) -> Con
     # ユーザーIDの決定（未指定の場合はセッションIDを使用）
     user_id = request.user_id or request.session_id or "anonymous"
 
+    if request.stream:
+        # ヘッダーを送った後は429を返せないため、受け付けられるかを先に確認
+        agent.scheduler.check(f"{service}_conversation")
+        return stream_conversation(service, request, user_id)
+
     try:
         # [AI-CALL] エージェントで会話を処理
         response_text = await agent.chat(
@@ -248,10 +332,69 @@ async def handle_conversation(service: str, request: ConversationRequest) -> Con
             timestamp=datetime.now().isoformat(),
             user_id=user_id
         )
+    except ModelQueueFull:
+        raise
     except Exception as e:
         logger.error(f"AI処理エラー: {e}")
         raise HTTPException(status_code=500, detail=f"AI処理エラー: {str(e)}")
 
+def sse_event(event: str, data: dict) -> str:
+    """Server-Sent Events の1イベント"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_conversation(service: str, request: ConversationRequest, user_id: str) -> StreamingResponse:
+    """
+    会話処理（差分をSSEで返す）
+
+    イベント:
+        delta: {"text": 断片}
+        done:  ConversationResponse と同じ内容（ai_message は全文）
+        error: {"detail": エラー内容}（ヘッダー送信後のため、ステータスは200のまま）
+
+    会話履歴のDB保存は、最後まで送り終えた後に行う（途中で失敗・切断した会話は保存しない）。
+    """
+    completed = {}
+
+    async def events():
+        response_text = ""
+        try:
+            # [AI-CALL] エージェントで会話を処理（差分ごと）
+            async for delta in agent.chat_stream(
+                service=service,
+                user_message=request.user_message,
+                user_id=user_id,
+                session_id=request.session_id,
+                conversation_history=request.conversation_history
+            ):
+                response_text += delta
+                yield sse_event("delta", {"text": delta})
+        except Exception as e:
+            logger.error(f"AI処理エラー: {e}")
+            yield sse_event("error", {"detail": f"AI処理エラー: {str(e)}"})
+            return
+
+        completed["ai_message"] = response_text.strip()
+        yield sse_event("done", ConversationResponse(
+            ai_message=completed["ai_message"],
+            service=service,
+            timestamp=datetime.now().isoformat(),
+            user_id=user_id
+        ).model_dump())
+
+    async def persist():
+        # 会話履歴をDBに保存
+        if request.session_id and "ai_message" in completed:
+            await save_conversation(request.session_id, service, "user", request.user_message, user_id)
+            await save_conversation(request.session_id, service, "assistant", completed["ai_message"], user_id)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(persist)
+    )
+
 # ==================== エンドポイント ====================
 # 注意: 認証・レート制限はGoのgatewayで処理
 # このAPIはgateway経由でのみアクセスされる想定
@@ -286,6 +429,19 @@ async def health_check():
         "status": "healthy",
         "database": db_status,
         "agent": agent_status,
+        "memory_cache": agent.memory.cache_stats() if agent else None,
+        "spark_sessions": await run_io(spark_experience.sessions.stats) if spark_experience else None,
+        "tools": agent.tools.stats() if agent else None,
+        "prompts": agent.prompts.stats() if agent else None,
+        "ai_cache": await run_io(response_cache.stats) if response_cache else None,
+        "ai_coalescing": ai_flights.stats(),
+        "model_scheduler": agent.scheduler.stats() if agent else None,
+        "notifications": shipment_service.notifier.stats() if shipment_service else None,
+        "shipment_parser": cascade_stats.stats(),
+        "notification_outbox": {
+            **await run_io(shipment_service.outbox.depth),
+            "worker": outbox_worker.stats() if outbox_worker else None,
+        } if shipment_service and shipment_service.outbox else None,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -327,7 +483,8 @@ async def start_spark_experience(request: ExperienceStartRequest):
 
     logger.info(f"[Spark/Experience] START user={request.user_id} session={session_id}")
 
-    result = spark_experience.start_session(
+    result = await run_io(
+        spark_experience.start_session,
         user_id=request.user_id,
         session_id=session_id
     )
@@ -378,7 +535,9 @@ async def submit_experience_result(request: ExperienceResultRequest):
         hesitation_count=request.hesitation_count,
     )
 
-    return spark_experience.submit_result(result)
+    # 最終タスクではメモリ（プロファイル・履歴）に書き込むため、ユーザー単位でロック
+    async with file_locks.hold(("memory.profile", request.user_id), ("memory.history", request.user_id)):
+        return await run_io(spark_experience.submit_result, result)
 
 @app.post("/internal/grow/conversation", response_model=ConversationResponse)
 async def grow_conversation(request: ConversationRequest):
@@ -405,7 +564,7 @@ async def get_user_profile(user_id: str):
     global agent
 
     try:
-        summary = agent.memory.get_user_summary(user_id)
+        summary = await agent.memory.get_user_summary_async(user_id)
         return UserProfileResponse(
             user_id=user_id,
             age_group=summary.get("age_group"),
@@ -426,10 +585,12 @@ async def generate_skill(request: SkillGenerateRequest):
     global agent
 
     try:
-        result = agent.skill_tools._handle_generate_skill(
-            user_id=request.user_id,
-            skill_type=request.skill_type
-        )
+        async with file_locks.hold(("memory.skills", request.user_id)):
+            result = await run_io(
+                agent.skill_tools._handle_generate_skill,
+                user_id=request.user_id,
+                skill_type=request.skill_type
+            )
 
         if result.get("status") == "insufficient_data":
             return SkillResponse(
@@ -453,7 +614,8 @@ async def get_skill(user_id: str, skill_type: str):
     global agent
 
     try:
-        result = agent.skill_tools._handle_get_skill(
+        result = await run_io(
+            agent.skill_tools._handle_get_skill,
             user_id=user_id,
             skill_type=skill_type
         )
@@ -501,11 +663,12 @@ JSON形式で出力:
         options = ClaudeAgentOptions(model=model_id)
 
         response_text = ""
-        async for message in query(prompt=prompt, options=options):
-            if hasattr(message, 'content'):
-                for block in message.content:
-                    if hasattr(block, 'text'):
-                        response_text += block.text
+        async with agent.scheduler.slot("analyze_strengths"):
+            async for message in query(prompt=prompt, options=options):
+                if hasattr(message, 'content'):
+                    for block in message.content:
+                        if hasattr(block, 'text'):
+                            response_text += block.text
 
         import json
         import re
@@ -516,6 +679,8 @@ JSON形式で出力:
             return StrengthAnalysis(**result)
 
         return StrengthAnalysis(abilities=[], personality=[])
+    except ModelQueueFull:
+        raise
     except Exception as e:
         logger.error(f"分析エラー: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -542,12 +707,28 @@ async def analyze_conversation(
             conversation_history=conversation_history
         )
         return result
+    except ModelQueueFull:
+        raise
     except Exception as e:
         logger.error(f"会話分析エラー: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ==================== 出荷情報 ====================
-# [AI-USAGE: MEDIUM] ルールベースで解析失敗時のみAIを使用
+
+async def post_and_notify(shipment: ShipmentInfo) -> tuple[ShipmentInfo, int]:
+    """出荷情報を保存し、購読者への通知を送信待ちにする（保存した出荷情報, 通知の件数）"""
+    if shipment_service.outbox is None:
+        saved = await shipment_service.post_shipment_async(shipment)
+        return saved, await shipment_service.enqueue_notifications(saved.farmer_id, saved)
+
+    # 保存と送信待ちへの書き込みは同じ処理の中で行う
+    saved, queued = await shipment_service.post_shipment_and_enqueue_async(shipment)
+    if outbox_worker and queued:
+        outbox_worker.wake()
+    return saved, queued
+
+
+# [AI-USAGE: MEDIUM] ルールベースの確信度が低いときのみAIを使用
 # 公開版では 構造化入力のみ に限定してください
 # 詳細: docs/FORKING.md
 @app.post("/internal/shipment/post")
@@ -561,23 +742,21 @@ async def post_shipment_natural(request: ShipmentPostRequest):
 
     logger.info(f"[Shipment] POST natural: farmer={request.farmer_id} msg={request.message[:50]}...")
 
-    # パーサーで解析（ルールベース - AI不使用）
-    parser = ShipmentParser()
-    shipment = parser.parse(request.farmer_id, request.message)
-
-    if not shipment:
-        # [AI-CALL] ルールベースで失敗した場合のみAIで再解析
-        # 公開版ではこのブロックを削除し、エラーを返す
-        async def ai_query(prompt):
-            response = await agent.chat(
-                service="create",
-                user_message=prompt,
-                user_id=request.farmer_id,
-                task_name="parse_shipment"
-            )
-            return response
+    # [AI-CALL] ルールベースで解析し、確信度が SHIPMENT_PARSER["ai_confidence_threshold"] 未満のときだけAIで再解析
+    # 公開版では ShipmentParser().parse のみを使い、解析できなければエラーを返す
+    async def ai_query(prompt):
+        response = await agent.chat(
+            service="create",
+            user_message=prompt,
+            user_id=request.farmer_id,
+            task_name="parse_shipment"
+        )
+        return response
 
-        shipment = await parse_with_ai(request.farmer_id, request.message, ai_query)
+    shipment = await parse_with_ai(
+        request.farmer_id, request.message,
+        ai_flights.wrap("parse_shipment", response_cache.wrap("parse_shipment", ai_query))
+    )
 
     if not shipment:
         raise HTTPException(
@@ -585,16 +764,13 @@ async def post_shipment_natural(request: ShipmentPostRequest):
             detail="出荷情報を解析できませんでした。もう少し具体的に入力してください。"
         )
 
-    # 保存
-    saved = shipment_service.post_shipment(shipment)
-
-    # 購読者に通知
-    notify_result = await shipment_service.notify_subscribers(request.farmer_id, saved)
+    # 保存し、購読者への通知を送信待ちにする（送信の完了は待たない）
+    saved, queued = await post_and_notify(shipment)
 
     return {
         "status": "posted",
         "shipment": saved.model_dump(),
-        "notification": notify_result.model_dump()
+        "notification": {"status": "queued", "queued": queued}
     }
 
 
@@ -615,22 +791,87 @@ async def post_shipment_structured(request: ShipmentPostStructuredRequest):
         note=request.note,
     )
 
-    saved = shipment_service.post_shipment(shipment)
-    notify_result = await shipment_service.notify_subscribers(request.farmer_id, saved)
+    saved, queued = await post_and_notify(shipment)
 
     return {
         "status": "posted",
         "shipment": saved.model_dump(),
-        "notification": notify_result.model_dump()
+        "notification": {"status": "queued", "queued": queued}
     }
 
 
+# [AI-USAGE: MEDIUM] ルールベースの確信度が低いものだけを、まとめてAIで解析
+# 公開版では ai_query_func=None（ルールベースのみ）にしてください
+@app.post("/internal/shipment/post/batch")
+async def post_shipment_batch(request: ShipmentBatchPostRequest):
+    """
+    出荷情報を自然言語で一括投稿（直売所・農協が1日分のメッセージをまとめて送る）
+
+    結果は解析・保存できたものから順に NDJSON（1行1件）で返す:
+        {"index": 添字, "status": "posted", "shipment": {...}, "notification": {...}}
+        {"index": 添字, "status": "error", "detail": エラー内容}
+    最後の行: {"status": "done", "posted": 件数, "failed": 件数}
+    """
+    global shipment_service, agent
+
+    max_messages = SHIPMENT_PARSER["max_batch_messages"]
+    if len(request.messages) > max_messages:
+        raise HTTPException(
+            status_code=413,
+            detail=f"一度に投稿できるメッセージは{max_messages}件までです。"
+        )
+
+    logger.info(f"[Shipment] POST batch: {len(request.messages)} messages")
+    messages = [(m.farmer_id, m.message) for m in request.messages]
+
+    # [AI-CALL] ルールベースの確信度が低いものを ai_batch_size 件ずつ1回の呼び出しで解析
+    # プロンプトの利用者情報は先頭のメッセージの農家のもの（解析の指示には使わない）
+    async def ai_query(prompt):
+        return await agent.chat(
+            service="create",
+            user_message=prompt,
+            user_id=messages[0][0],
+            task_name="parse_shipment_batch"
+        )
+
+    async def results():
+        posted = failed = 0
+        async for index, shipment in parse_many_async(messages, ai_query if agent else None):
+            if shipment is None:
+                failed += 1
+                line = {"index": index, "status": "error", "detail": "出荷情報を解析できませんでした。"}
+            else:
+                try:
+                    saved, queued = await post_and_notify(shipment)
+                    posted += 1
+                    line = {
+                        "index": index,
+                        "status": "posted",
+                        "shipment": saved.model_dump(mode="json"),
+                        "notification": {"status": "queued", "queued": queued},
+                    }
+                except Exception as e:
+                    logger.error(f"[Shipment] batch post error: index={index} {e}")
+                    failed += 1
+                    line = {"index": index, "status": "error", "detail": f"保存エラー: {str(e)}"}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+        logger.info(f"[Shipment] POST batch done: posted={posted} failed={failed}")
+        yield json.dumps({"status": "done", "posted": posted, "failed": failed}) + "\n"
+
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/internal/shipment/{farmer_id}/latest")
 async def get_latest_shipment(farmer_id: str):
     """最新の出荷情報を取得"""
     global shipment_service
 
-    shipment = shipment_service.get_latest_shipment(farmer_id)
+    shipment = await shipment_service.get_latest_shipment_async(farmer_id)
     if not shipment:
         return {"status": "not_found", "shipment": None}
 
@@ -642,7 +883,7 @@ async def get_today_shipments(farmer_id: str):
     """今日の出荷情報を取得"""
     global shipment_service
 
-    shipments = shipment_service.get_today_shipments(farmer_id)
+    shipments = await shipment_service.get_today_shipments_async(farmer_id)
     return {
         "status": "ok",
         "date": datetime.now().strftime("%Y-%m-%d"),
@@ -655,7 +896,7 @@ async def get_shipment_history(farmer_id: str, limit: int = 10, offset: int = 0)
     """出荷情報の履歴を取得"""
     global shipment_service
 
-    shipments = shipment_service.get_shipments(farmer_id, limit=limit, offset=offset)
+    shipments = await shipment_service.get_shipments_async(farmer_id, limit=limit, offset=offset)
     return {
         "status": "ok",
         "shipments": [s.model_dump() for s in shipments],
@@ -668,7 +909,7 @@ async def get_shipment_page(farmer_id: str, farmer_name: str = ""):
     """出荷情報ページのHTMLを取得"""
     global shipment_service
 
-    html = shipment_service.generate_shipment_html(farmer_id, farmer_name)
+    html = await shipment_service.generate_shipment_html_async(farmer_id, farmer_name)
     from fastapi.responses import HTMLResponse
     return HTMLResponse(content=html)
 
@@ -687,7 +928,7 @@ async def subscribe(request: SubscribeRequest):
         push_subscription=request.push_subscription,
     )
 
-    saved = shipment_service.subscribe(subscriber)
+    saved = await shipment_service.subscribe_async(subscriber)
     return {"status": "subscribed", "subscriber_id": saved.id}
 
 
@@ -698,7 +939,7 @@ async def unsubscribe(farmer_id: str, email: str):
 
     logger.info(f"[Unsubscribe] farmer={farmer_id} email={email}")
 
-    success = shipment_service.unsubscribe(farmer_id, email)
+    success = await shipment_service.unsubscribe_async(farmer_id, email)
     if success:
         return {"status": "unsubscribed"}
     return {"status": "not_found"}
@@ -709,7 +950,7 @@ async def get_subscriber_count(farmer_id: str):
     """購読者数を取得"""
     global shipment_service
 
-    subscribers = shipment_service.get_subscribers(farmer_id)
+    subscribers = await shipment_service.get_subscribers_async(farmer_id)
     return {"count": len(subscribers)}
 
 
@@ -721,7 +962,7 @@ async def add_favorite(request: FavoriteRequest):
 
     logger.info(f"[Community] FAVORITE user={request.user_id} farmer={request.farmer_id}")
 
-    favorite = community_service.add_favorite(
+    favorite = await community_service.add_favorite_async(
         user_id=request.user_id,
         farmer_id=request.farmer_id
     )
@@ -739,7 +980,7 @@ async def remove_favorite(user_id: str, farmer_id: str):
 
     logger.info(f"[Community] UNFAVORITE user={user_id} farmer={farmer_id}")
 
-    success = community_service.remove_favorite(user_id, farmer_id)
+    success = await community_service.remove_favorite_async(user_id, farmer_id)
     if success:
         return {"status": "removed"}
     return {"status": "not_found"}
@@ -750,7 +991,7 @@ async def get_favorites(user_id: str):
     """ユーザーのお気に入りリストを取得"""
     global community_service
 
-    favorites = community_service.get_user_favorites(user_id)
+    favorites = await community_service.get_user_favorites_async(user_id)
     return {
         "status": "ok",
         "favorites": [f.model_dump() for f in favorites]
@@ -762,7 +1003,7 @@ async def get_farmer_followers(farmer_id: str):
     """農家のフォロワーリストを取得"""
     global community_service
 
-    followers = community_service.get_farmer_followers(farmer_id)
+    followers = await community_service.get_farmer_followers_async(farmer_id)
     return {
         "status": "ok",
         "followers": [f.model_dump() for f in followers],
@@ -777,7 +1018,7 @@ async def check_in(request: CheckInRequest):
 
     logger.info(f"[Community] CHECKIN user={request.user_id} farmer={request.farmer_id}")
 
-    checkin = community_service.check_in(
+    checkin = await community_service.check_in_async(
         user_id=request.user_id,
         farmer_id=request.farmer_id,
         location_name=request.location_name
@@ -795,7 +1036,7 @@ async def get_checkin_history(user_id: str, limit: int = 20):
     """来店履歴を取得"""
     global community_service
 
-    checkins = community_service.get_user_checkins(user_id, limit=limit)
+    checkins = await community_service.get_user_checkins_async(user_id, limit=limit)
     return {
         "status": "ok",
         "checkins": [c.model_dump() for c in checkins],
@@ -808,7 +1049,7 @@ async def get_farmer_stats(farmer_id: str):
     """農家の統計情報を取得"""
     global community_service
 
-    stats = community_service.get_farmer_stats(farmer_id)
+    stats = await community_service.get_farmer_stats_async(farmer_id)
     return {
         "status": "ok",
         "stats": stats.model_dump()
@@ -822,7 +1063,7 @@ async def update_notification_settings(request: NotificationSettingsRequest):
 
     logger.info(f"[Community] NOTIFICATION_SETTINGS user={request.user_id}")
 
-    settings = community_service.update_notification_settings(
+    settings = await community_service.update_notification_settings_async(
         user_id=request.user_id,
         email_enabled=request.email_enabled,
         push_enabled=request.push_enabled,
@@ -841,7 +1082,7 @@ async def get_notification_settings(user_id: str):
     """通知設定を取得"""
     global community_service
 
-    settings = community_service.get_notification_settings(user_id)
+    settings = await community_service.get_notification_settings_async(user_id)
     if not settings:
         return {"status": "not_found", "settings": None}
 
@@ -856,7 +1097,7 @@ async def get_checkin_page(farmer_id: str, farmer_name: str = ""):
     """来店記録用のQRスキャンページを取得"""
     global community_service
 
-    html = community_service.generate_checkin_page(farmer_id, farmer_name)
+    html = await community_service.generate_checkin_page_async(farmer_id, farmer_name)
     from fastapi.responses import HTMLResponse
     return HTMLResponse(content=html)
 
@@ -898,7 +1139,7 @@ async def create_plant(request: PlantCreateRequest):
 
     logger.info(f"[Grow] CREATE_PLANT user={request.user_id} name={request.name} method={request.farming_method} soil={request.soil_type}")
 
-    plant = grow_service.create_plant(
+    plant = await grow_service.create_plant_async(
         user_id=request.user_id,
         name=request.name,
         variety=request.variety,
@@ -922,7 +1163,7 @@ async def get_plants(user_id: str):
     """ユーザーの植物一覧を取得"""
     global grow_service
 
-    plants = grow_service.get_plants(user_id)
+    plants = await grow_service.get_plants_async(user_id)
     return {
         "status": "ok",
         "plants": [p.model_dump() for p in plants]
@@ -934,7 +1175,7 @@ async def get_plant(user_id: str, plant_id: str):
     """植物を取得"""
     global grow_service
 
-    plant = grow_service.get_plant(user_id, plant_id)
+    plant = await grow_service.get_plant_async(user_id, plant_id)
     if not plant:
         return {"status": "not_found", "plant": None}
 
@@ -949,7 +1190,7 @@ async def delete_plant(user_id: str, plant_id: str):
     """植物を削除"""
     global grow_service
 
-    success = grow_service.delete_plant(user_id, plant_id)
+    success = await grow_service.delete_plant_async(user_id, plant_id)
     if success:
         return {"status": "deleted"}
     return {"status": "not_found"}
@@ -962,11 +1203,17 @@ async def add_observation(request: ObservationCreateRequest):
 
     logger.info(f"[Grow] ADD_OBS plant={request.plant_id} user={request.user_id}")
 
-    observation = grow_service.add_observation(
+    # 観察日はファイル名にも使うため、形式を確かめてから書き込む
+    try:
+        date = normalize_date(request.date) if request.date is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    observation = await grow_service.add_observation_async(
         plant_id=request.plant_id,
         user_id=request.user_id,
         text=request.text,
-        date=request.date,
+        date=date,
         time=request.time,
         weather=request.weather,
         temperature=request.temperature,
@@ -983,27 +1230,64 @@ async def add_observation(request: ObservationCreateRequest):
     }
 
 
-@app.get("/internal/grow/observation/{user_id}/{plant_id}")
-async def get_observations(user_id: str, plant_id: str, limit: int = 30, offset: int = 0):
-    """観察記録を取得"""
+@app.get("/internal/grow/observation/{user_id}/today")
+async def get_today_observations(user_id: str):
+    """今日の観察記録を取得"""
     global grow_service
 
-    observations = grow_service.get_observations(user_id, plant_id, limit=limit, offset=offset)
+    observations = await grow_service.get_today_observations_async(user_id)
     return {
         "status": "ok",
+        "date": datetime.now().strftime("%Y-%m-%d"),
         "observations": [o.model_dump() for o in observations]
     }
 
 
-@app.get("/internal/grow/observation/{user_id}/today")
-async def get_today_observations(user_id: str):
-    """今日の観察記録を取得"""
+@app.get("/internal/grow/observation/{user_id}/range")
+async def get_observations_in_range(user_id: str, start: str, end: str):
+    """期間内の観察記録を全植物から取得（start〜end: YYYY-MM-DD、両端を含む）"""
     global grow_service
 
-    observations = grow_service.get_today_observations(user_id)
+    try:
+        start, end = normalize_date(start), normalize_date(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    observations = await grow_service.get_observations_in_range_async(user_id, start, end)
+    return {
+        "status": "ok",
+        "start": start,
+        "end": end,
+        "observations": [o.model_dump() for o in observations]
+    }
+
+
+@app.get("/internal/grow/observation/{user_id}/date/{date}")
+async def get_observations_by_date(user_id: str, date: str):
+    """指定日の観察記録を全植物から取得"""
+    global grow_service
+
+    try:
+        date = normalize_date(date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    observations = await grow_service.get_observations_by_date_async(user_id, date)
+    return {
+        "status": "ok",
+        "date": date,
+        "observations": [o.model_dump() for o in observations]
+    }
+
+
+@app.get("/internal/grow/observation/{user_id}/{plant_id}")
+async def get_observations(user_id: str, plant_id: str, limit: int = 30, offset: int = 0):
+    """観察記録を取得"""
+    global grow_service
+
+    observations = await grow_service.get_observations_async(user_id, plant_id, limit=limit, offset=offset)
     return {
         "status": "ok",
-        "date": datetime.now().strftime("%Y-%m-%d"),
         "observations": [o.model_dump() for o in observations]
     }
 
@@ -1013,7 +1297,7 @@ async def get_plant_stats(user_id: str, plant_id: str):
     """植物の統計を取得"""
     global grow_service
 
-    stats = grow_service.get_plant_stats(user_id, plant_id)
+    stats = await grow_service.get_plant_stats_async(user_id, plant_id)
     return {
         "status": "ok",
         "stats": stats.model_dump()
@@ -1025,7 +1309,7 @@ async def get_user_grow_stats(user_id: str):
     """ユーザーの栽培統計を取得"""
     global grow_service
 
-    stats = grow_service.get_user_stats(user_id)
+    stats = await grow_service.get_user_stats_async(user_id)
     return {
         "status": "ok",
         "stats": stats
@@ -1037,7 +1321,7 @@ async def get_plant_page(user_id: str, plant_id: str):
     """植物の公開ページを取得"""
     global grow_service
 
-    html = grow_service.generate_plant_page(user_id, plant_id)
+    html = await grow_service.generate_plant_page_async(user_id, plant_id)
     from fastapi.responses import HTMLResponse
     return HTMLResponse(content=html)
 
@@ -1058,11 +1342,11 @@ async def analyze_growth(request: GrowthAnalysisRequest):
 
     logger.info(f"[Grow/AI] ANALYZE user={request.user_id} plant={request.plant_id}")
 
-    plant = grow_service.get_plant(request.user_id, request.plant_id)
+    plant = await grow_service.get_plant_async(request.user_id, request.plant_id)
     if not plant:
         raise HTTPException(status_code=404, detail="植物が見つかりません")
 
-    observations = grow_service.get_observations(
+    observations = await grow_service.get_observations_async(
         request.user_id,
         request.plant_id,
         limit=request.recent_days
@@ -1099,11 +1383,11 @@ async def diagnose_problem(request: ProblemDiagnosisRequest):
 
     logger.info(f"[Grow/AI] DIAGNOSE user={request.user_id} plant={request.plant_id}")
 
-    plant = grow_service.get_plant(request.user_id, request.plant_id)
+    plant = await grow_service.get_plant_async(request.user_id, request.plant_id)
     if not plant:
         raise HTTPException(status_code=404, detail="植物が見つかりません")
 
-    observations = grow_service.get_observations(
+    observations = await grow_service.get_observations_async(
         request.user_id,
         request.plant_id,
         limit=5
@@ -1137,11 +1421,11 @@ async def predict_harvest(request: HarvestPredictionRequest):
 
     logger.info(f"[Grow/AI] PREDICT user={request.user_id} plant={request.plant_id}")
 
-    plant = grow_service.get_plant(request.user_id, request.plant_id)
+    plant = await grow_service.get_plant_async(request.user_id, request.plant_id)
     if not plant:
         raise HTTPException(status_code=404, detail="植物が見つかりません")
 
-    observations = grow_service.get_observations(
+    observations = await grow_service.get_observations_async(
         request.user_id,
         request.plant_id,
         limit=20
@@ -1172,11 +1456,11 @@ async def get_observation_prompt(user_id: str, plant_id: str):
     """
     global grow_service, grow_ai_service
 
-    plant = grow_service.get_plant(user_id, plant_id)
+    plant = await grow_service.get_plant_async(user_id, plant_id)
     if not plant:
         raise HTTPException(status_code=404, detail="植物が見つかりません")
 
-    observations = grow_service.get_observations(user_id, plant_id, limit=1)
+    observations = await grow_service.get_observations_async(user_id, plant_id, limit=1)
     last_obs = observations[0] if observations else None
 
     prompt = await grow_ai_service.generate_observation_prompt(
@@ -1199,7 +1483,7 @@ async def extract_insights_ai(user_id: str, plant_id: str, observation_text: str
     """
     global grow_service, grow_ai_service
 
-    plant = grow_service.get_plant(user_id, plant_id)
+    plant = await grow_service.get_plant_async(user_id, plant_id)
     if not plant:
         raise HTTPException(status_code=404, detail="植物が見つかりません")
 
@@ -1239,7 +1523,7 @@ async def get_climate(lat: float, lon: float, location_name: Optional[str] = Non
     if not (-180 <= lon <= 180):
         raise HTTPException(status_code=400, detail="経度は-180〜180の範囲で指定してください")
 
-    climate = climate_service.get_climate(lat, lon, location_name)
+    climate = await climate_service.get_climate_async(lat, lon, location_name)
 
     return {
         "status": "ok",
@@ -1274,7 +1558,7 @@ async def get_climate_simple(
     if not (-180 <= lon <= 180):
         raise HTTPException(status_code=400, detail="Invalid longitude")
 
-    climate = climate_service.get_climate_simple(lat, lon, location_name, lang)
+    climate = await climate_service.get_climate_simple_async(lat, lon, location_name, lang)
 
     return {
         "status": "ok",
@@ -1296,7 +1580,7 @@ async def get_climate_post(request: ClimateRequest):
 
     logger.info(f"[Climate] POST lat={request.lat} lon={request.lon}")
 
-    climate = climate_service.get_climate(
+    climate = await climate_service.get_climate_async(
         request.lat,
         request.lon,
         request.location_name
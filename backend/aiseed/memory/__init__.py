@@ -2,6 +2,15 @@
 AIseed Memory Module
 ユーザーのプロファイルや履歴を管理
 """
-from .store import UserMemory, UserProfile, Insight
+from .store import UserMemory, UserProfile, Insight, MemoryBatch
+from .backends import MemoryBackend, JSONBackend, SQLiteBackend
 
-__all__ = ["UserMemory", "UserProfile", "Insight"]
+__all__ = [
+    "UserMemory",
+    "UserProfile",
+    "Insight",
+    "MemoryBatch",
+    "MemoryBackend",
+    "JSONBackend",
+    "SQLiteBackend",
+]
@@ -0,0 +1,573 @@
+"""
+AIseed Memory Backends
+ユーザーメモリのストレージバックエンド
+
+- JSONBackend: 従来のディレクトリ構成（profile.json / history.json / skills/*.md）
+- SQLiteBackend: 組み込みSQLite（WALモード）
+    特性・履歴は行の追加のみで、ドキュメント全体の書き換えは行わない
+
+プロファイルは UserProfile.model_dump() と同じ形式の dict でやり取りする。
+"""
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from storage import atomic_write_json
+
+
+def new_profile(user_id: str, now: str) -> dict:
+    """空のプロファイル（UserProfileのデフォルト値と同じ）"""
+    return {
+        "user_id": user_id,
+        "age_group": None,
+        "insights": [],
+        "conversation_count": 0,
+        "first_seen": now,
+        "last_seen": now,
+    }
+
+
+class MemoryBackend:
+    """ストレージバックエンドの基底クラス"""
+
+    # ==================== プロファイル ====================
+
+    def load_profile(self, user_id: str) -> Optional[dict]:
+        """プロファイルを読み込み（未登録ならNone）"""
+        raise NotImplementedError
+
+    def save_profile(self, profile: dict):
+        """プロファイル全体を保存"""
+        raise NotImplementedError
+
+    def append_insight(self, user_id: str, insight: dict, now: str):
+        """特性を1件追加"""
+        raise NotImplementedError
+
+    def update_profile(self, user_id: str, fields: dict, now: str):
+        """プロファイルの項目を更新（age_group等）"""
+        raise NotImplementedError
+
+    def increment_conversation_count(self, user_id: str, now: str):
+        """会話回数をインクリメント"""
+        raise NotImplementedError
+
+    # ==================== 履歴 ====================
+
+    def load_history(self, user_id: str) -> list[dict]:
+        """会話履歴（古い順）を読み込み"""
+        raise NotImplementedError
+
+    def append_history(self, user_id: str, entry: dict, limit: int):
+        """会話履歴を1件追加（最新limit件のみ保持）"""
+        raise NotImplementedError
+
+    # ==================== 一括更新 ====================
+
+    def apply_batch(
+        self,
+        user_id: str,
+        now: str,
+        insights: list[dict],
+        fields: dict,
+        conversation_increment: int,
+        history: list[dict],
+        history_limit: int
+    ):
+        """
+        複数の更新をまとめて反映（MemoryBatchのコミット）
+
+        途中で失敗した場合は何も反映しない
+        """
+        raise NotImplementedError
+
+    # ==================== スキル ====================
+
+    def save_skill(self, user_id: str, skill_type: str, content: str):
+        raise NotImplementedError
+
+    def load_skill(self, user_id: str, skill_type: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def list_skills(self, user_id: str) -> list[str]:
+        raise NotImplementedError
+
+    # ==================== ユーティリティ ====================
+
+    def version(self, user_id: str, kind: str) -> Optional[tuple]:
+        """
+        データのバージョントークン（キャッシュの無効化判定用）
+
+        Args:
+            kind: "profile" / "history" / "skills"
+
+        Returns:
+            書き込みのたびに変わる値（未作成ならNone）
+        """
+        raise NotImplementedError
+
+    def list_users(self) -> list[str]:
+        """登録済みユーザーID一覧"""
+        raise NotImplementedError
+
+
+class JSONBackend(MemoryBackend):
+    """
+    JSONファイルバックエンド（従来形式）
+
+    user_memory/
+      ├── {user_id}/
+      │   ├── profile.json
+      │   ├── history.json
+      │   └── skills/{skill_type}.md
+    """
+
+    def __init__(self, base_path: str = "user_memory"):
+        self.base_path = Path(base_path)
+        self.base_path.mkdir(parents=True, exist_ok=True)
+
+    def _user_dir(self, user_id: str) -> Path:
+        user_dir = self.base_path / user_id
+        user_dir.mkdir(parents=True, exist_ok=True)
+        return user_dir
+
+    def _profile_path(self, user_id: str) -> Path:
+        return self._user_dir(user_id) / "profile.json"
+
+    def _history_path(self, user_id: str) -> Path:
+        return self._user_dir(user_id) / "history.json"
+
+    def _skills_dir(self, user_id: str) -> Path:
+        skills_dir = self._user_dir(user_id) / "skills"
+        skills_dir.mkdir(parents=True, exist_ok=True)
+        return skills_dir
+
+    # ==================== プロファイル ====================
+
+    def _write_json(self, path: Path, data):
+        """一時ファイルに書き込んでからos.replaceで置き換え（アトミック）"""
+        atomic_write_json(path, data)
+
+    def load_profile(self, user_id: str) -> Optional[dict]:
+        path = self._profile_path(user_id)
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return None
+
+    def save_profile(self, profile: dict):
+        self._write_json(self._profile_path(profile["user_id"]), profile)
+
+    def append_insight(self, user_id: str, insight: dict, now: str):
+        profile = self.load_profile(user_id) or new_profile(user_id, now)
+        profile["insights"].append(insight)
+        profile["last_seen"] = now
+        self.save_profile(profile)
+
+    def update_profile(self, user_id: str, fields: dict, now: str):
+        profile = self.load_profile(user_id) or new_profile(user_id, now)
+        profile.update(fields)
+        profile["last_seen"] = now
+        self.save_profile(profile)
+
+    def increment_conversation_count(self, user_id: str, now: str):
+        profile = self.load_profile(user_id) or new_profile(user_id, now)
+        profile["conversation_count"] = profile.get("conversation_count", 0) + 1
+        profile["last_seen"] = now
+        self.save_profile(profile)
+
+    # ==================== 履歴 ====================
+
+    def load_history(self, user_id: str) -> list[dict]:
+        path = self._history_path(user_id)
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return []
+
+    def append_history(self, user_id: str, entry: dict, limit: int):
+        history = self.load_history(user_id)
+        history.append(entry)
+        if len(history) > limit:
+            history = history[-limit:]
+        self._write_json(self._history_path(user_id), history)
+
+    # ==================== 一括更新 ====================
+
+    def apply_batch(
+        self,
+        user_id: str,
+        now: str,
+        insights: list[dict],
+        fields: dict,
+        conversation_increment: int,
+        history: list[dict],
+        history_limit: int
+    ):
+        # 書き込み内容を先に全て組み立ててから、ファイルごとに1回だけ書き込む
+        profile = None
+        if insights or fields or conversation_increment:
+            profile = self.load_profile(user_id) or new_profile(user_id, now)
+            profile["insights"].extend(insights)
+            profile.update(fields)
+            profile["conversation_count"] = profile.get("conversation_count", 0) + conversation_increment
+            profile["last_seen"] = now
+
+        entries = None
+        if history:
+            entries = (self.load_history(user_id) + history)[-history_limit:]
+
+        if profile is not None:
+            self._write_json(self._profile_path(user_id), profile)
+        if entries is not None:
+            self._write_json(self._history_path(user_id), entries)
+
+    # ==================== スキル ====================
+
+    def save_skill(self, user_id: str, skill_type: str, content: str):
+        path = self._skills_dir(user_id) / f"{skill_type}.md"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def load_skill(self, user_id: str, skill_type: str) -> Optional[str]:
+        path = self._skills_dir(user_id) / f"{skill_type}.md"
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        return None
+
+    def list_skills(self, user_id: str) -> list[str]:
+        return [f.stem for f in self._skills_dir(user_id).glob("*.md")]
+
+    # ==================== ユーティリティ ====================
+
+    VERSION_FILES = {
+        "profile": "profile.json",
+        "history": "history.json",
+        "skills": "skills",
+    }
+
+    def version(self, user_id: str, kind: str) -> Optional[tuple]:
+        # ディレクトリを作らずにstatのみ（mtime・サイズ・inode）
+        path = self.base_path / user_id / self.VERSION_FILES[kind]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def list_users(self) -> list[str]:
+        return sorted(p.name for p in self.base_path.iterdir() if p.is_dir())
+
+
+class SQLiteBackend(MemoryBackend):
+    """
+    SQLiteバックエンド（WALモード）
+
+    - insights / history はユーザーID+連番のインデックス付きテーブル
+    - 追加はINSERTのみ（プロファイル全体の再シリアライズなし）
+    - 接続はスレッドごとに保持（スレッドプールからの利用に対応）
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS profiles (
+        user_id TEXT PRIMARY KEY,
+        age_group TEXT,
+        conversation_count INTEGER NOT NULL DEFAULT 0,
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS insights (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        content TEXT NOT NULL,
+        context TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        discovered_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_insights_user ON insights (user_id, id);
+    CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        service TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        key_discoveries TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_history_user ON history (user_id, id);
+    CREATE TABLE IF NOT EXISTS skills (
+        user_id TEXT NOT NULL,
+        skill_type TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (user_id, skill_type)
+    );
+    """
+
+    def __init__(self, base_path: str = "user_memory", filename: str = "memory.db"):
+        self.base_path = Path(base_path)
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.base_path / filename
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """スレッドローカルな接続を取得"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ensure_profile(self, conn: sqlite3.Connection, user_id: str, now: str):
+        conn.execute(
+            "INSERT OR IGNORE INTO profiles (user_id, first_seen, last_seen) VALUES (?, ?, ?)",
+            (user_id, now, now)
+        )
+
+    # ==================== プロファイル ====================
+
+    def load_profile(self, user_id: str) -> Optional[dict]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT * FROM profiles WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        insights = conn.execute(
+            """SELECT type, content, context, confidence, discovered_at
+               FROM insights WHERE user_id = ? ORDER BY id""",
+            (user_id,)
+        ).fetchall()
+
+        profile = dict(row)
+        profile["insights"] = [dict(i) for i in insights]
+        return profile
+
+    def save_profile(self, profile: dict):
+        user_id = profile["user_id"]
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """INSERT INTO profiles (user_id, age_group, conversation_count, first_seen, last_seen)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (user_id) DO UPDATE SET
+                       age_group = excluded.age_group,
+                       conversation_count = excluded.conversation_count,
+                       first_seen = excluded.first_seen,
+                       last_seen = excluded.last_seen""",
+                (user_id, profile.get("age_group"), profile.get("conversation_count", 0),
+                 profile["first_seen"], profile["last_seen"])
+            )
+            conn.execute("DELETE FROM insights WHERE user_id = ?", (user_id,))
+            self._insert_insights(conn, user_id, profile.get("insights", []))
+
+    def _insert_insights(self, conn: sqlite3.Connection, user_id: str, insights: list[dict]):
+        conn.executemany(
+            """INSERT INTO insights (user_id, type, content, context, confidence, discovered_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [
+                (user_id, i["type"], i["content"], i["context"],
+                 i.get("confidence", 0.5), i["discovered_at"])
+                for i in insights
+            ]
+        )
+
+    def append_insight(self, user_id: str, insight: dict, now: str):
+        conn = self._conn()
+        with conn:
+            self._ensure_profile(conn, user_id, now)
+            self._insert_insights(conn, user_id, [insight])
+            conn.execute(
+                "UPDATE profiles SET last_seen = ? WHERE user_id = ?", (now, user_id)
+            )
+
+    def update_profile(self, user_id: str, fields: dict, now: str):
+        columns = [c for c in fields if c in ("age_group", "conversation_count", "first_seen")]
+        conn = self._conn()
+        with conn:
+            self._ensure_profile(conn, user_id, now)
+            assignments = ", ".join(f"{c} = ?" for c in columns + ["last_seen"])
+            conn.execute(
+                f"UPDATE profiles SET {assignments} WHERE user_id = ?",
+                [fields[c] for c in columns] + [now, user_id]
+            )
+
+    def increment_conversation_count(self, user_id: str, now: str):
+        conn = self._conn()
+        with conn:
+            self._ensure_profile(conn, user_id, now)
+            conn.execute(
+                """UPDATE profiles SET conversation_count = conversation_count + 1, last_seen = ?
+                   WHERE user_id = ?""",
+                (now, user_id)
+            )
+
+    # ==================== 履歴 ====================
+
+    def load_history(self, user_id: str) -> list[dict]:
+        rows = self._conn().execute(
+            """SELECT session_id, service, summary, key_discoveries, created_at
+               FROM history WHERE user_id = ? ORDER BY id""",
+            (user_id,)
+        ).fetchall()
+
+        history = []
+        for row in rows:
+            entry = dict(row)
+            entry["key_discoveries"] = json.loads(entry["key_discoveries"])
+            history.append(entry)
+        return history
+
+    def append_history(self, user_id: str, entry: dict, limit: int):
+        conn = self._conn()
+        with conn:
+            self._insert_history(conn, user_id, [entry])
+            self._trim_history(conn, user_id, limit)
+
+    def _insert_history(self, conn: sqlite3.Connection, user_id: str, entries: list[dict]):
+        conn.executemany(
+            """INSERT INTO history (user_id, session_id, service, summary, key_discoveries, created_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [
+                (user_id, e["session_id"], e["service"], e["summary"],
+                 json.dumps(e.get("key_discoveries", []), ensure_ascii=False), e["created_at"])
+                for e in entries
+            ]
+        )
+
+    # ==================== 一括更新 ====================
+
+    def apply_batch(
+        self,
+        user_id: str,
+        now: str,
+        insights: list[dict],
+        fields: dict,
+        conversation_increment: int,
+        history: list[dict],
+        history_limit: int
+    ):
+        # 1トランザクションで反映
+        columns = [c for c in fields if c in ("age_group", "conversation_count", "first_seen")]
+        conn = self._conn()
+        with conn:
+            if insights or fields or conversation_increment:
+                self._ensure_profile(conn, user_id, now)
+                self._insert_insights(conn, user_id, insights)
+                assignments = ", ".join(
+                    [f"{c} = ?" for c in columns]
+                    + ["conversation_count = conversation_count + ?", "last_seen = ?"]
+                )
+                conn.execute(
+                    f"UPDATE profiles SET {assignments} WHERE user_id = ?",
+                    [fields[c] for c in columns] + [conversation_increment, now, user_id]
+                )
+            if history:
+                self._insert_history(conn, user_id, history)
+                self._trim_history(conn, user_id, history_limit)
+
+    def _trim_history(self, conn: sqlite3.Connection, user_id: str, limit: int):
+        """最新limit件より古い履歴を削除"""
+        conn.execute(
+            """DELETE FROM history WHERE user_id = ? AND id <= (
+                   SELECT id FROM history WHERE user_id = ?
+                   ORDER BY id DESC LIMIT 1 OFFSET ?
+               )""",
+            (user_id, user_id, limit)
+        )
+
+    # ==================== スキル ====================
+
+    def save_skill(self, user_id: str, skill_type: str, content: str):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """INSERT INTO skills (user_id, skill_type, content) VALUES (?, ?, ?)
+                   ON CONFLICT (user_id, skill_type) DO UPDATE SET content = excluded.content""",
+                (user_id, skill_type, content)
+            )
+
+    def load_skill(self, user_id: str, skill_type: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT content FROM skills WHERE user_id = ? AND skill_type = ?",
+            (user_id, skill_type)
+        ).fetchone()
+        return row["content"] if row else None
+
+    def list_skills(self, user_id: str) -> list[str]:
+        rows = self._conn().execute(
+            "SELECT skill_type FROM skills WHERE user_id = ? ORDER BY skill_type", (user_id,)
+        ).fetchall()
+        return [r["skill_type"] for r in rows]
+
+    # ==================== ユーティリティ ====================
+
+    VERSION_QUERIES = {
+        # 書き込みのたびにlast_seenが更新され、特性の追加・置換でMAX(id)が変わる
+        "profile": """SELECT last_seen, conversation_count,
+                          (SELECT MAX(id) FROM insights WHERE user_id = :user_id)
+                      FROM profiles WHERE user_id = :user_id""",
+        "history": "SELECT MAX(id), COUNT(*) FROM history WHERE user_id = :user_id",
+        "skills": "SELECT COUNT(*) FROM skills WHERE user_id = :user_id",
+    }
+
+    def version(self, user_id: str, kind: str) -> Optional[tuple]:
+        row = self._conn().execute(
+            self.VERSION_QUERIES[kind], {"user_id": user_id}
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def list_users(self) -> list[str]:
+        rows = self._conn().execute("SELECT user_id FROM profiles ORDER BY user_id").fetchall()
+        return [r["user_id"] for r in rows]
+
+
+BACKENDS = {
+    "json": JSONBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+def create_backend(kind: str, base_path: str) -> MemoryBackend:
+    """設定名からバックエンドを生成（"json" / "sqlite"）"""
+    backend_class = BACKENDS.get(kind)
+    if backend_class is None:
+        raise ValueError(f"Unknown memory backend: {kind}")
+    return backend_class(base_path)
+
+
+def migrate(source: MemoryBackend, target: MemoryBackend) -> int:
+    """
+    バックエンド間でユーザーメモリを移行
+
+    Returns:
+        移行したユーザー数
+    """
+    count = 0
+    for user_id in source.list_users():
+        profile = source.load_profile(user_id)
+        if profile:
+            target.save_profile(profile)
+
+        history = source.load_history(user_id)
+        for entry in history:
+            target.append_history(user_id, entry, limit=len(history))
+
+        for skill_type in source.list_skills(user_id):
+            content = source.load_skill(user_id, skill_type)
+            if content is not None:
+                target.save_skill(user_id, skill_type, content)
+        count += 1
+    return count
@@ -0,0 +1,95 @@
+"""
+AIseed Memory Cache
+パース済みプロファイル・履歴のLRUキャッシュ
+
+各エントリはバックエンドのバージョントークン（JSONならファイルのmtime等）と
+一緒に保持し、トークンが変わっていればミスとして扱う（他プロセスの書き込み対策）。
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """エントリ数・推定バイト数の上限付きLRUキャッシュ"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_entries: 最大エントリ数（0でキャッシュ無効）
+            max_bytes: 推定メモリ使用量の上限（バイト）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, tuple[Any, Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[Any]:
+        """バージョンが一致すれば値を返す（不一致・未登録ならNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key: Hashable, version: Any) -> Optional[Any]:
+        """統計・LRU順を変えずに参照（書き込み時の差分適用用）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            return entry[1]
+
+    def put(self, key: Hashable, version: Any, value: Any, size: int):
+        """値を登録（上限を超えたら古いものから追い出す）"""
+        if self.max_entries <= 0 or size > self.max_bytes:
+            self.invalidate(key)
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            self._entries[key] = (version, value, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """エントリを破棄"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """ヒット率などの統計"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
@@ -10,14 +10,19 @@ user_memory/
   │   └── skills/           # 生成したスキル
   │       ├── spark.md
   │       └── grow.md
+
+memory.db（SQLiteバックエンド使用時、上記の代わりに1ファイルに集約）
 """
-import json
-import os
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 from pydantic import BaseModel
 
+from storage import offload
+from .backends import MemoryBackend, create_backend
+from .cache import LRUCache
+
 
 class Insight(BaseModel):
     """発見した特性"""
@@ -65,47 +70,229 @@ class ConversationSummary(BaseModel):
         super().__init__(**data)
 
 
+class MemoryBatch:
+    """
+    ユーザーメモリの一括更新（Unit of Work）
+
+    UserMemory.batch() から使用する。
+    変更はメモリ上に溜めておき、コミット時に1回の書き込みで反映する。
+    """
+
+    def __init__(self, memory: "UserMemory", user_id: str):
+        self.memory = memory
+        self.user_id = user_id
+        self.insights: list[Insight] = []
+        self.fields: dict = {}
+        self.conversation_increment = 0
+        self.history: list[ConversationSummary] = []
+
+    def add_insight(
+        self,
+        type: str,
+        content: str,
+        context: str,
+        confidence: float = 0.5
+    ) -> Insight:
+        """特性を記録"""
+        insight = Insight(
+            type=type,
+            content=content,
+            context=context,
+            confidence=confidence
+        )
+        self.insights.append(insight)
+        return insight
+
+    def update_age_group(self, age_group: str):
+        """年齢層を更新"""
+        self.fields["age_group"] = age_group
+
+    def increment_conversation_count(self):
+        """会話回数をインクリメント"""
+        self.conversation_increment += 1
+
+    def add_history(
+        self,
+        session_id: str,
+        service: str,
+        summary: str,
+        key_discoveries: list[str] = None
+    ):
+        """会話履歴を追加"""
+        self.history.append(ConversationSummary(
+            session_id=session_id,
+            service=service,
+            summary=summary,
+            key_discoveries=key_discoveries or []
+        ))
+
+    def is_empty(self) -> bool:
+        return not (self.insights or self.fields or self.conversation_increment or self.history)
+
+    def commit(self):
+        """溜めた変更をまとめて書き込む"""
+        if self.is_empty():
+            return
+
+        now = datetime.now().isoformat()
+        snapshot = self.memory._snapshot(self.user_id)
+        self.memory.backend.apply_batch(
+            self.user_id,
+            now=now,
+            insights=[i.model_dump() for i in self.insights],
+            fields=dict(self.fields),
+            conversation_increment=self.conversation_increment,
+            history=[h.model_dump() for h in self.history],
+            history_limit=self.memory.HISTORY_LIMIT
+        )
+        self.memory._write_through(
+            self.user_id,
+            snapshot,
+            now,
+            insights=[i.model_copy() for i in self.insights],
+            fields=self.fields,
+            conversation_increment=self.conversation_increment,
+            history=list(self.history)
+        )
+
+
 class UserMemory:
     """ユーザーメモリ管理クラス"""
 
-    def __init__(self, base_path: str = "user_memory"):
+    # 会話履歴の保持件数
+    HISTORY_LIMIT = 100
+
+    def __init__(
+        self,
+        base_path: str = "user_memory",
+        backend: Union[str, MemoryBackend] = "json",
+        cache_max_entries: int = 1024,
+        cache_max_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Args:
+            base_path: 保存先ディレクトリ
+            backend: "json"（従来のファイル構成）/ "sqlite"（WALモード）
+                     またはMemoryBackendのインスタンス
+            cache_max_entries: キャッシュの最大エントリ数（0で無効）
+            cache_max_bytes: キャッシュの推定メモリ使用量の上限
+        """
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
 
-    def _user_dir(self, user_id: str) -> Path:
-        """ユーザーディレクトリのパス"""
-        user_dir = self.base_path / user_id
-        user_dir.mkdir(parents=True, exist_ok=True)
-        return user_dir
-
-    def _profile_path(self, user_id: str) -> Path:
-        return self._user_dir(user_id) / "profile.json"
-
-    def _history_path(self, user_id: str) -> Path:
-        return self._user_dir(user_id) / "history.json"
+        if isinstance(backend, str):
+            backend = create_backend(backend, str(self.base_path))
+        self.backend = backend
+
+        self.cache = LRUCache(max_entries=cache_max_entries, max_bytes=cache_max_bytes)
+
+    # ==================== 一括更新 ====================
+
+    @contextmanager
+    def batch(self, user_id: str):
+        """
+        複数の更新をまとめて1回で書き込む
+
+        使用例:
+            with memory.batch(user_id) as tx:
+                tx.add_insight(type="ability", content="...", context="...")
+                tx.update_age_group("adult")
+                tx.add_history(session_id, "spark", "要約")
+
+        withブロック内で例外が起きた場合は何も書き込まない
+        """
+        tx = MemoryBatch(self, user_id)
+        yield tx
+        tx.commit()
+
+    # ==================== キャッシュ ====================
+
+    def _load_profile(self, user_id: str) -> UserProfile:
+        """キャッシュ経由でプロファイルを取得（共有オブジェクトなので変更しないこと）"""
+        key = ("profile", user_id)
+        version = self.backend.version(user_id, "profile")
+        profile = self.cache.get(key, version)
+        if profile is None:
+            data = self.backend.load_profile(user_id)
+            profile = UserProfile(**data) if data else UserProfile(user_id=user_id)
+            self.cache.put(key, version, profile, _estimate_size(profile))
+        return profile
+
+    def _load_history(self, user_id: str) -> list[ConversationSummary]:
+        """キャッシュ経由で会話履歴を取得（共有オブジェクトなので変更しないこと）"""
+        key = ("history", user_id)
+        version = self.backend.version(user_id, "history")
+        history = self.cache.get(key, version)
+        if history is None:
+            history = [ConversationSummary(**s) for s in self.backend.load_history(user_id)]
+            self.cache.put(key, version, history, _estimate_size(history))
+        return history
+
+    def _snapshot(self, user_id: str) -> dict:
+        """書き込み前の最新キャッシュを取得（なければNone）"""
+        return {
+            kind: self.cache.peek((kind, user_id), version)
+            for kind in ("profile", "history")
+            if (version := self.backend.version(user_id, kind)) is not None
+        }
 
-    def _skills_dir(self, user_id: str) -> Path:
-        skills_dir = self._user_dir(user_id) / "skills"
-        skills_dir.mkdir(parents=True, exist_ok=True)
-        return skills_dir
+    def _write_through(
+        self,
+        user_id: str,
+        snapshot: dict,
+        now: str,
+        insights: list[Insight] = (),
+        fields: dict = None,
+        conversation_increment: int = 0,
+        history: list[ConversationSummary] = ()
+    ):
+        """
+        書き込み後にキャッシュを更新
+
+        書き込み前のキャッシュが最新だった場合は差分を適用して新しいバージョンで登録し、
+        そうでなければ破棄する（次回の読み込みで再取得）
+        """
+        if insights or fields or conversation_increment:
+            key = ("profile", user_id)
+            cached = snapshot.get("profile")
+            if cached is None:
+                self.cache.invalidate(key)
+            else:
+                profile = cached.model_copy(deep=True)
+                profile.insights.extend(insights)
+                for name, value in (fields or {}).items():
+                    setattr(profile, name, value)
+                profile.conversation_count += conversation_increment
+                profile.last_seen = now
+                self.cache.put(key, self.backend.version(user_id, "profile"), profile, _estimate_size(profile))
+
+        if history:
+            key = ("history", user_id)
+            cached = snapshot.get("history")
+            if cached is None:
+                self.cache.invalidate(key)
+            else:
+                entries = (cached + list(history))[-self.HISTORY_LIMIT:]
+                self.cache.put(key, self.backend.version(user_id, "history"), entries, _estimate_size(entries))
+
+    def cache_stats(self) -> dict:
+        """キャッシュのヒット・ミス・追い出し回数など"""
+        return self.cache.stats()
 
     # ==================== プロファイル管理 ====================
 
     def get_profile(self, user_id: str) -> UserProfile:
         """ユーザープロファイルを取得"""
-        path = self._profile_path(user_id)
-        if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return UserProfile(**data)
-        return UserProfile(user_id=user_id)
+        return self._load_profile(user_id).model_copy(deep=True)
 
     def save_profile(self, profile: UserProfile):
         """プロファイルを保存"""
         profile.last_seen = datetime.now().isoformat()
-        path = self._profile_path(profile.user_id)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(profile.model_dump(), f, ensure_ascii=False, indent=2)
+        self.backend.save_profile(profile.model_dump())
+
+        saved = profile.model_copy(deep=True)
+        version = self.backend.version(profile.user_id, "profile")
+        self.cache.put(("profile", profile.user_id), version, saved, _estimate_size(saved))
 
     def add_insight(
         self,
@@ -116,44 +303,42 @@ class UserMemory:
         confidence: float = 0.5
     ) -> Insight:
         """特性を記録"""
-        profile = self.get_profile(user_id)
         insight = Insight(
             type=type,
             content=content,
             context=context,
             confidence=confidence
         )
-        profile.insights.append(insight)
-        self.save_profile(profile)
+        now = datetime.now().isoformat()
+        snapshot = self._snapshot(user_id)
+        self.backend.append_insight(user_id, insight.model_dump(), now)
+        self._write_through(user_id, snapshot, now, insights=[insight.model_copy()])
         return insight
 
     def get_insights_by_type(self, user_id: str, type: str) -> list[Insight]:
         """タイプ別に特性を取得"""
-        profile = self.get_profile(user_id)
-        return [i for i in profile.insights if i.type == type]
+        profile = self._load_profile(user_id)
+        return [i.model_copy() for i in profile.insights if i.type == type]
 
     def update_age_group(self, user_id: str, age_group: str):
         """年齢層を更新"""
-        profile = self.get_profile(user_id)
-        profile.age_group = age_group
-        self.save_profile(profile)
+        now = datetime.now().isoformat()
+        snapshot = self._snapshot(user_id)
+        self.backend.update_profile(user_id, {"age_group": age_group}, now)
+        self._write_through(user_id, snapshot, now, fields={"age_group": age_group})
 
     def increment_conversation_count(self, user_id: str):
         """会話回数をインクリメント"""
-        profile = self.get_profile(user_id)
-        profile.conversation_count += 1
-        self.save_profile(profile)
+        now = datetime.now().isoformat()
+        snapshot = self._snapshot(user_id)
+        self.backend.increment_conversation_count(user_id, now)
+        self._write_through(user_id, snapshot, now, conversation_increment=1)
 
     # ==================== 履歴管理 ====================
 
     def get_history(self, user_id: str) -> list[ConversationSummary]:
         """会話履歴（要約）を取得"""
-        path = self._history_path(user_id)
-        if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return [ConversationSummary(**s) for s in data]
-        return []
+        return [h.model_copy() for h in self._load_history(user_id)]
 
     def add_history(
         self,
@@ -164,50 +349,45 @@ class UserMemory:
         key_discoveries: list[str] = None
     ):
         """会話履歴を追加"""
-        history = self.get_history(user_id)
         entry = ConversationSummary(
             session_id=session_id,
             service=service,
             summary=summary,
             key_discoveries=key_discoveries or []
         )
-        history.append(entry)
 
         # 最新100件のみ保持
-        if len(history) > 100:
-            history = history[-100:]
-
-        path = self._history_path(user_id)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump([h.model_dump() for h in history], f, ensure_ascii=False, indent=2)
+        snapshot = self._snapshot(user_id)
+        self.backend.append_history(user_id, entry.model_dump(), self.HISTORY_LIMIT)
+        self._write_through(user_id, snapshot, entry.created_at, history=[entry])
 
     # ==================== スキル管理 ====================
 
     def save_skill(self, user_id: str, skill_type: str, content: str):
         """スキルファイルを保存"""
-        path = self._skills_dir(user_id) / f"{skill_type}.md"
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(content)
+        self.backend.save_skill(user_id, skill_type, content)
+        self.cache.invalidate(("skills", user_id))
 
     def get_skill(self, user_id: str, skill_type: str) -> Optional[str]:
         """スキルファイルを取得"""
-        path = self._skills_dir(user_id) / f"{skill_type}.md"
-        if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                return f.read()
-        return None
+        return self.backend.load_skill(user_id, skill_type)
 
     def list_skills(self, user_id: str) -> list[str]:
         """スキル一覧を取得"""
-        skills_dir = self._skills_dir(user_id)
-        return [f.stem for f in skills_dir.glob("*.md")]
+        key = ("skills", user_id)
+        version = self.backend.version(user_id, "skills")
+        skills = self.cache.get(key, version)
+        if skills is None:
+            skills = self.backend.list_skills(user_id)
+            self.cache.put(key, version, skills, sum(len(s) for s in skills) + 64)
+        return list(skills)
 
     # ==================== ユーティリティ ====================
 
     def get_user_summary(self, user_id: str) -> dict:
         """ユーザーの概要情報を取得"""
-        profile = self.get_profile(user_id)
-        history = self.get_history(user_id)
+        profile = self._load_profile(user_id)
+        history = self._load_history(user_id)
         skills = self.list_skills(user_id)
 
         # 特性をタイプ別に整理
@@ -230,3 +410,26 @@ class UserMemory:
             ],
             "skills": skills
         }
+
+    # ==================== 非同期API ====================
+    # ファイルI/Oをイベントループ外（I/O用スレッドプール）で実行する
+    # 書き込みはユーザー単位のロック（lock=）で直列化する
+
+    get_profile_async = offload(get_profile)
+    save_profile_async = offload(save_profile, lock=("memory.profile", "profile.user_id"))
+    add_insight_async = offload(add_insight, lock=("memory.profile", "user_id"))
+    update_age_group_async = offload(update_age_group, lock=("memory.profile", "user_id"))
+    increment_conversation_count_async = offload(increment_conversation_count, lock=("memory.profile", "user_id"))
+    get_history_async = offload(get_history)
+    add_history_async = offload(add_history, lock=("memory.history", "user_id"))
+    save_skill_async = offload(save_skill, lock=("memory.skills", "user_id"))
+    get_skill_async = offload(get_skill)
+    list_skills_async = offload(list_skills)
+    get_user_summary_async = offload(get_user_summary)
+
+
+def _estimate_size(value) -> int:
+    """キャッシュ上限判定用の推定サイズ（JSONにした時のバイト数）"""
+    if isinstance(value, list):
+        return sum(_estimate_size(v) for v in value) + 64
+    return len(value.model_dump_json()) + 64
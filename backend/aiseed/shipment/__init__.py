@@ -6,5 +6,18 @@
 
 from .models import ShipmentInfo, ShipmentItem, Subscriber
 from .service import ShipmentService
+from .notifier import Notification, NotificationPipeline, DeliveryError, create_notifier
+from .outbox import NotificationOutbox, OutboxWorker
 
-__all__ = ["ShipmentInfo", "ShipmentItem", "Subscriber", "ShipmentService"]
+__all__ = [
+    "ShipmentInfo",
+    "ShipmentItem",
+    "Subscriber",
+    "ShipmentService",
+    "Notification",
+    "NotificationPipeline",
+    "DeliveryError",
+    "create_notifier",
+    "NotificationOutbox",
+    "OutboxWorker",
+]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+出荷情報の通知の送信待ち（outbox）のメンテナンス
+
+使用方法（backend/aiseed で実行）:
+    python -m shipment.maintenance stats                 # 状態ごとの件数・送信待ちの件数
+    python -m shipment.maintenance dead [--limit N]      # デッドレター（送信をあきらめた通知）の一覧
+    python -m shipment.maintenance replay [--id ID ...]  # デッドレターを送信待ちに戻す（--id 省略時は全件）
+    python -m shipment.maintenance purge [--days N]      # N日より前の送信済みを削除
+    python -m shipment.maintenance worker                # 送信ワーカーを動かす（Ctrl+Cで停止）
+
+サーバーの稼働中に実行してよい。worker は config.NOTIFICATIONS["outbox"]["worker"] を False にして
+APIサーバーとは別プロセスで送る場合に使う（SMTPの認証情報は .env から読む）。
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+# パスを追加（shipment, storage, configモジュールのため）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import NOTIFICATIONS, setup_logging
+from shipment.notifier import create_notifier
+from shipment.outbox import NotificationOutbox, OutboxWorker
+
+
+def stats(outbox: NotificationOutbox, args) -> bool:
+    """状態ごとの件数とチャネルごとの送信待ち"""
+    depth = outbox.depth()
+    print("  " + " ".join(f"{status}={depth[status]}" for status in ("pending", "sending", "sent", "dead")))
+    waiting = " ".join(f"{channel}={count}" for channel, count in depth["waiting_by_channel"].items())
+    print(f"  waiting: {waiting} oldest={depth['oldest_waiting_sec']}s")
+    return True
+
+
+def dead(outbox: NotificationOutbox, args) -> bool:
+    """デッドレターの一覧（新しい順）"""
+    letters = outbox.dead_letters(limit=args.limit)
+    for letter in letters:
+        updated = datetime.fromtimestamp(letter["updated_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        target = letter["target"] if letter["channel"] == "email" else "subscription"
+        print(
+            f"  id={letter['id']} {updated} {letter['channel']} farmer={letter['farmer_id']} "
+            f"shipment={letter['shipment_id']} to={target} attempts={letter['attempts']} - {letter['last_error']}"
+        )
+    if not letters:
+        print("  デッドレターなし")
+    return True
+
+
+def replay(outbox: NotificationOutbox, args) -> bool:
+    """デッドレターを送信待ちに戻す"""
+    count = outbox.replay(args.id)
+    print(f"  replayed={count}")
+    return True
+
+
+def purge(outbox: NotificationOutbox, args) -> bool:
+    """古い送信済みを削除"""
+    count = outbox.purge(args.days * 24 * 3600)
+    print(f"  purged={count}")
+    return True
+
+
+def worker(outbox: NotificationOutbox, args) -> bool:
+    """送信ワーカーを動かす（Ctrl+Cで取り出し済みの分を送り終えてから停止）"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    setup_logging()
+    config = NOTIFICATIONS["outbox"]
+
+    async def run():
+        notifier = create_notifier(
+            NOTIFICATIONS, os.environ.get("SMTP_USERNAME", ""), os.environ.get("SMTP_PASSWORD", "")
+        )
+        outbox_worker = OutboxWorker(
+            outbox,
+            notifier,
+            batch_size=config["batch_size"],
+            lease_sec=config["lease_sec"],
+            poll_interval_sec=config["poll_interval_sec"],
+            retention_sec=config["retention_sec"],
+        )
+        task = outbox_worker.start()
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            await outbox_worker.stop()
+        finally:
+            await notifier.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return True
+
+
+COMMANDS = {
+    "stats": stats,
+    "dead": dead,
+    "replay": replay,
+    "purge": purge,
+    "worker": worker,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出荷情報の通知の送信待ち（outbox）のメンテナンス")
+    parser.add_argument("command", choices=COMMANDS.keys())
+    parser.add_argument("--limit", type=int, default=50, help="dead: 表示する件数（既定: 50）")
+    parser.add_argument("--id", type=int, nargs="+", help="replay: 送信待ちに戻すID（省略時は全件）")
+    parser.add_argument("--days", type=float, default=7, help="purge: これより前の送信済みを削除（既定: 7日）")
+    parser.add_argument(
+        "--path", default=NOTIFICATIONS["outbox"]["path"],
+        help=f"送信待ちのファイル（既定: {NOTIFICATIONS['outbox']['path']}）"
+    )
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.path) and args.command != "worker":
+        print(f"エラー: 送信待ちのファイルが見つかりません: {args.path}")
+        sys.exit(1)
+
+    outbox = NotificationOutbox(args.path)
+
+    print(f"{args.command}:")
+    if not COMMANDS[args.command](outbox, args):
+        sys.exit(1)
+    print("完了")
+
+
+if __name__ == "__main__":
+    main()
@@ -72,6 +72,11 @@ class ShipmentPostStructuredRequest(BaseModel):
     note: Optional[str] = None
 
 
+class ShipmentBatchPostRequest(BaseModel):
+    """出荷情報の一括投稿リクエスト（自然言語、直売所・農協が1日分のメッセージをまとめて送る）"""
+    messages: list[ShipmentPostRequest]
+
+
 class SubscribeRequest(BaseModel):
     """購読登録リクエスト"""
     farmer_id: str
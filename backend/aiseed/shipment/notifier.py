@@ -0,0 +1,534 @@
+"""
+出荷情報の通知パイプライン
+
+購読者への通知（メール・Webプッシュ）を送信先ごとのバッチにまとめ、
+同時に送るバッチ数を制限して並行に送る。
+
+- 送信先（NotificationProvider）はバッチ単位で送る（SMTPは1接続、プッシュは1リクエスト）
+- 送信先ごとに1秒あたりの送信数を制限できる（トークンバケット）
+- 失敗した通知だけを指数バックオフ（ジッター付き）で再送する。宛先不正・購読切れなど
+  再送しても成功しないもの（DeliveryError(retryable=False)）は再送しない
+- submit() はバックグラウンドで送り始めてすぐに戻る（投稿APIは送信の完了を待たない）
+- 送信先ごとの送信数・失敗数・再送数・バッチの所要時間・スループットを stats() で返す
+
+送信先:
+- LogProvider: ログに出すだけ（開発用）
+- SMTPProvider: SMTPサーバー（smtplib をI/O用スレッドで実行）
+- HTTPPushProvider: プッシュ中継サーバー（Web Pushの暗号化・VAPID署名は中継側で行う）
+"""
+import asyncio
+import logging
+import random
+import smtplib
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.message import EmailMessage
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from storage import run_io
+from .models import NotificationResult
+
+logger = logging.getLogger("aiseed.shipment")
+
+CHANNELS = ("email", "push")
+
+
+@dataclass
+class Notification:
+    """1件の通知"""
+    channel: str  # "email" / "push"
+    target: Any  # メールアドレス / push_subscription
+    subject: str
+    message: str
+    farmer_id: str = ""
+    shipment_id: str = ""
+
+
+class DeliveryError(Exception):
+    """送信失敗（retryable=False なら再送しない）"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_retryable(error: Exception) -> bool:
+    return getattr(error, "retryable", True)
+
+
+# ==================== 送信先 ====================
+
+class NotificationProvider:
+    """送信先の基底クラス"""
+
+    kind = ""
+
+    def __init__(self, channel: str, batch_size: int = 100):
+        self.channel = channel
+        self.batch_size = batch_size
+
+    async def send_batch(self, batch: list[Notification]) -> list[Optional[Exception]]:
+        """
+        バッチを送信し、通知ごとの結果（成功はNone、失敗は例外）を同じ順で返す
+
+        バッチ全体が失敗した場合は例外を送出してよい（全件が同じ例外で失敗したものとして扱う）。
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LogProvider(NotificationProvider):
+    """ログに出すだけ（開発用）"""
+
+    kind = "log"
+
+    async def send_batch(self, batch: list[Notification]) -> list[Optional[Exception]]:
+        for notification in batch:
+            target = notification.target if self.channel == "email" else "subscription"
+            logger.info(f"[{self.channel.capitalize()}] Would send to {target}: {notification.message[:50]}...")
+        return [None] * len(batch)
+
+
+class SMTPProvider(NotificationProvider):
+    """SMTPサーバーへ送信（1バッチ = 1接続）"""
+
+    kind = "smtp"
+
+    def __init__(
+        self,
+        channel: str = "email",
+        batch_size: int = 50,
+        host: str = "localhost",
+        port: int = 25,
+        sender: str = "noreply@aiseed.dev",
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = False,
+        timeout_sec: float = 30
+    ):
+        super().__init__(channel, batch_size)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout_sec = timeout_sec
+
+    def _build_message(self, notification: Notification) -> EmailMessage:
+        mail = EmailMessage()
+        mail["From"] = self.sender
+        mail["To"] = notification.target
+        mail["Subject"] = notification.subject
+        mail.set_content(notification.message)
+        return mail
+
+    def _send_sync(self, batch: list[Notification]) -> list[Optional[Exception]]:
+        """
+        1接続でバッチを送る
+
+        接続・認証の失敗は例外のまま返す（まだ1通も送っていないのでバッチごと再試行してよい）。
+        送信途中で接続が切れた場合は、送れた分を成功とし、残りを再試行可能な失敗として返す。
+        """
+        results: list[Optional[Exception]] = []
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout_sec)
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            for notification in batch:
+                try:
+                    smtp.send_message(self._build_message(notification))
+                    results.append(None)
+                except smtplib.SMTPRecipientsRefused as e:
+                    results.append(DeliveryError(f"recipient refused: {e.recipients}", retryable=False))
+                except smtplib.SMTPResponseException as e:
+                    # 5xx は恒久的な失敗、4xx は一時的な失敗
+                    results.append(DeliveryError(f"{e.smtp_code} {e.smtp_error!r}", retryable=e.smtp_code < 500))
+                except OSError as e:
+                    # 切断・タイムアウト（SMTPServerDisconnected も OSError）: この通と以降は未送信
+                    error = DeliveryError(f"connection lost: {e!r}", retryable=True)
+                    results.extend([error] * (len(batch) - len(results)))
+                    break
+        finally:
+            # 切断後の QUIT 失敗で送信済みの結果を失わないよう、後始末の例外は握りつぶす
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+        return results
+
+    async def send_batch(self, batch: list[Notification]) -> list[Optional[Exception]]:
+        return await run_io(self._send_sync, batch)
+
+
+class HTTPPushProvider(NotificationProvider):
+    """
+    プッシュ中継サーバーへ送信（1バッチ = 1リクエスト）
+
+    POST {endpoint}
+        {"notifications": [{"subscription": {...}, "title": "...", "body": "..."}, ...]}
+    → {"results": [{"ok": true}, {"ok": false, "status": 410}, ...]}（省略時は全件成功、
+      ある場合は送った通知と同じ数・同じ順。数が合わなければバッチごと再送）
+
+    通知ごとの 404/410 は購読切れとして再送しない。
+    レスポンス全体の 429/5xx は再送、それ以外の 4xx は再送しない。
+    """
+
+    kind = "http"
+
+    def __init__(
+        self,
+        channel: str = "push",
+        batch_size: int = 100,
+        endpoint: str = "http://localhost:8002/push",
+        timeout_sec: float = 10
+    ):
+        super().__init__(channel, batch_size)
+        self.endpoint = endpoint
+        self.timeout_sec = timeout_sec
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout_sec)
+        return self._client
+
+    async def send_batch(self, batch: list[Notification]) -> list[Optional[Exception]]:
+        payload = {
+            "notifications": [
+                {"subscription": n.target, "title": n.subject, "body": n.message}
+                for n in batch
+            ]
+        }
+        try:
+            response = await self._get_client().post(self.endpoint, json=payload)
+        except httpx.HTTPError as e:
+            raise DeliveryError(f"push gateway: {e!r}") from e
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise DeliveryError(f"push gateway: HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise DeliveryError(f"push gateway: HTTP {response.status_code}", retryable=False)
+
+        results = response.json().get("results") if response.content else None
+        if results is None:
+            return [None] * len(batch)
+        if len(results) != len(batch):
+            # どの通知が届いたか分からない: 届いた扱いにせず再送する
+            raise DeliveryError(f"push gateway: {len(results)} results for {len(batch)} notifications")
+        return [
+            None if item.get("ok") else DeliveryError(
+                f"push: HTTP {item.get('status')}", retryable=item.get("status") not in (404, 410)
+            )
+            for item in results
+        ]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+NOTIFICATION_PROVIDERS = {
+    "log": LogProvider,
+    "smtp": SMTPProvider,
+    "http": HTTPPushProvider,
+}
+
+
+def create_provider(kind: str, channel: str, **kwargs) -> NotificationProvider:
+    """設定名から送信先を生成（"log" / "smtp" / "http"）"""
+    provider_class = NOTIFICATION_PROVIDERS.get(kind)
+    if provider_class is None:
+        raise ValueError(f"Unknown notification provider: {kind}")
+    if provider_class is LogProvider:
+        kwargs = {"batch_size": kwargs.get("batch_size", 100)}
+    return provider_class(channel=channel, **kwargs)
+
+
+# ==================== パイプライン ====================
+
+class RateLimiter:
+    """トークンバケット（1秒あたり rate 件、最大 burst 件まで貯められる）"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.updated = clock()
+
+    async def acquire(self, count: int):
+        """count 件分のトークンを取る（足りなければ貯まるまで待つ。待つ分は後の呼び出しにも引き継ぐ）"""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= count
+        if self.tokens < 0:
+            await self.sleep(-self.tokens / self.rate)
+
+
+class ChannelStats:
+    """送信先ごとの統計"""
+
+    def __init__(self, latency_window: int = 1024):
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self.latencies_ms: deque[float] = deque(maxlen=latency_window)
+
+    def as_dict(self) -> dict:
+        latencies = sorted(self.latencies_ms)
+
+        def pct(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))], 3)
+
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "batches": self.batches,
+            "batch_p50_ms": pct(50),
+            "batch_p95_ms": pct(95),
+        }
+
+
+class NotificationPipeline:
+    """通知の並行送信（送信先ごとのバッチ・同時送信数の制限・再送）"""
+
+    def __init__(
+        self,
+        providers: dict[str, NotificationProvider],
+        max_concurrency: int = 8,
+        max_attempts: int = 4,
+        backoff_base_sec: float = 0.5,
+        backoff_max_sec: float = 30.0,
+        rate_limits: Optional[dict[str, float]] = None,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep
+    ):
+        """
+        Args:
+            providers: チャネル（"email" / "push"）→ 送信先
+            max_concurrency: 同時に送るバッチ数（全チャネル合計）
+            rate_limits: チャネル → 1秒あたりの最大送信数（Noneや省略で無制限）
+            max_attempts: 1通知あたりの最大送信回数（初回を含む）
+            backoff_base_sec: 再送までの待ち時間の基準（attempt回目の失敗後 base × 2^(attempt-1)、ジッター付き）
+            backoff_max_sec: 再送までの待ち時間の上限
+        """
+        self.providers = providers
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base_sec = backoff_base_sec
+        self.backoff_max_sec = backoff_max_sec
+        self.sleep = sleep
+        self._limiters = {
+            channel: RateLimiter(rate, sleep=sleep)
+            for channel, rate in (rate_limits or {}).items() if rate
+        }
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._jobs: set[asyncio.Task] = set()
+
+        self._stats = {channel: ChannelStats() for channel in providers}
+        self.deliveries = 0
+        self.busy_sec = 0.0  # deliver にかかった時間の合計（スループットの分母）
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # イベントループ上で初めて使うときに作る
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def backoff(self, attempt: int) -> float:
+        """attempt回目の失敗後、再送までの待ち時間（秒）"""
+        delay = min(self.backoff_max_sec, self.backoff_base_sec * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    # ==================== 送信 ====================
+
+    async def _send_batch(
+        self,
+        channel: str,
+        batch: list[Notification],
+        max_attempts: int
+    ) -> list[Optional[Exception]]:
+        """1バッチを送信（失敗した通知だけを再送）"""
+        provider = self.providers[channel]
+        stats = self._stats[channel]
+        limiter = self._limiters.get(channel)
+        errors: list[Optional[Exception]] = [None] * len(batch)
+        pending = list(range(len(batch)))
+
+        for attempt in range(1, max_attempts + 1):
+            if limiter is not None:
+                await limiter.acquire(len(pending))
+            async with self._get_semaphore():
+                start = time.perf_counter()
+                try:
+                    results = await provider.send_batch([batch[i] for i in pending])
+                except Exception as e:
+                    results = [e] * len(pending)
+                if len(results) != len(pending):
+                    # 結果が足りない通知を送信済みと数えない（zip で黙って切り捨てない）
+                    logger.warning(f"[Notify] {channel} provider returned {len(results)} results for {len(pending)}")
+                    missing = DeliveryError(f"no result from {channel} provider")
+                    results = list(results[:len(pending)]) + [missing] * (len(pending) - len(results))
+                stats.latencies_ms.append((time.perf_counter() - start) * 1000)
+                stats.batches += 1
+
+            retry = []
+            for i, error in zip(pending, results):
+                errors[i] = error
+                if error is not None and is_retryable(error):
+                    retry.append(i)
+            if not retry or attempt == max_attempts:
+                break
+
+            stats.retried += len(retry)
+            delay = self.backoff(attempt)
+            logger.warning(
+                f"[Notify] {channel} retry {len(retry)}/{len(batch)} in {delay:.2f}s "
+                f"(attempt {attempt}/{max_attempts}) - {errors[retry[0]]}"
+            )
+            await self.sleep(delay)
+            pending = retry
+
+        sent = sum(1 for error in errors if error is None)
+        stats.sent += sent
+        stats.failed += len(batch) - sent
+        return errors
+
+    async def send(
+        self,
+        notifications: list[Notification],
+        max_attempts: Optional[int] = None
+    ) -> list[Optional[Exception]]:
+        """
+        通知を送信し、通知ごとの結果（成功はNone、失敗は最後の例外）を同じ順で返す
+
+        Args:
+            max_attempts: 1通知あたりの最大送信回数（省略時は self.max_attempts。
+                          呼び出し側で再送を管理する場合は1）
+        """
+        start = time.perf_counter()
+        jobs = []
+        for channel in CHANNELS:
+            indexes = [i for i, n in enumerate(notifications) if n.channel == channel]
+            if indexes and channel not in self.providers:
+                raise ValueError(f"No notification provider for channel: {channel}")
+            size = self.providers[channel].batch_size if indexes else 1
+            jobs += [(channel, indexes[i:i + size]) for i in range(0, len(indexes), size)]
+
+        batch_errors = await asyncio.gather(*(
+            self._send_batch(channel, [notifications[i] for i in indexes], max_attempts or self.max_attempts)
+            for channel, indexes in jobs
+        ))
+        errors: list[Optional[Exception]] = [None] * len(notifications)
+        for (_, indexes), results in zip(jobs, batch_errors):
+            for i, error in zip(indexes, results):
+                errors[i] = error
+
+        self.deliveries += 1
+        self.busy_sec += time.perf_counter() - start
+        return errors
+
+    async def deliver(self, notifications: list[Notification]) -> NotificationResult:
+        """通知を送信して結果を返す（全件の送信・再送が終わるまで待つ）"""
+        errors = await self.send(notifications)
+        result = NotificationResult(success=True)
+        for notification, error in zip(notifications, errors):
+            if error is None:
+                if notification.channel == "email":
+                    result.email_sent += 1
+                else:
+                    result.push_sent += 1
+            elif notification.channel == "email":
+                result.errors.append(f"Email to {notification.target}: {error}")
+            else:
+                result.errors.append(f"Push: {error}")
+        result.success = not result.errors
+        return result
+
+    def submit(self, farmer_id: str, notifications: list[Notification]) -> Optional[asyncio.Task]:
+        """バックグラウンドで送信を始めてすぐに戻る（通知がなければNone）"""
+        if not notifications:
+            return None
+
+        async def run():
+            result = await self.deliver(notifications)
+            logger.info(
+                f"[Notify] farmer={farmer_id} email={result.email_sent} "
+                f"push={result.push_sent} errors={len(result.errors)}"
+            )
+            return result
+
+        task = asyncio.ensure_future(run())
+        self._jobs.add(task)
+        task.add_done_callback(self._finish)
+        return task
+
+    def _finish(self, task: asyncio.Task):
+        self._jobs.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[Notify] delivery failed: {task.exception()}")
+
+    async def drain(self):
+        """バックグラウンドの送信が全て終わるまで待つ"""
+        while self._jobs:
+            await asyncio.gather(*list(self._jobs), return_exceptions=True)
+
+    async def close(self):
+        """送信中のものを待ってから送信先を閉じる"""
+        await self.drain()
+        for provider in self.providers.values():
+            await provider.close()
+
+    # ==================== 統計 ====================
+
+    def stats(self) -> dict:
+        """チャネルごとの送信数・失敗数・再送数・バッチの所要時間とスループット（/health 用）"""
+        sent = sum(s.sent for s in self._stats.values())
+        return {
+            "channels": {channel: s.as_dict() for channel, s in self._stats.items()},
+            "pending_jobs": len(self._jobs),
+            "deliveries": self.deliveries,
+            "throughput_per_sec": round(sent / self.busy_sec, 1) if self.busy_sec else 0.0,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+def create_notifier(config: dict, smtp_username: str = "", smtp_password: str = "") -> NotificationPipeline:
+    """config.NOTIFICATIONS から通知パイプラインを生成"""
+    providers = {}
+    rate_limits = {}
+    for channel in CHANNELS:
+        options = dict(config[channel])
+        kind = options.pop("provider")
+        rate_limits[channel] = options.pop("rate_per_sec", None)
+        if kind == "smtp":
+            options.update(username=smtp_username or None, password=smtp_password or None)
+        providers[channel] = create_provider(kind, channel, **options)
+    return NotificationPipeline(
+        providers,
+        max_concurrency=config["max_concurrency"],
+        max_attempts=config["max_attempts"],
+        backoff_base_sec=config["backoff_base_sec"],
+        backoff_max_sec=config["backoff_max_sec"],
+        rate_limits=rate_limits,
+    )
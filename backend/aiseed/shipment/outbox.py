@@ -0,0 +1,365 @@
+"""
+出荷情報の通知の送信待ち（アウトボックス）
+
+投稿と同じ処理の中で通知を SQLite（WALモード）に書き込み、送信は OutboxWorker が
+別に行う。投稿APIは送信先の遅さ・障害の影響を受けず、プロセスが落ちても通知は失われない。
+
+- 重複排除: 同じ出荷情報・同じチャネル・同じ宛先の通知は1件だけ登録する
+- 取り出し（claim）はリース付き。送信中にワーカーが落ちてもリースが切れたら再送する
+  （少なくとも1回は届ける。まれに二重に届くことがある）
+- 失敗した通知は指数バックオフで再送し、max_attempts 回失敗したもの・再送しても
+  成功しないもの（宛先不正・購読切れ）は dead（デッドレター）にする
+- dead の確認・再送は python -m shipment.maintenance dead / replay
+
+複数のワーカー（uvicorn --workers N、別プロセスのワーカー）が同じファイルを使ってよい。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from storage import run_io
+from .notifier import Notification, NotificationPipeline, CHANNELS, is_retryable
+
+logger = logging.getLogger("aiseed.shipment")
+
+STATUSES = ("pending", "sending", "sent", "dead")
+
+
+def dedupe_key(notification: Notification) -> str:
+    """重複排除のキー（出荷情報ID + チャネル + 宛先）"""
+    target = json.dumps(notification.target, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha256()
+    for part in (notification.shipment_id, notification.channel, target):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class OutboxEntry:
+    """取り出した通知"""
+    id: int
+    attempts: int  # これまでの送信回数
+    notification: Notification
+
+
+class NotificationOutbox:
+    """通知の送信待ち（SQLite）"""
+
+    # status: pending（送信待ち） / sending（送信中） / sent（送信済み） / dead（デッドレター）
+    # available_at: pending は次に送れる時刻、sending はリースの期限
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dedupe_key TEXT NOT NULL UNIQUE,
+        channel TEXT NOT NULL,
+        target TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        message TEXT NOT NULL,
+        farmer_id TEXT NOT NULL,
+        shipment_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_ready ON outbox (status, available_at);
+    """
+
+    def __init__(
+        self,
+        path: str = "shipment_data/notification_outbox.db",
+        clock: Callable[[], float] = time.time
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.clock = clock
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """スレッドローカルな接続を取得"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ==================== 登録・取り出し ====================
+
+    def enqueue(self, notifications: list[Notification]) -> int:
+        """通知を登録（登録済みの重複は無視）。新しく登録した件数を返す"""
+        if not notifications:
+            return 0
+        now = self.clock()
+        conn = self._conn()
+        before = conn.total_changes
+        with conn:
+            conn.executemany(
+                """INSERT INTO outbox (dedupe_key, channel, target, subject, message, farmer_id, shipment_id,
+                                       status, attempts, available_at, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', 0, ?, ?, ?)
+                   ON CONFLICT (dedupe_key) DO NOTHING""",
+                [
+                    (
+                        dedupe_key(n), n.channel, json.dumps(n.target, ensure_ascii=False), n.subject,
+                        n.message, n.farmer_id, n.shipment_id, now, now, now
+                    )
+                    for n in notifications
+                ]
+            )
+        return conn.total_changes - before
+
+    def claim(self, limit: int, lease_sec: float) -> list[OutboxEntry]:
+        """
+        送信できる通知を最大 limit 件取り出す（古い順）
+
+        取り出した通知は lease_sec の間ほかのワーカーに渡さない。
+        リースが切れた sending（送信中にワーカーが落ちたもの）も取り出す。
+        """
+        now = self.clock()
+        conn = self._conn()
+        with conn:
+            rows = conn.execute(
+                """UPDATE outbox SET status = 'sending', available_at = ?, updated_at = ?
+                   WHERE id IN (
+                       SELECT id FROM outbox
+                       WHERE status IN ('pending', 'sending') AND available_at <= ?
+                       ORDER BY available_at, id LIMIT ?)
+                   RETURNING id, attempts, channel, target, subject, message, farmer_id, shipment_id""",
+                (now + lease_sec, now, now, limit)
+            ).fetchall()
+        rows.sort()
+        return [
+            OutboxEntry(
+                id=row[0],
+                attempts=row[1],
+                notification=Notification(
+                    channel=row[2], target=json.loads(row[3]), subject=row[4], message=row[5],
+                    farmer_id=row[6], shipment_id=row[7],
+                ),
+            )
+            for row in rows
+        ]
+
+    def complete(
+        self,
+        entries: list[OutboxEntry],
+        errors: list[Optional[Exception]],
+        max_attempts: int,
+        backoff: Callable[[int], float]
+    ) -> dict[str, int]:
+        """
+        送信結果を記録する
+
+        失敗は backoff(送信回数) 秒後に再送、max_attempts 回目の失敗と再送しても成功しない失敗は dead。
+        Returns: {"sent", "retry", "dead"} の件数
+        """
+        now = self.clock()
+        sent, retry, dead = [], [], []
+        for entry, error in zip(entries, errors):
+            attempts = entry.attempts + 1
+            if error is None:
+                sent.append((attempts, now, entry.id))
+            elif is_retryable(error) and attempts < max_attempts:
+                retry.append((attempts, now + backoff(attempts), str(error), now, entry.id))
+            else:
+                dead.append((attempts, str(error), now, entry.id))
+
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', attempts = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                sent
+            )
+            conn.executemany(
+                """UPDATE outbox SET status = 'pending', attempts = ?, available_at = ?, last_error = ?, updated_at = ?
+                   WHERE id = ?""",
+                retry
+            )
+            conn.executemany(
+                "UPDATE outbox SET status = 'dead', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                dead
+            )
+        return {"sent": len(sent), "retry": len(retry), "dead": len(dead)}
+
+    # ==================== 確認・再送・削除 ====================
+
+    def depth(self) -> dict:
+        """状態ごとの件数、チャネルごとの送信待ち件数、最も古い送信待ちの経過秒数"""
+        conn = self._conn()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        waiting = dict.fromkeys(CHANNELS, 0)
+        waiting.update(conn.execute(
+            "SELECT channel, COUNT(*) FROM outbox WHERE status IN ('pending', 'sending') GROUP BY channel"
+        ).fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'sending')"
+        ).fetchone()[0]
+        return {
+            **counts,
+            "waiting_by_channel": waiting,
+            "oldest_waiting_sec": round(self.clock() - oldest, 1) if oldest is not None else 0.0,
+        }
+
+    def dead_letters(self, limit: int = 50) -> list[dict]:
+        """dead の通知（新しい順）"""
+        rows = self._conn().execute(
+            """SELECT id, channel, target, farmer_id, shipment_id, attempts, last_error, updated_at
+               FROM outbox WHERE status = 'dead' ORDER BY updated_at DESC, id DESC LIMIT ?""",
+            (limit,)
+        ).fetchall()
+        keys = ("id", "channel", "target", "farmer_id", "shipment_id", "attempts", "last_error", "updated_at")
+        letters = [dict(zip(keys, row)) for row in rows]
+        for letter in letters:
+            letter["target"] = json.loads(letter["target"])
+        return letters
+
+    def replay(self, ids: Optional[list[int]] = None) -> int:
+        """dead の通知を送信待ちに戻す（ids 省略時は全件）。戻した件数を返す"""
+        now = self.clock()
+        conn = self._conn()
+        query = "UPDATE outbox SET status = 'pending', attempts = 0, available_at = ?, updated_at = ? WHERE status = 'dead'"
+        params: list = [now, now]
+        if ids is not None:
+            if not ids:
+                return 0
+            query += f" AND id IN ({', '.join('?' * len(ids))})"
+            params += ids
+        with conn:
+            return conn.execute(query, params).rowcount
+
+    def purge(self, older_than_sec: float) -> int:
+        """送信済みで older_than_sec より古いものを削除（削除した件数を返す）"""
+        conn = self._conn()
+        with conn:
+            return conn.execute(
+                "DELETE FROM outbox WHERE status = 'sent' AND updated_at < ?",
+                (self.clock() - older_than_sec,)
+            ).rowcount
+
+    def close(self):
+        """このスレッドの接続を閉じる"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class OutboxWorker:
+    """送信待ちの通知を取り出して送るバックグラウンドワーカー（asyncio）"""
+
+    def __init__(
+        self,
+        outbox: NotificationOutbox,
+        pipeline: NotificationPipeline,
+        batch_size: int = 200,
+        lease_sec: float = 300,
+        poll_interval_sec: float = 1.0,
+        retention_sec: float = 7 * 24 * 3600,
+        purge_interval_sec: float = 3600
+    ):
+        """
+        Args:
+            outbox: 送信待ち
+            pipeline: 送信に使うパイプライン（同時送信数・送信数の制限・バックオフはこの設定）
+            batch_size: 1回に取り出す件数
+            lease_sec: 取り出した通知を他のワーカーに渡さない時間（送信にかかる時間より長く）
+            poll_interval_sec: 送信待ちがないときに確認する間隔（wake() で即座に確認）
+            retention_sec: 送信済みを残しておく期間
+        """
+        self.outbox = outbox
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        self.lease_sec = lease_sec
+        self.poll_interval_sec = poll_interval_sec
+        self.retention_sec = retention_sec
+        self.purge_interval_sec = purge_interval_sec
+
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+
+        self.counts = {"processed": 0, "sent": 0, "retry": 0, "dead": 0}
+
+    def wake(self):
+        """送信待ちが増えたことを知らせる（次の確認を待たずに取り出す）"""
+        self._wake.set()
+
+    async def run_once(self) -> int:
+        """1回分を取り出して送る（取り出した件数を返す）"""
+        entries = await run_io(self.outbox.claim, self.batch_size, self.lease_sec)
+        if not entries:
+            return 0
+        # 再送はアウトボックス側で管理する（パイプラインでは再送しない）
+        errors = await self.pipeline.send([entry.notification for entry in entries], max_attempts=1)
+        counts = await run_io(
+            self.outbox.complete, entries, errors, self.pipeline.max_attempts, self.pipeline.backoff
+        )
+        self.counts["processed"] += len(entries)
+        for key, value in counts.items():
+            self.counts[key] += value
+        logger.info(
+            f"[Outbox] processed={len(entries)} sent={counts['sent']} retry={counts['retry']} dead={counts['dead']}"
+        )
+        return len(entries)
+
+    async def _purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval_sec:
+            return
+        self._last_purge = now
+        purged = await run_io(self.outbox.purge, self.retention_sec)
+        if purged:
+            logger.info(f"[Outbox] purged sent={purged}")
+
+    async def run(self):
+        """stop() まで送信待ちを送り続ける"""
+        logger.info(f"[Outbox] worker started path={self.outbox.path}")
+        while not self._stopping:
+            try:
+                processed = await self.run_once()
+                await self._purge()
+            except Exception as e:
+                logger.error(f"[Outbox] worker error: {e}")
+                processed = 0
+            if not processed and not self._stopping:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval_sec)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info("[Outbox] worker stopped")
+
+    def start(self) -> asyncio.Task:
+        """イベントループ上でワーカーを動かし始める"""
+        self._stopping = False
+        self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def stop(self):
+        """取り出し済みの分を送り終えてから止める"""
+        self._stopping = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        """ワーカーの処理件数（/health 用）"""
+        return {**self.counts, "running": self._task is not None and not self._task.done()}
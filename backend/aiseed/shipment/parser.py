@@ -3,33 +3,48 @@
 
 自然言語から出荷情報を抽出する
 AIを使った解析とルールベースの解析を組み合わせる
+
+ルールベースを先に実行し、確信度（parse_scored）が SHIPMENT_PARSER["ai_confidence_threshold"] 未満の
+ときだけAIで解析する（parse_with_ai）。経路ごとの件数と、AIを呼ばずに済んだ時間は cascade_stats に集計する。
+
+一括解析（parse_many_async）:
+- ルールベースは件数が多いとプロセスプールで分割して解析する（イベントループを塞がない）
+- 確信度が低いメッセージは、複数件を1回のAI呼び出しにまとめて解析する
+- 解析できたものから順に返す
 """
-import re
+import asyncio
+import json
 import logging
+import multiprocessing
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import AsyncIterator, Optional
 
+from config import SHIPMENT_PARSER, setup_logging
 from .models import ShipmentInfo, ShipmentItem
+from .vocabulary import VEGETABLES, VegetableMatcher, default_matcher
 
 logger = logging.getLogger("aiseed.shipment.parser")
 
+# 辞書にない商品の汎用パターン: 「〇〇 100円」
+GENERIC_ITEM_PATTERN = re.compile(r"([\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]+)\s*(\d+)\s*円")
+GENERIC_EXCLUDED = {"合計", "計", "税", "送料"}
+
+# メッセージ中の価格（確信度の計算で、商品にできた価格の割合を出す）
+PRICE_PATTERN = re.compile(r"\d{1,3}(?:,\d{3})+\s*円|\d+\s*円")
+
+# 場所として取り出した文字列に商品・述語まで入っている（「道の駅ひまわりにトマト100円…」など）
+LOCATION_NOISE_PATTERN = re.compile(r"[\d円]|[にでへは](?:出|並|お休み)|(?:です|ます|した)$|[にでへ]$")
+
 
 class ShipmentParser:
     """出荷情報パーサー"""
 
-    # よくある野菜名
-    VEGETABLES = [
-        "トマト", "ミニトマト", "きゅうり", "キュウリ", "なす", "ナス",
-        "ピーマン", "パプリカ", "にんじん", "ニンジン", "人参",
-        "大根", "だいこん", "白菜", "はくさい", "キャベツ",
-        "レタス", "ほうれん草", "ホウレンソウ", "小松菜", "こまつな",
-        "ねぎ", "ネギ", "玉ねぎ", "タマネギ", "にんにく", "ニンニク",
-        "じゃがいも", "ジャガイモ", "さつまいも", "サツマイモ",
-        "かぼちゃ", "カボチャ", "ズッキーニ", "とうもろこし",
-        "枝豆", "えだまめ", "いんげん", "オクラ", "ゴーヤ",
-        "しそ", "シソ", "大葉", "バジル", "パセリ",
-        "いちご", "イチゴ", "ブルーベリー", "みかん", "りんご",
-    ]
+    # よくある野菜名（辞書の本体は vocabulary.VEGETABLES）
+    VEGETABLES = VEGETABLES
 
     # 直売所のパターン
     LOCATION_PATTERNS = [
@@ -41,6 +56,13 @@ class ShipmentParser:
         r"[\w]+市場",
     ]
 
+    def __init__(self, matcher: Optional[VegetableMatcher] = None):
+        """
+        Args:
+            matcher: 野菜名の辞書（省略時は VEGETABLES と config.SHIPMENT_PARSER の作物データセット）
+        """
+        self.matcher = matcher or default_matcher(SHIPMENT_PARSER["crop_dataset"])
+
     def parse(self, farmer_id: str, message: str) -> Optional[ShipmentInfo]:
         """
         自然言語から出荷情報を抽出
@@ -49,6 +71,38 @@ class ShipmentParser:
         - 「今日10時に道の駅ひまわりにトマト100円とナス150円出します」
         - 「明日の朝、JA直売所でキュウリ3本100円」
         """
+        shipment, _ = self.parse_scored(farmer_id, message)
+        if shipment is None:
+            logger.warning(f"Could not parse: {message[:50]}...")
+        return shipment
+
+    def parse_many(self, messages: list[tuple[str, str]]) -> list[Optional[ShipmentInfo]]:
+        """
+        複数のメッセージを解析（同期・このプロセス内で順に）
+
+        解析できなかったメッセージは1件ずつログに出さない（件数は呼び出し側で集計する）
+
+        Args:
+            messages: (farmer_id, message) のリスト
+
+        Returns:
+            messages と同じ順の解析結果（解析できなかったものは None）
+        """
+        return [shipment for shipment, _ in self.parse_many_scored(messages)]
+
+    def parse_many_scored(self, messages: list[tuple[str, str]]) -> list[tuple[Optional[ShipmentInfo], float]]:
+        """parse_many の結果に確信度を付けたもの"""
+        return [self.parse_scored(farmer_id, message) for farmer_id, message in messages]
+
+    def parse_scored(self, farmer_id: str, message: str) -> tuple[Optional[ShipmentInfo], float]:
+        """
+        自然言語から出荷情報を抽出し、確信度（0〜1）を付ける（解析できなければ (None, 0.0)）
+
+        確信度 = 場所 + 商品 + 価格の網羅
+        - 場所: 0.4（取り出せた）/ 0.2（商品・述語まで入っている）/ 0
+        - 商品: 0.4（辞書の野菜名）/ 0.2（汎用パターンのみ）/ 0
+        - 価格の網羅: 0.2 × 商品にできた価格 / メッセージ中の価格
+        """
         try:
             # 日付を抽出
             date = self._parse_date(message)
@@ -59,12 +113,21 @@ class ShipmentParser:
             # 場所を抽出
             location = self._parse_location(message)
 
-            # 商品を抽出
-            items = self._parse_items(message)
+            # 商品を抽出（辞書の野菜名、なければ汎用パターン）
+            items = self.matcher.find_items(message)
+            from_dictionary = bool(items)
+            if not items:
+                items = self._parse_generic_items(message)
 
             if not location and not items:
-                logger.warning(f"Could not parse: {message[:50]}...")
-                return None
+                return None, 0.0
+
+            prices = len(PRICE_PATTERN.findall(unicodedata.normalize("NFKC", message)))
+            confidence = (
+                (0.0 if not location else 0.2 if LOCATION_NOISE_PATTERN.search(location) else 0.4)
+                + (0.0 if not items else 0.4 if from_dictionary else 0.2)
+                + (0.2 * min(1.0, len(items) / prices) if prices else 0.0)
+            )
 
             return ShipmentInfo(
                 farmer_id=farmer_id,
@@ -72,11 +135,11 @@ class ShipmentParser:
                 time=time,
                 location_name=location or "直売所",
                 items=items,
-            )
+            ), round(confidence, 3)
 
         except Exception as e:
             logger.error(f"Parse error: {e}")
-            return None
+            return None, 0.0
 
     def _parse_date(self, message: str) -> str:
         """日付を抽出"""
@@ -162,74 +225,156 @@ class ShipmentParser:
         return None
 
     def _parse_items(self, message: str) -> list[ShipmentItem]:
-        """商品を抽出"""
-        items = []
+        """商品を抽出（辞書の野菜名を1回の走査で、なければ汎用パターンで）"""
+        return self.matcher.find_items(message) or self._parse_generic_items(message)
 
-        # 野菜名 + 価格のパターン
-        for veg in self.VEGETABLES:
-            # 「トマト100円」「トマト 100円」
-            pattern = rf"{veg}\s*(\d+)\s*円"
-            match = re.search(pattern, message)
-            if match:
-                items.append(ShipmentItem(
-                    name=veg,
-                    price=int(match.group(1)),
-                ))
+    def _parse_generic_items(self, message: str) -> list[ShipmentItem]:
+        """汎用パターン: 「〇〇 100円」"""
+        items = []
+        for match in GENERIC_ITEM_PATTERN.finditer(unicodedata.normalize("NFKC", message)):
+            name = match.group(1)
+            # 除外ワード
+            if name in GENERIC_EXCLUDED:
                 continue
+            items.append(ShipmentItem(
+                name=name,
+                price=int(match.group(2)),
+            ))
+        return items
 
-            # 「トマト3個100円」「トマト 3個 100円」
-            pattern = rf"{veg}\s*(\d+)\s*(個|袋|本|束|パック|kg|g)\s*(\d+)\s*円"
-            match = re.search(pattern, message)
-            if match:
-                items.append(ShipmentItem(
-                    name=veg,
-                    price=int(match.group(3)),
-                    quantity=match.group(1),
-                    unit=match.group(2),
-                ))
-
-        # 汎用パターン: 「〇〇 100円」
-        if not items:
-            pattern = r"([\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]+)\s*(\d+)\s*円"
-            for match in re.finditer(pattern, message):
-                name = match.group(1)
-                # 除外ワード
-                if name in ["合計", "計", "税", "送料"]:
-                    continue
-                items.append(ShipmentItem(
-                    name=name,
-                    price=int(match.group(2)),
-                ))
 
-        return items
+# ==================== AI解析 ====================
+
+AI_SHIPMENT_SCHEMA = """{
+    "date": "YYYY-MM-DD",
+    "time": "HH:MM" or null,
+    "location_name": "場所名",
+    "location_address": "住所" or null,
+    "items": [
+        {"name": "商品名", "price": 価格(数値), "unit": "単位", "quantity": "数量" or null}
+    ],
+    "note": "備考" or null
+}"""
+
+
+def _shipment_from_ai(farmer_id: str, data: dict) -> ShipmentInfo:
+    """AIが返したJSON（AI_SHIPMENT_SCHEMA）から出荷情報を作る"""
+    items = [
+        ShipmentItem(**item)
+        for item in data.get("items", [])
+    ]
+
+    return ShipmentInfo(
+        farmer_id=farmer_id,
+        date=data.get("date") or datetime.now().strftime("%Y-%m-%d"),
+        time=data.get("time"),
+        location_name=data.get("location_name") or "直売所",
+        location_address=data.get("location_address"),
+        items=items,
+        note=data.get("note"),
+    )
+
+
+class CascadeStats:
+    """ルールベース → AI の経路ごとの件数と時間（/health 用）"""
+
+    PATHS = ("rules", "ai", "fallback")
+
+    def __init__(self):
+        # rules: 確信度が閾値以上でAIを呼ばなかった / ai: AIの結果を使った / fallback: AIが失敗しルールベースの結果を使った
+        self.counts = {path: 0 for path in self.PATHS}
+        self.rule_ms = 0.0
+        self.ai_ms = 0.0
+
+    def record(self, path: str, rule_ms: float, ai_ms: float = 0.0, count: int = 1):
+        """count 件の判定を記録（rule_ms・ai_ms は1件あたり）"""
+        self.counts[path] += count
+        self.rule_ms += rule_ms * count
+        self.ai_ms += ai_ms * count
+
+    @property
+    def decisions(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def rules_rate(self) -> float:
+        """AIを呼ばずに済んだ割合"""
+        return self.counts["rules"] / self.decisions if self.decisions else 0.0
+
+    @property
+    def avg_ai_ms(self) -> float:
+        """AIで解析した1件あたりの時間"""
+        called = self.counts["ai"] + self.counts["fallback"]
+        return self.ai_ms / called if called else 0.0
+
+    def stats(self) -> dict:
+        return {
+            **self.counts,
+            "rules_rate": round(self.rules_rate, 3),
+            "avg_rule_ms": round(self.rule_ms / self.decisions, 3) if self.decisions else 0.0,
+            "avg_ai_ms": round(self.avg_ai_ms, 3),
+            # AIを呼ばなかった件数 × AIで解析した1件あたりの時間（見積もり）
+            "saved_ms": round(self.counts["rules"] * self.avg_ai_ms, 1),
+        }
+
+
+cascade_stats = CascadeStats()
 
 
 async def parse_with_ai(
     farmer_id: str,
     message: str,
-    ai_query_func
+    ai_query_func,
+    threshold: Optional[float] = None
 ) -> Optional[ShipmentInfo]:
     """
-    AIを使って出荷情報を解析
+    出荷情報を解析（ルールベースの確信度が低いときだけAIを使う）
 
-    より複雑な文章や曖昧な表現に対応
+    より複雑な文章や曖昧な表現に対応。ルールベースの確信度（ShipmentParser.parse_scored）が
+    threshold（省略時は SHIPMENT_PARSER["ai_confidence_threshold"]）以上ならAIを呼ばない。
+    AIの解析に失敗したときはルールベースの結果を返す。
     """
+    threshold = SHIPMENT_PARSER["ai_confidence_threshold"] if threshold is None else threshold
+
+    start = time.perf_counter()
+    shipment, confidence = ShipmentParser().parse_scored(farmer_id, message)
+    rule_ms = (time.perf_counter() - start) * 1000
+
+    if shipment is not None and confidence >= threshold:
+        cascade_stats.record("rules", rule_ms)
+        logger.info(
+            f"[Parser] path=rules confidence={confidence:.2f} rules={rule_ms:.2f}ms "
+            f"saved~{cascade_stats.avg_ai_ms:.0f}ms (rules_rate={cascade_stats.rules_rate:.0%} "
+            f"of {cascade_stats.decisions})"
+        )
+        return shipment
+
+    start = time.perf_counter()
+    parsed = await _query_ai(farmer_id, message, ai_query_func)
+    ai_ms = (time.perf_counter() - start) * 1000
+
+    path = "ai" if parsed is not None else "fallback"
+    cascade_stats.record(path, rule_ms, ai_ms)
+    logger.info(
+        f"[Parser] path={path} confidence={confidence:.2f} rules={rule_ms:.2f}ms ai={ai_ms:.0f}ms "
+        f"(rules_rate={cascade_stats.rules_rate:.0%} of {cascade_stats.decisions})"
+    )
+
+    # フォールバック: ルールベース
+    if parsed is None and shipment is None:
+        logger.warning(f"Could not parse: {message[:50]}...")
+    return parsed or shipment
+
+
+async def _query_ai(farmer_id: str, message: str, ai_query_func) -> Optional[ShipmentInfo]:
+    """1件のメッセージをAIで解析（失敗したら None）"""
     prompt = f'''
 以下のメッセージから出荷情報を抽出してください。
 
 メッセージ: {message}
 
 JSON形式で出力してください:
-{{
-    "date": "YYYY-MM-DD",
-    "time": "HH:MM" or null,
-    "location_name": "場所名",
-    "location_address": "住所" or null,
-    "items": [
-        {{"name": "商品名", "price": 価格(数値), "unit": "単位", "quantity": "数量" or null}}
-    ],
-    "note": "備考" or null
-}}
+{AI_SHIPMENT_SCHEMA}
 
 今日の日付: {datetime.now().strftime("%Y-%m-%d")}
 '''
@@ -237,30 +382,215 @@ JSON形式で出力してください:
     try:
         response = await ai_query_func(prompt)
 
-        import json
         # JSONを抽出
         json_match = re.search(r'\{[\s\S]*\}', response)
         if json_match:
-            data = json.loads(json_match.group())
+            return _shipment_from_ai(farmer_id, json.loads(json_match.group()))
 
-            items = [
-                ShipmentItem(**item)
-                for item in data.get("items", [])
-            ]
+    except Exception as e:
+        logger.error(f"AI parse error: {e}")
 
-            return ShipmentInfo(
-                farmer_id=farmer_id,
-                date=data.get("date", datetime.now().strftime("%Y-%m-%d")),
-                time=data.get("time"),
-                location_name=data.get("location_name", "直売所"),
-                location_address=data.get("location_address"),
-                items=items,
-                note=data.get("note"),
-            )
+    return None
+
+
+async def parse_many_with_ai(
+    messages: list[tuple[str, str]],
+    ai_query_func
+) -> list[Optional[ShipmentInfo]]:
+    """
+    複数のメッセージを1回のAI呼び出しでまとめて解析
+
+    メッセージに番号を付けて1つのプロンプトにまとめ、番号ごとのJSONを返させる。
+    1件ずつ呼ぶのに比べて、指示文・スキーマの分のトークンと呼び出しの待ち時間が件数で割られる。
+
+    Args:
+        messages: (farmer_id, message) のリスト
+        ai_query_func: プロンプトを受け取り応答の文字列を返す関数
+
+    Returns:
+        messages と同じ順の解析結果（AIが解析できなかったもの・応答に無かったものは None）
+    """
+    numbered = "\n".join(
+        f"[{index}] {' '.join(message.split())}" for index, (_, message) in enumerate(messages)
+    )
+    prompt = f'''
+以下の{len(messages)}件のメッセージから、それぞれ出荷情報を抽出してください。
+各メッセージの先頭の [番号] は index として返してください。
+
+{numbered}
+
+JSON形式で出力してください（メッセージごとに1件、出荷情報でないものは shipment を null）:
+{{"results": [{{"index": 番号, "shipment": {AI_SHIPMENT_SCHEMA} or null}}]}}
+
+今日の日付: {datetime.now().strftime("%Y-%m-%d")}
+'''
 
+    results: list[Optional[ShipmentInfo]] = [None] * len(messages)
+    try:
+        response = await ai_query_func(prompt)
+        json_match = re.search(r'\{[\s\S]*\}', response)
+        if not json_match:
+            logger.error(f"AI batch parse error: no JSON in response ({len(messages)} messages)")
+            return results
+        entries = json.loads(json_match.group()).get("results") or []
     except Exception as e:
-        logger.error(f"AI parse error: {e}")
+        logger.error(f"AI batch parse error: {e}")
+        return results
 
-    # フォールバック: ルールベース
-    parser = ShipmentParser()
-    return parser.parse(farmer_id, message)
+    # 1件の形式の誤りで他の結果を捨てない
+    for entry in entries:
+        try:
+            index = int(entry["index"])
+            if 0 <= index < len(messages) and entry.get("shipment"):
+                results[index] = _shipment_from_ai(messages[index][0], entry["shipment"])
+        except Exception as e:
+            logger.warning(f"AI batch parse: skipped entry {entry!r:.80}: {e}")
+
+    return results
+
+
+# ==================== 一括解析 ====================
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: サーバーのスレッド（I/Oプール等）を fork で引き継がない
+        # 各プロセスは起動時に野菜名の辞書を1度だけコンパイルする
+        _pool = ProcessPoolExecutor(
+            max_workers=SHIPMENT_PARSER["process_workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(SHIPMENT_PARSER["crop_dataset"],),
+        )
+        logger.info(f"[Parser] process pool max_workers={SHIPMENT_PARSER['process_workers']}")
+    return _pool
+
+
+def shutdown_parse_pool():
+    """一括解析のプロセスプールを停止（終了時に呼ぶ）"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def _init_worker(crop_dataset: Optional[str]):
+    """プロセスプールの各プロセスの初期化（ログの設定と辞書のコンパイル）"""
+    setup_logging()
+    default_matcher(crop_dataset)
+
+
+def _parse_chunk(messages: list[tuple[str, str]]) -> tuple[list[tuple[Optional[ShipmentInfo], float]], float]:
+    """プロセスプールで実行する解析（辞書はプロセスごとにキャッシュ済み）。(確信度付きの結果, かかった時間ms)"""
+    start = time.perf_counter()
+    results = ShipmentParser().parse_many_scored(messages)
+    return results, (time.perf_counter() - start) * 1000
+
+
+async def _as_completed(coroutines: list) -> AsyncIterator:
+    """完了した順に結果を返す（途中で読むのをやめたら残りはキャンセル）"""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        for future in asyncio.as_completed(tasks):
+            yield await future
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def parse_many_async(
+    messages: list[tuple[str, str]],
+    ai_query_func=None,
+    threshold: Optional[float] = None
+) -> AsyncIterator[tuple[int, Optional[ShipmentInfo]]]:
+    """
+    複数のメッセージを解析し、解析できたものから順に返す
+
+    1. ルールベース: process_pool_min_batch 件以上ならプロセスプールで chunk_size 件ずつ、
+       それ未満ならこのプロセスで解析する。確信度が threshold 以上のものはそのまま返す
+    2. 確信度が低いもの: ai_query_func があれば ai_batch_size 件ずつ
+       1回のAI呼び出しにまとめて解析する（呼び出しは並行、同時実行数はモデルの待ち行列で制限）。
+       AIが解析できなかったものはルールベースの結果を返す
+
+    Args:
+        messages: (farmer_id, message) のリスト
+        ai_query_func: プロンプトを受け取り応答の文字列を返す関数（Noneならルールベースのみ）
+        threshold: AIを使わない確信度（省略時は SHIPMENT_PARSER["ai_confidence_threshold"]）
+
+    Yields:
+        (messages の添字, 解析結果)。全件について1回ずつ、完了した順に返す（解析できなかったものは None）
+    """
+    threshold = SHIPMENT_PARSER["ai_confidence_threshold"] if threshold is None else threshold
+    if ai_query_func is None:
+        threshold = 0.0
+
+    # 確信度が低いもの: 添字 → ルールベースの結果
+    uncertain: dict[int, Optional[ShipmentInfo]] = {}
+    rule_ms = 0.0
+    use_pool = len(messages) >= SHIPMENT_PARSER["process_pool_min_batch"]
+
+    def accept(start: int, results: list[tuple[Optional[ShipmentInfo], float]]):
+        for offset, (shipment, confidence) in enumerate(results):
+            if shipment is not None and confidence >= threshold:
+                yield start + offset, shipment
+            else:
+                uncertain[start + offset] = shipment
+
+    if not use_pool:
+        started = time.perf_counter()
+        results = ShipmentParser().parse_many_scored(messages)
+        rule_ms = (time.perf_counter() - started) * 1000
+        for accepted in accept(0, results):
+            yield accepted
+    else:
+        loop = asyncio.get_running_loop()
+        size = SHIPMENT_PARSER["chunk_size"]
+
+        async def run_chunk(start: int) -> tuple[int, tuple]:
+            chunk = messages[start:start + size]
+            return start, await loop.run_in_executor(_get_pool(), _parse_chunk, chunk)
+
+        async for start, (results, chunk_ms) in _as_completed(
+            [run_chunk(start) for start in range(0, len(messages), size)]
+        ):
+            rule_ms += chunk_ms
+            for accepted in accept(start, results):
+                yield accepted
+
+    rule_ms_per_message = rule_ms / len(messages) if messages else 0.0
+    logger.info(
+        f"[Parser] parse_many: {len(messages)} messages, rules={len(messages) - len(uncertain)} "
+        f"uncertain={len(uncertain)} ({'process pool' if use_pool else 'inline'}, {rule_ms:.0f}ms)"
+    )
+    if ai_query_func is None:
+        for index, shipment in uncertain.items():
+            yield index, shipment
+        return
+    cascade_stats.record("rules", rule_ms_per_message, count=len(messages) - len(uncertain))
+    if not uncertain:
+        return
+
+    size = SHIPMENT_PARSER["ai_batch_size"]
+    pending = list(uncertain)
+    batches = [pending[start:start + size] for start in range(0, len(pending), size)]
+    logger.info(f"[Parser] AI batch parse: {len(pending)} messages in {len(batches)} calls")
+
+    async def run_batch(indices: list[int]) -> tuple[list[int], list[Optional[ShipmentInfo]], float]:
+        started = time.perf_counter()
+        parsed = await parse_many_with_ai([messages[i] for i in indices], ai_query_func)
+        return indices, parsed, (time.perf_counter() - started) * 1000
+
+    async for indices, parsed, ai_ms in _as_completed([run_batch(indices) for indices in batches]):
+        for index, shipment in zip(indices, parsed):
+            cascade_stats.record(
+                "ai" if shipment is not None else "fallback", rule_ms_per_message, ai_ms / len(indices)
+            )
+            yield index, shipment or uncertain[index]
+
+    logger.info(
+        f"[Parser] parse_many done: rules_rate={cascade_stats.rules_rate:.0%} "
+        f"of {cascade_stats.decisions} saved~{cascade_stats.stats()['saved_ms']:.0f}ms"
+    )
@@ -10,12 +10,15 @@ from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from storage import run_io, offload, atomic_write_json
 from .models import (
     ShipmentInfo,
     ShipmentItem,
     Subscriber,
     NotificationResult,
 )
+from .notifier import Notification, NotificationPipeline, LogProvider
+from .outbox import NotificationOutbox
 
 logger = logging.getLogger("aiseed.shipment")
 
@@ -23,13 +26,27 @@ logger = logging.getLogger("aiseed.shipment")
 class ShipmentService:
     """出荷情報サービス"""
 
-    def __init__(self, base_path: str = "shipment_data"):
+    def __init__(
+        self,
+        base_path: str = "shipment_data",
+        notifier: Optional[NotificationPipeline] = None,
+        outbox: Optional[NotificationOutbox] = None
+    ):
+        """
+        Args:
+            base_path: データの保存先
+            notifier: 通知パイプライン（省略時はログに出すだけ）
+            outbox: 通知の送信待ち（指定時は投稿と同じ処理の中で通知を書き込み、送信は OutboxWorker が行う）
+        """
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
 
-        # 通知サービス（後で初期化）
-        self.email_service = None
-        self.push_service = None
+        # 通知パイプライン
+        self.notifier = notifier or NotificationPipeline({
+            "email": LogProvider("email"),
+            "push": LogProvider("push"),
+        })
+        self.outbox = outbox
 
     def _get_farmer_path(self, farmer_id: str) -> Path:
         """農家のデータディレクトリを取得"""
@@ -62,6 +79,19 @@ class ShipmentService:
         logger.info(f"[Shipment] Posted: farmer={shipment.farmer_id} id={shipment.id}")
         return shipment
 
+    def post_shipment_and_enqueue(self, shipment: ShipmentInfo) -> tuple[ShipmentInfo, int]:
+        """
+        出荷情報を投稿し、同じ処理の中で購読者への通知を送信待ち（outbox）に書き込む
+
+        Returns:
+            (保存した出荷情報, 送信待ちに書き込んだ通知の件数)
+        """
+        saved = self.post_shipment(shipment)
+        notifications = self.build_notifications(saved, self.get_subscribers(saved.farmer_id))
+        queued = self.outbox.enqueue(notifications) if self.outbox else 0
+        logger.info(f"[Notify] outbox farmer={saved.farmer_id} shipment={saved.id} queued={queued}")
+        return saved, queued
+
     def get_latest_shipment(self, farmer_id: str) -> Optional[ShipmentInfo]:
         """最新の出荷情報を取得"""
         shipments = self._load_shipments(farmer_id)
@@ -124,9 +154,7 @@ class ShipmentService:
 
     def _save_shipments(self, farmer_id: str, shipments: list[dict]):
         """出荷情報を保存"""
-        file_path = self._get_shipments_file(farmer_id)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(shipments, f, ensure_ascii=False, indent=2, default=str)
+        atomic_write_json(self._get_shipments_file(farmer_id), shipments, default=str)
 
     # ==================== 購読者管理 ====================
 
@@ -190,56 +218,64 @@ class ShipmentService:
 
     def _save_subscribers(self, farmer_id: str, subscribers: list[dict]):
         """購読者を保存"""
-        file_path = self._get_subscribers_file(farmer_id)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(subscribers, f, ensure_ascii=False, indent=2, default=str)
+        atomic_write_json(self._get_subscribers_file(farmer_id), subscribers, default=str)
 
     # ==================== 通知 ====================
 
+    def build_notifications(
+        self,
+        shipment: ShipmentInfo,
+        subscribers: list[Subscriber]
+    ) -> list[Notification]:
+        """購読者ごとの通知（メール・Webプッシュ）を作成"""
+        message = self._build_notification_message(shipment)
+        subject = f"【出荷情報】{shipment.location_name}"
+        notifications = []
+        for sub in subscribers:
+            if sub.email:
+                notifications.append(Notification(
+                    "email", sub.email, subject, message, shipment.farmer_id, shipment.id or ""
+                ))
+            if sub.push_subscription:
+                notifications.append(Notification(
+                    "push", sub.push_subscription, subject, message, shipment.farmer_id, shipment.id or ""
+                ))
+        return notifications
+
     async def notify_subscribers(
         self,
         farmer_id: str,
         shipment: ShipmentInfo
     ) -> NotificationResult:
-        """購読者に出荷情報を通知"""
-        subscribers = self.get_subscribers(farmer_id)
-        result = NotificationResult(success=True)
-
+        """購読者に出荷情報を通知（全件の送信が終わるまで待つ）"""
+        subscribers = await self.get_subscribers_async(farmer_id)
         if not subscribers:
             logger.info(f"[Notify] No subscribers for farmer={farmer_id}")
-            return result
-
-        # 通知メッセージを作成
-        message = self._build_notification_message(shipment)
-
-        # メール通知
-        for sub in subscribers:
-            if sub.email:
-                try:
-                    await self._send_email(sub.email, shipment, message)
-                    result.email_sent += 1
-                except Exception as e:
-                    result.errors.append(f"Email to {sub.email}: {str(e)}")
-                    logger.error(f"Email notification failed: {e}")
-
-            # Webプッシュ通知
-            if sub.push_subscription:
-                try:
-                    await self._send_push(sub.push_subscription, shipment, message)
-                    result.push_sent += 1
-                except Exception as e:
-                    result.errors.append(f"Push: {str(e)}")
-                    logger.error(f"Push notification failed: {e}")
-
-        if result.errors:
-            result.success = False
+            return NotificationResult(success=True)
 
+        result = await self.notifier.deliver(self.build_notifications(shipment, subscribers))
         logger.info(
             f"[Notify] farmer={farmer_id} email={result.email_sent} "
             f"push={result.push_sent} errors={len(result.errors)}"
         )
         return result
 
+    async def enqueue_notifications(self, farmer_id: str, shipment: ShipmentInfo) -> int:
+        """
+        購読者への通知を送信待ちにする（送る通知の件数を返す）
+
+        outbox があれば書き込み（送信は OutboxWorker）、なければこのプロセスのバックグラウンドで送り始める。
+        """
+        subscribers = await self.get_subscribers_async(farmer_id)
+        notifications = self.build_notifications(shipment, subscribers)
+        if self.outbox:
+            queued = await run_io(self.outbox.enqueue, notifications)
+        else:
+            self.notifier.submit(farmer_id, notifications)
+            queued = len(notifications)
+        logger.info(f"[Notify] queued farmer={farmer_id} notifications={queued}")
+        return queued
+
     def _build_notification_message(self, shipment: ShipmentInfo) -> str:
         """通知メッセージを作成"""
         items_text = ", ".join([
@@ -260,28 +296,6 @@ class ShipmentService:
 
         return message
 
-    async def _send_email(
-        self,
-        to_email: str,
-        shipment: ShipmentInfo,
-        message: str
-    ):
-        """メール送信（実装は後で追加）"""
-        # TODO: Resend/SendGrid等で実装
-        logger.info(f"[Email] Would send to {to_email}: {message[:50]}...")
-        pass
-
-    async def _send_push(
-        self,
-        subscription: dict,
-        shipment: ShipmentInfo,
-        message: str
-    ):
-        """Webプッシュ送信（実装は後で追加）"""
-        # TODO: web-push で実装
-        logger.info(f"[Push] Would send: {message[:50]}...")
-        pass
-
     # ==================== HTML生成 ====================
 
     def generate_shipment_html(self, farmer_id: str, farmer_name: str = "") -> str:
@@ -441,3 +455,19 @@ class ShipmentService:
   </div>
 </body>
 </html>'''
+
+    # ==================== 非同期API ====================
+    # ファイルI/Oをイベントループ外（I/O用スレッドプール）で実行する
+    # 書き込みはファイル単位のロック（lock=）で直列化する
+
+    post_shipment_async = offload(post_shipment, lock=("shipment.shipments", "shipment.farmer_id"))
+    post_shipment_and_enqueue_async = offload(
+        post_shipment_and_enqueue, lock=("shipment.shipments", "shipment.farmer_id")
+    )
+    get_latest_shipment_async = offload(get_latest_shipment)
+    get_shipments_async = offload(get_shipments)
+    get_today_shipments_async = offload(get_today_shipments)
+    subscribe_async = offload(subscribe, lock=("shipment.subscribers", "subscriber.farmer_id"))
+    unsubscribe_async = offload(unsubscribe, lock=("shipment.subscribers", "farmer_id"))
+    get_subscribers_async = offload(get_subscribers)
+    generate_shipment_html_async = offload(generate_shipment_html)
@@ -0,0 +1,121 @@
+"""
+出荷メッセージの野菜名の辞書と照合
+
+野菜名（VEGETABLES + 作物データセットの名前）を1つの正規表現にまとめて1度だけコンパイルし、
+メッセージを1回走査して「野菜名 [数量 単位] 価格円」を出てきた順に全て取り出す。
+
+- 長い名前を先に並べる（「ミニトマト」は「トマト」より優先）
+- 照合の前にメッセージを NFKC で正規化する（全角数字・半角カナも読める）
+- 価格は「1,200円」のような桁区切りも読める
+- カタカナだけ・ひらがなだけの名前は、もう一方の表記も辞書に入れる（ナス → なす）
+
+作物データセット（data/data-collection の crop_data.json、または c*.json のディレクトリ）の
+name_jp / name_kana / common_names.jp を辞書に追加できる（config.SHIPMENT_PARSER）。
+"""
+import functools
+import json
+import logging
+import re
+import unicodedata
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .models import ShipmentItem
+
+logger = logging.getLogger("aiseed.shipment.parser")
+
+# よくある野菜名
+VEGETABLES = [
+    "トマト", "ミニトマト", "きゅうり", "キュウリ", "なす", "ナス",
+    "ピーマン", "パプリカ", "にんじん", "ニンジン", "人参",
+    "大根", "だいこん", "白菜", "はくさい", "キャベツ",
+    "レタス", "ほうれん草", "ホウレンソウ", "小松菜", "こまつな",
+    "ねぎ", "ネギ", "玉ねぎ", "タマネギ", "にんにく", "ニンニク",
+    "じゃがいも", "ジャガイモ", "さつまいも", "サツマイモ",
+    "かぼちゃ", "カボチャ", "ズッキーニ", "とうもろこし",
+    "枝豆", "えだまめ", "いんげん", "オクラ", "ゴーヤ",
+    "しそ", "シソ", "大葉", "バジル", "パセリ",
+    "いちご", "イチゴ", "ブルーベリー", "みかん", "りんご",
+]
+
+UNITS = ["個", "袋", "本", "束", "パック", "kg", "g"]
+
+_HIRAGANA = re.compile(r"[ぁ-ゖー]+")
+_KATAKANA = re.compile(r"[ァ-ヶー]+")
+
+
+def kana_variants(name: str) -> set[str]:
+    """名前と、ひらがな・カタカナだけの名前ならもう一方の表記"""
+    variants = {name}
+    if _HIRAGANA.fullmatch(name):
+        variants.add("".join(chr(ord(c) + 0x60) if c != "ー" else c for c in name))
+    elif _KATAKANA.fullmatch(name):
+        variants.add("".join(chr(ord(c) - 0x60) if c != "ー" else c for c in name))
+    return variants
+
+
+def load_crop_names(path: str) -> list[str]:
+    """
+    作物データセットから名前を読み込む
+
+    Args:
+        path: crop_data.json（レコードの配列）、1作物のJSON、または c*.json のディレクトリ
+    """
+    source = Path(path)
+    files = sorted(source.glob("*.json")) if source.is_dir() else [source]
+    names = []
+    for file in files:
+        with open(file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for record in data if isinstance(data, list) else [data]:
+            names += [record.get("name_jp"), record.get("name"), record.get("name_kana")]
+            names += (record.get("common_names") or {}).get("jp") or []
+    return [name.strip() for name in names if isinstance(name, str) and name.strip()]
+
+
+class VegetableMatcher:
+    """野菜名 + 数量・単位 + 価格の1回の走査での抽出"""
+
+    def __init__(self, names: Iterable[str], units: Iterable[str] = UNITS):
+        vocabulary = set()
+        for name in names:
+            vocabulary |= kana_variants(unicodedata.normalize("NFKC", name))
+        # 長い名前から（同じ位置で始まる短い名前より先に試す）
+        self.names = sorted(vocabulary, key=lambda n: (-len(n), n))
+        alternation = "|".join(map(re.escape, self.names))
+        unit_pattern = "|".join(map(re.escape, sorted(units, key=len, reverse=True)))
+        self.pattern = re.compile(
+            rf"(?P<name>{alternation})\s*"
+            rf"(?:(?P<quantity>\d+)\s*(?P<unit>{unit_pattern})\s*)?"
+            r"(?P<price>\d{1,3}(?:,\d{3})+|\d+)\s*円"
+        )
+
+    @classmethod
+    def from_crop_dataset(cls, path: str, base: Iterable[str] = VEGETABLES) -> "VegetableMatcher":
+        """base に作物データセットの名前を加えた辞書"""
+        return cls([*base, *load_crop_names(path)])
+
+    def find_items(self, message: str) -> list[ShipmentItem]:
+        """メッセージ中の「野菜名 [数量 単位] 価格円」を出てきた順に全て取り出す"""
+        items = []
+        for match in self.pattern.finditer(unicodedata.normalize("NFKC", message)):
+            item = ShipmentItem(name=match["name"], price=int(match["price"].replace(",", "")))
+            if match["quantity"]:
+                item.quantity = match["quantity"]
+                item.unit = match["unit"]
+            items.append(item)
+        return items
+
+
+@functools.lru_cache(maxsize=None)
+def default_matcher(crop_dataset: Optional[str] = None) -> VegetableMatcher:
+    """VEGETABLES（と作物データセット）の辞書（プロセス内で1度だけコンパイル）"""
+    if not crop_dataset:
+        return VegetableMatcher(VEGETABLES)
+    try:
+        matcher = VegetableMatcher.from_crop_dataset(crop_dataset)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to load crop dataset {crop_dataset}: {e}")
+        return VegetableMatcher(VEGETABLES)
+    logger.info(f"[Parser] vocabulary={len(matcher.names)} (crop dataset: {crop_dataset})")
+    return matcher
@@ -0,0 +1,25 @@
+"""
+ストレージ共通モジュール
+
+JSONファイルを使う各サービス（grow, shipment, community, memory）で共有する
+- aio: ブロッキングなファイルI/Oをイベントループ外で実行
+- locks: ファイル単位の非同期ロックと、スレッド用のキー単位ロック（read-modify-writeの直列化）
+- files: アトミックなJSON/JSONL書き込み、追記専用JSONLの追記と末尾からの読み込み
+"""
+from .aio import configure_io_pool, shutdown_io_pool, run_io, offload
+from .locks import KeyedLocks, ThreadKeyedLocks, file_locks
+from .files import atomic_write_json, atomic_write_jsonl, append_jsonl, read_jsonl_tail
+
+__all__ = [
+    "configure_io_pool",
+    "shutdown_io_pool",
+    "run_io",
+    "offload",
+    "KeyedLocks",
+    "ThreadKeyedLocks",
+    "file_locks",
+    "atomic_write_json",
+    "atomic_write_jsonl",
+    "append_jsonl",
+    "read_jsonl_tail",
+]
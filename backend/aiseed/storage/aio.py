@@ -0,0 +1,116 @@
+"""
+非同期I/Oヘルパー
+
+open() / json.load / json.dump などのブロッキング処理を、
+サイズ上限付きの専用スレッドプールで実行してイベントループを塞がないようにする。
+"""
+import asyncio
+import functools
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Union
+
+from .locks import file_locks
+
+logger = logging.getLogger("aiseed.storage")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_max_workers = 32
+
+
+def configure_io_pool(max_workers: int):
+    """I/O用スレッドプールのサイズを設定（起動時に呼ぶ）"""
+    global _executor, _max_workers
+    shutdown_io_pool()
+    _max_workers = max_workers
+    logger.info(f"[IO] thread pool max_workers={max_workers}")
+
+
+def shutdown_io_pool():
+    """I/O用スレッドプールを停止（実行中の処理は完了を待つ）"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="aiseed-io")
+    return _executor
+
+
+async def run_io(func: Callable, *args, **kwargs):
+    """
+    同期関数をI/O用スレッドプールで実行して結果を待つ
+
+    呼び出し側がキャンセルされてもスレッドの処理は止まらないため、
+    完了を待ってからキャンセルを伝播する（ロック解放後に書き込みが続かないように）。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        raise
+
+
+LockSpec = tuple  # (名前, 引数名, ...) 例: ("grow.observations", "user_id", "plant_id")
+
+
+def _lock_keys(signature: inspect.Signature, specs: list[LockSpec], args, kwargs) -> list[tuple]:
+    """ロック指定と呼び出し引数からロックキーを作る（"shipment.farmer_id" のような属性参照も可）"""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    keys = []
+    for name, *params in specs:
+        values = []
+        for param in params:
+            arg_name, *attrs = param.split(".")
+            value = bound.arguments[arg_name]
+            for attr in attrs:
+                value = getattr(value, attr)
+            values.append(value)
+        keys.append((name, *values))
+    return keys
+
+
+def offload(func: Callable, lock: Union[LockSpec, list[LockSpec], None] = None) -> Callable:
+    """
+    同期メソッドから非同期版を作る（クラス定義内で使用）
+
+    lockを指定すると、同じキーの呼び出しはasyncio.Lockで直列化される
+    （同じファイルへの読み込み→追記→保存の競合防止）。
+
+    使用例:
+        class GrowService:
+            def get_plant(self, user_id, plant_id): ...
+            def add_observation(self, plant_id, user_id, text): ...
+
+            get_plant_async = offload(get_plant)
+            add_observation_async = offload(
+                add_observation, lock=("grow.observations", "user_id", "plant_id")
+            )
+
+        plant = await grow_service.get_plant_async(user_id, plant_id)
+    """
+    if lock is None:
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            return await run_io(func, self, *args, **kwargs)
+    else:
+        specs = [lock] if isinstance(lock[0], str) else list(lock)
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            keys = _lock_keys(signature, specs, (self, *args), kwargs)
+            async with file_locks.hold(*keys):
+                return await run_io(func, self, *args, **kwargs)
+
+    wrapper.__name__ = f"{func.__name__}_async"
+    wrapper.__qualname__ = f"{func.__qualname__}_async"
+    return wrapper
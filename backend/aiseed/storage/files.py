@@ -0,0 +1,86 @@
+"""
+ファイル書き込みヘルパー
+
+一時ファイルに書き込んでから os.replace で置き換えることで、
+書き込み途中のクラッシュや同時読み込みで壊れたJSONが見えないようにする。
+
+追記専用のJSONL（1行1件）は、末尾から必要な件数だけ読む。
+改行で終わっていない末尾の行（書き込み途中）は読まない。
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+# JSONLを末尾から読むときのブロックサイズ
+TAIL_BLOCK_SIZE = 8192
+
+
+def atomic_write_json(path: Path, data: Any, default: Optional[Callable] = None):
+    """JSONをアトミックに書き込む（同じディレクトリの一時ファイル → os.replace）"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=default)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def atomic_write_jsonl(path: Path, records: list, default: Optional[Callable] = None):
+    """JSONL（1行1件）をアトミックに書き込む（作り直し用）"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, ensure_ascii=False, default=default) + "\n" for r in records)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def append_jsonl(path: Path, record: Any, default: Optional[Callable] = None):
+    """JSONLに1行追記（呼び出し側でファイル単位のロックを取る）"""
+    line = json.dumps(record, ensure_ascii=False, default=default) + "\n"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def read_jsonl_tail(path: Path, limit: int) -> list:
+    """JSONLの末尾からlimit件（新しい順）。ファイル全体は読まない"""
+    if limit <= 0:
+        return []
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return []
+    with f:
+        position = f.seek(0, os.SEEK_END)
+        buffer = b""
+        trimmed = False
+        records = []
+        while position > 0 and len(records) < limit:
+            size = min(TAIL_BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            buffer = f.read(size) + buffer
+            if not trimmed:
+                # 改行で終わっていない末尾（書き込み途中）を捨てる
+                end = buffer.rfind(b"\n")
+                if end < 0 and position > 0:
+                    continue
+                buffer = buffer[:end + 1]
+                trimmed = True
+            lines = buffer.split(b"\n")
+            # 先頭の行は前のブロックに続いている可能性があるので残す
+            buffer = lines.pop(0) if position > 0 else b""
+            for line in reversed(lines):
+                if line.strip():
+                    records.append(json.loads(line))
+                    if len(records) >= limit:
+                        break
+        return records
@@ -0,0 +1,110 @@
+"""
+キー単位の非同期ロック
+
+同じJSONファイルへの読み込み→追記→保存（read-modify-write）が並行すると
+後から保存した側が先の書き込みを上書きしてしまう。
+ファイルごとのキー（例: ("grow.observations", user_id, plant_id)）でasyncio.Lockを取り、
+同じファイルへの更新だけを直列化する。使われなくなったロックは自動的に破棄する。
+
+スレッドプール内の同期処理（集計ファイルの更新など）には ThreadKeyedLocks を使う。
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Hashable
+
+
+class KeyedLocks:
+    """キーごとのasyncio.Lock（参照カウントで不要になったものを破棄）"""
+
+    def __init__(self):
+        self._locks: dict[Hashable, list] = {}  # key -> [Lock, 参照数]
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable):
+        """
+        複数キーのロックをまとめて取得
+
+        デッドロックを避けるため、キーは常にソート順で取得する。
+        """
+        ordered = sorted(set(keys), key=repr)
+        entries = [self._ref(key) for key in ordered]
+        held = []
+        try:
+            for entry in entries:
+                await entry[0].acquire()
+                held.append(entry)
+            yield
+        finally:
+            for entry in reversed(held):
+                entry[0].release()
+            for key in ordered:
+                self._unref(key)
+
+    def _ref(self, key: Hashable) -> list:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry
+
+    def _unref(self, key: Hashable):
+        entry = self._locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    def __len__(self) -> int:
+        """現在保持・待機中のキー数"""
+        return len(self._locks)
+
+
+class ThreadKeyedLocks:
+    """
+    キーごとの排他（スレッド用）
+
+    同じキーを持つ処理だけを直列化する（例: ユーザーごとの stats.json）。
+    hold_all は全キーを排他する（初回構築など、どのキーのファイルにも書き込む処理用）。
+    再入不可: 同じスレッドで同じキーを二重に取るとデッドロックする。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._held: set[Hashable] = set()
+        self._exclusive = False
+
+    @contextmanager
+    def hold(self, *keys: Hashable):
+        """複数キーをまとめて取得（全キーが空くまで待つため、取得順によるデッドロックはない）"""
+        wanted = set(keys)
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive and not (wanted & self._held))
+            self._held |= wanted
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._held -= wanted
+                self._condition.notify_all()
+
+    @contextmanager
+    def hold_all(self):
+        """全キーを排他（新しい hold を止め、保持中のものが終わるのを待つ）"""
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive)
+            self._exclusive = True
+            self._condition.wait_for(lambda: not self._held)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+    def __len__(self) -> int:
+        """現在保持中のキー数"""
+        return len(self._held)
+
+
+# ファイル書き込み用の共有ロック（offload(..., lock=...) が使用）
+file_locks = KeyedLocks()
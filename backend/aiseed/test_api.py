@@ -11,6 +11,7 @@ AIseed API テストスクリプト
     # オフラインテスト（サーバー不要）
     python test_api.py --config     # 設定確認
     python test_api.py --modules    # モジュール確認
+    python test_api.py --scheduler  # モデル実行枠の確認
     python test_api.py --offline    # 全オフラインテスト
 
     # APIテスト（サーバー必要）
@@ -102,6 +103,8 @@ def test_config():
         # メモリ設定
         print("--- Memory ---")
         print(f"  Base Path: {MEMORY['base_path']}")
+        print(f"  Backend: {MEMORY['backend']}")
+        print(f"  Cache: {MEMORY['cache_max_entries']} entries / {MEMORY['cache_max_bytes']} bytes")
         print()
 
         # 関数テスト
@@ -132,9 +135,24 @@ def test_modules():
         ("config.logging", "ログ"),
         ("agent.core", "エージェント"),
         ("agent.prompts", "プロンプト"),
+        ("agent.context", "会話履歴の窓と要約"),
+        ("agent.prompt_builder", "プロンプト組み立て"),
+        ("agent.response_cache", "AI応答キャッシュ"),
+        ("agent.singleflight", "同時問い合わせのまとめ"),
+        ("agent.scheduler", "モデル呼び出しの実行枠"),
         ("agent.tools", "ツール"),
         ("agent.tools.experience", "体験タスク"),
+        ("agent.tools.sessions", "体験セッション"),
+        ("agent.tools.batch", "体験タスク一括分析"),
+        ("agent.tools.archive", "体験タスク結果アーカイブ"),
+        ("agent.tools.registry", "ツール登録簿"),
         ("memory.store", "メモリ"),
+        ("memory.backends", "メモリバックエンド"),
+        ("storage", "ストレージ共通"),
+        ("grow.observation_log", "観察記録ログ"),
+        ("shipment.notifier", "出荷情報の通知"),
+        ("shipment.outbox", "通知の送信待ち"),
+        ("shipment.vocabulary", "野菜名の辞書"),
     ]
 
     success_count = 0
@@ -214,6 +232,47 @@ def test_experience_tasks():
         return False
 
 
+def test_scheduler():
+    """モデル呼び出しの実行枠の確認（オフライン）"""
+    print("=== モデル実行枠テスト ===\n")
+
+    try:
+        import asyncio
+        from agent.scheduler import ModelScheduler
+
+        async def cancel_while_releasing():
+            # 枠の解放と同じティックで待ちがキャンセルされても（切断など）、枠が失われないこと
+            scheduler = ModelScheduler({"medium": {"max_concurrent": 1, "max_queue": 10}})
+
+            async def queued_call():
+                async with scheduler.slot("grow_analysis"):
+                    pass
+
+            async with scheduler.slot("grow_analysis"):
+                waiter = asyncio.create_task(queued_call())
+                await asyncio.sleep(0)
+                waiter.cancel()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                pass
+
+            stats = scheduler.stats()["medium"]
+            print(f"  キャンセル後: running={stats['running']} queued={stats['queued_interactive']}")
+            assert stats["running"] == 0 and stats["queued_interactive"] == 0, stats
+            await asyncio.wait_for(queued_call(), timeout=1)
+            print("✓ 解放と同時のキャンセル後も次の呼び出しが実行できる\n")
+
+        asyncio.run(cancel_while_releasing())
+        return True
+
+    except Exception as e:
+        print(f"✗ エラー: {e!r}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def test_offline():
     """全オフラインテスト"""
     print("=== 全オフラインテスト ===\n")
@@ -233,6 +292,9 @@ def test_offline():
     print("="*50)
     results.append(("体験タスク", test_experience_tasks()))
 
+    print("="*50)
+    results.append(("モデル実行枠", test_scheduler()))
+
     # サマリー
     print("="*50)
     print("\n=== オフラインテスト結果 ===\n")
@@ -668,6 +730,7 @@ def print_help():
   --modules     モジュールのインポート確認
   --prompts     プロンプトの確認
   --tasks       体験タスクの確認
+  --scheduler   モデル実行枠の確認
   --offline     全オフラインテスト
 
 APIテスト（サーバー必要）:
@@ -696,7 +759,7 @@ if __name__ == "__main__":
         sys.exit(0)
 
     # オフラインテストの判定
-    offline_modes = ["--config", "--modules", "--prompts", "--tasks", "--offline"]
+    offline_modes = ["--config", "--modules", "--prompts", "--tasks", "--scheduler", "--offline"]
     is_offline = any(mode in sys.argv for mode in offline_modes)
 
     if is_offline:
@@ -713,6 +776,9 @@ if __name__ == "__main__":
         elif "--tasks" in sys.argv:
             print("モード: 体験タスク確認テスト\n")
             test_experience_tasks()
+        elif "--scheduler" in sys.argv:
+            print("モード: モデル実行枠テスト\n")
+            test_scheduler()
         elif "--offline" in sys.argv:
             print("モード: 全オフラインテスト\n")
             test_offline()